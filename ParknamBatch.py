@@ -0,0 +1,339 @@
+"""
+รันสถานการณ์ (scenario) จำนวนมากบน TrainSimulator แบบ headless กระจายไปหลาย process
+แต่ละ run มีผู้ควบคุมอัตโนมัติ (AutoController) กดคำสั่งแทนคน แล้วส่งตัวชี้วัดกลับมารวมเป็นรายงาน
+
+ใช้งาน:
+    python ParknamBatch.py scenarios/example.json
+    python ParknamBatch.py scenarios/example.json --workers 32 --out runs.jsonl
+    python ParknamBatch.py scenarios/example.json --frames shots/   # บันทึกภาพสุดท้ายของแต่ละ run (PNG)
+    python ParknamBatch.py scenarios/example.json --timeline tl/    # บันทึกเส้นเวลาของขบวนแต่ละ run (ดู ParknamTimeline.py)
+
+ไฟล์ scenario (JSON):
+    {
+      "duration_ms": 3600000,            # ความยาวของแต่ละ run (เวลาจำลอง)
+      "scenarios": [
+        {
+          "name": "peak",
+          "seeds": 20,                     # จำนวน run ต่อชุดพารามิเตอร์ (seed 0..19)
+          "arrival": "poisson",            # "poisson" | "fixed" | "burst"
+          "headway_ms": 90000,             # ระยะห่างเฉลี่ยระหว่างขบวนที่มาถึง
+          "burst_size": 3,                 # (เฉพาะ "burst") จำนวนขบวนที่มาพร้อมกัน
+          "layout": "layouts/parknam.json", # เลย์เอาต์ของสถานี (ไม่ระบุ = สถานีปากน้ำ)
+          "platforms": [1, 2],             # ชานชาลาที่แต่ละขบวนขอ (สุ่มเลือก, ไม่ระบุ = ทุกชานชาลาของเลย์เอาต์)
+          "train_lengths": [17, 25],       # ความยาวขบวน (สุ่มเลือก)
+          "dwell_ms": 30000,               # เวลาจอดที่ชานชาลา
+          "through_fraction": 0.1,         # สัดส่วนขบวนที่วิ่งผ่านไม่จอด
+          "emergency_at_ms": [1800000],    # เวลาที่กดหยุดฉุกเฉิน
+          "emergency_per_hour": 0.5,       # หรือสุ่มกดหยุดฉุกเฉินตามอัตรานี้
+          "sweep": {"headway_ms": [60000, 90000, 120000]}   # ทุกค่าในนี้ถูกคูณไขว้กัน
+        }
+      ]
+    }
+"""
+import argparse
+import concurrent.futures
+import itertools
+import json
+import math
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+from ParknamFrames import snapshot
+from ParknamStation import StationController, TrainSimulator, TrainTimeline
+
+# ค่าเริ่มต้นของพารามิเตอร์ scenario
+DEFAULTS = {
+    "duration_ms": 3600000,
+    "seeds": 1,
+    "arrival": "poisson",
+    "headway_ms": 90000,
+    "burst_size": 3,
+    "layout": None,
+    "platforms": None,
+    "train_lengths": [17],
+    "dwell_ms": 30000,
+    "through_fraction": 0.0,
+    "emergency_at_ms": [],
+    "emergency_per_hour": 0.0,
+}
+
+# ตัวชี้วัดตัวเลขที่สรุปในรายงาน (ชื่อ, หน่วย)
+REPORT_METRICS = [
+    ("completed", "trains"),
+    ("arrived", "trains"),
+    ("waiting_at_end", "trains"),
+    ("route_wait_mean_ms", "ms"),
+    ("route_wait_max_ms", "ms"),
+    ("depart_wait_mean_ms", "ms"),
+    ("utilisation", ""),  # utilisation_p<ชานชาลา> ของทุกชานชาลาในเลย์เอาต์ (ดู report_metrics)
+    ("rejected_commands", ""),
+    ("emergencies", ""),
+]
+
+
+# ผู้ควบคุมอัตโนมัติ: ทำหน้าที่แทนคนกดปุ่มใน TrainApp ตามนโยบายง่ายๆ
+# ตัดสินใจใหม่เฉพาะเมื่อมีอะไรเปลี่ยน (เหตุการณ์จาก Simulator, ขบวนมาถึง, จอดครบเวลา)
+# คำสั่งที่ถูกปฏิเสธจึงนับเป็นการปฏิเสธจริง ไม่ใช่การกดซ้ำทุกรอบ
+class AutoController(StationController):
+
+    def __init__(self, sim, params, seed):
+        super().__init__(sim, params["dwell_ms"])
+        self.params = params
+        self.rng = random.Random(seed)
+        self.waiting = []  # ขบวนที่มาถึงแล้วรอเส้นทางเข้า: [เวลาที่มาถึง, ชานชาลา, ความยาว, วิ่งผ่าน]
+
+        # ตัวชี้วัด
+        self.arrived = 0
+        self.completed = 0
+        self.rejected = 0
+        self.emergencies = 0
+        self.route_waits = []
+        self.depart_waits = []
+        self.occupied_ms = dict.fromkeys(sim.platform_occupied, 0.0)
+        self._occupied_since = dict.fromkeys(sim.platform_occupied)
+
+        self._schedule_arrivals()
+        self._schedule_emergencies()
+
+    # --- สร้างเหตุการณ์ล่วงหน้า ---
+
+    def _schedule_arrivals(self):
+        p, rng = self.params, self.rng
+        platforms = p["platforms"] or list(self.sim.layout.platforms)
+        t = 0.0
+        while True:
+            if p["arrival"] == "fixed":
+                t += p["headway_ms"]
+                group = 1
+            elif p["arrival"] == "burst":
+                t += rng.expovariate(1.0 / (p["headway_ms"] * p["burst_size"]))
+                group = p["burst_size"]
+            elif p["arrival"] == "poisson":
+                t += rng.expovariate(1.0 / p["headway_ms"])
+                group = 1
+            else:
+                raise ValueError(f"unknown arrival pattern {p['arrival']!r}")
+            if t >= p["duration_ms"]:
+                break
+            for _ in range(group):
+                train = [t, rng.choice(platforms), rng.choice(p["train_lengths"]),
+                         rng.random() < p["through_fraction"]]
+                self.sim.after(t, lambda train=train: self._arrive(train))
+
+    def _schedule_emergencies(self):
+        p = self.params
+        times = list(p["emergency_at_ms"])
+        if p["emergency_per_hour"] > 0:
+            t = 0.0
+            while True:
+                t += self.rng.expovariate(p["emergency_per_hour"] / 3600000.0)
+                if t >= p["duration_ms"]:
+                    break
+                times.append(t)
+        for t in times:
+            self.sim.after(t, self._emergency)
+
+    def _arrive(self, train):
+        self.arrived += 1
+        self.waiting.append(train)
+        self._wake()
+
+    def _emergency(self):
+        self.emergencies += 1
+        self.sim.emergency_stop()  # ไม่นับใน rejected; ขบวนที่จอดอยู่ยังอยู่ที่เดิม ออกได้หลังรีเซ็ต
+
+    # --- การสั่งการ ---
+
+    def _command(self, command, *args, **kwargs):
+        ok = command(*args, **kwargs)
+        if not ok:
+            self.rejected += 1
+        return ok
+
+    def _departed(self, platform, docked_ms):
+        self.depart_waits.append(docked_ms - self.dwell_ms)
+
+    def _admit(self, now):
+        """รับขบวนที่รอนานที่สุดเข้าชานชาลาที่ขอ"""
+        sim = self.sim
+        if self.waiting:
+            arrived_at, platform, length, through = self.waiting[0]
+            # กดเฉพาะเมื่อ Simulator จะยอม (ชานชาลาว่างและเส้นทางตั้งได้) ให้ rejected นับเฉพาะการปฏิเสธที่คาดไม่ถึง
+            if (not sim.platform_occupied[platform] and sim.platform_train(platform) is None
+                    and sim.route_available(sim.inbound_routes[platform])):
+                if self._command(sim.set_route_in, platform):
+                    self.waiting.pop(0)
+                    self.route_waits.append(now - arrived_at)
+                    self._command(sim.call_train, length, through=through)
+
+    def _on_event(self, event, data):
+        now = self.sim.now
+        if event == "state" and data["new"] == "cleared":
+            self.completed += 1
+        elif event == "platform":
+            platform = data["platform"]
+            if data["occupied"]:
+                self._occupied_since[platform] = now
+            elif self._occupied_since[platform] is not None:
+                self.occupied_ms[platform] += now - self._occupied_since[platform]
+                self._occupied_since[platform] = None
+        super()._on_event(event, data)
+
+    def metrics(self):
+        """ตัวชี้วัดของ run นี้ (เรียกหลังจบการจำลอง)"""
+        now = self.sim.now
+        occupied = dict(self.occupied_ms)
+        for platform, since in self._occupied_since.items():
+            if since is not None:
+                occupied[platform] += now - since
+        return {
+            "completed": self.completed,
+            "arrived": self.arrived,
+            "waiting_at_end": len(self.waiting),
+            "route_wait_mean_ms": statistics.fmean(self.route_waits) if self.route_waits else 0.0,
+            "route_wait_max_ms": max(self.route_waits, default=0.0),
+            "depart_wait_mean_ms": statistics.fmean(self.depart_waits) if self.depart_waits else 0.0,
+            **{f"utilisation_p{platform}": value / now if now else 0.0 for platform, value in occupied.items()},
+            "rejected_commands": self.rejected,
+            "emergencies": self.emergencies,
+            "ticks": self.sim.ticks,
+        }
+
+
+def expand_runs(config):
+    """แตก scenario ในไฟล์ออกเป็นรายการ run (คูณไขว้ค่าใน "sweep" × จำนวน seed)"""
+    runs = []
+    top = {k: v for k, v in config.items() if k != "scenarios"}
+    for index, scenario in enumerate(config["scenarios"]):
+        base = dict(DEFAULTS, **top)
+        base.update({k: v for k, v in scenario.items() if k != "sweep"})
+        name = base.pop("name", f"scenario-{index}")
+        sweep = scenario.get("sweep", {})
+        keys = sorted(sweep)
+        for values in itertools.product(*(sweep[k] for k in keys)):
+            params = dict(base, **dict(zip(keys, values)))
+            label = name + "".join(f" {k}={v}" for k, v in zip(keys, values))
+            for seed in range(params["seeds"]):
+                runs.append({"scenario": label, "seed": seed, "params": params})
+    return runs
+
+
+def run_one(run):
+    """รัน 1 สถานการณ์ (ทำงานใน process ลูก) คืนค่า run พร้อมตัวชี้วัด"""
+    started = time.perf_counter()
+    sim = TrainSimulator(layout=run["params"]["layout"])
+    name = re.sub(r"[^\w.=-]+", "_", run["scenario"])  # ชื่อไฟล์ของ run นี้: <scenario>-<seed>.*
+    timeline = None
+    if run.get("timeline"):
+        timeline = TrainTimeline(os.path.join(run["timeline"], f"{name}-{run['seed']}.timeline"))
+        timeline.attach(sim)
+    controller = AutoController(sim, run["params"], run["seed"])
+    sim.run_until(run["params"]["duration_ms"])
+    if timeline is not None:
+        timeline.close()
+    metrics = controller.metrics()
+    metrics["wall_s"] = time.perf_counter() - started
+    if run.get("frames"):
+        # ภาพสถานะตอนจบ run (วาด offscreen ไม่ต้องมีจอ)
+        snapshot(sim, os.path.join(run["frames"], f"{name}-{run['seed']}.png"))
+    return {"scenario": run["scenario"], "seed": run["seed"], "metrics": metrics}
+
+
+def iter_results(runs, workers=None):
+    """รันทุก run แล้วส่งผลกลับทีละ run ตามลำดับที่เสร็จ (workers=1 = รันใน process นี้)"""
+    if workers == 1:
+        yield from map(run_one, runs)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_one, run) for run in runs]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+def report_metrics(metrics):
+    """REPORT_METRICS โดยแทน "utilisation" ด้วย utilisation_p<ชานชาลา> ทุกตัวที่มีใน metrics (ตามลำดับของเลย์เอาต์)"""
+    names = []
+    for metric, unit in REPORT_METRICS:
+        if metric == "utilisation":
+            names += [(key, unit) for key in metrics if key.startswith("utilisation_p")]
+        else:
+            names.append((metric, unit))
+    return names
+
+
+def aggregate(results):
+    """รวมตัวชี้วัดของทุก run ตามชื่อ scenario: {scenario: {metric: (mean, p95, max)}}"""
+    groups = {}
+    for result in results:
+        groups.setdefault(result["scenario"], []).append(result["metrics"])
+    report = {}
+    for scenario, rows in groups.items():
+        summary = {"runs": len(rows)}
+        for metric, _ in report_metrics(rows[0]):
+            values = sorted(row[metric] for row in rows)
+            p95 = values[math.ceil(0.95 * len(values)) - 1]  # วิธี nearest rank
+            summary[metric] = (statistics.fmean(values), p95, values[-1])
+        report[scenario] = summary
+    return report
+
+
+def format_report(report):
+    lines = []
+    for scenario in sorted(report):
+        summary = report[scenario]
+        lines.append(f"== {scenario} ({summary['runs']} runs)")
+        lines.append(f"   {'metric':<22}{'mean':>12}{'p95':>12}{'max':>12}")
+        for metric, unit in report_metrics(summary):
+            mean, p95, peak = summary[metric]
+            label = f"{metric} ({unit})" if unit else metric
+            lines.append(f"   {label:<22}{mean:>12.2f}{p95:>12.2f}{peak:>12.2f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Parknam station scenarios in parallel and report metrics.")
+    parser.add_argument("scenario_file", help="JSON scenario file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (1 = run inline)")
+    parser.add_argument("--out", help="also write every run's metrics to this JSONL file")
+    parser.add_argument("--json", help="write the aggregated report to this JSON file")
+    parser.add_argument("--frames", help="save a PNG of every run's final state into this directory")
+    parser.add_argument("--timeline", help="save every run's train timeline into this directory")
+    args = parser.parse_args(argv)
+
+    with open(args.scenario_file, encoding="utf-8") as f:
+        runs = expand_runs(json.load(f))
+    for option in ("frames", "timeline"):
+        if getattr(args, option):
+            os.makedirs(getattr(args, option), exist_ok=True)
+            for run in runs:
+                run[option] = getattr(args, option)
+    print(f"{len(runs)} runs on {args.workers} workers...", file=sys.stderr)
+
+    started = time.perf_counter()
+    results = []
+    out = open(args.out, "w", encoding="utf-8") if args.out else None
+    try:
+        for done, result in enumerate(iter_results(runs, args.workers), 1):
+            results.append(result)
+            if out is not None:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            if done % 100 == 0 or done == len(runs):
+                print(f"  {done}/{len(runs)} runs ({time.perf_counter() - started:.1f} s)", file=sys.stderr)
+    finally:
+        if out is not None:
+            out.close()
+
+    report = aggregate(results)
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
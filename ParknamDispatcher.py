@@ -0,0 +1,306 @@
+"""
+ตัวจ่ายรถไฟอัตโนมัติตามตารางเวลา (timetable) สำหรับ TrainSimulator
+คำขอเส้นทางที่รออยู่ถูกเก็บในคิวลำดับความสำคัญ (heapq) และถูกส่งให้ Simulator ทันทีที่ระบบ interlocking ยอม
+รายงานความล่าช้า (lateness) และความจุทางทฤษฎี (ขบวนต่อชั่วโมง)
+
+ใช้งาน:
+    python ParknamDispatcher.py timetables/peak.csv               # รันแบบ headless แล้วพิมพ์รายงาน
+    python ParknamDispatcher.py timetables/peak.csv --per-train   # พิมพ์ผลของทุกขบวน
+    python ParknamDispatcher.py timetables/peak.csv --gui         # ให้ตัวจ่ายรถไฟคุม GUI แทนการกดปุ่ม
+
+ตารางเวลา (CSV มี header):
+    train,arrival,platform,dwell,priority,length
+    EXP 7,00:01:30,1,45,0,17          # arrival = เวลาที่ขบวนมาถึงสัญญาณเข้า (HH:MM:SS, MM:SS หรือวินาที)
+    ORD 201,00:02:00,any,60,1,        # platform = 1, 2 หรือ any; dwell = วินาที; priority น้อย = สำคัญกว่า
+"""
+import argparse
+import csv
+import heapq
+import statistics
+import sys
+
+from ParknamStation import StationLayout, TrainSimulator
+
+OUT, IN = 0, 1  # ชนิดคำขอ (เวลาเท่ากัน: ปล่อยขบวนออกก่อนเพื่อคืนชานชาลา)
+
+
+def parse_time(text):
+    """แปลง "HH:MM:SS", "MM:SS" หรือจำนวนวินาที เป็น ms"""
+    seconds = 0.0
+    for part in text.strip().split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds * 1000.0
+
+
+def load_timetable(path):
+    """อ่านตารางเวลา CSV คืนค่ารายการ dict เรียงตามเวลามาถึง"""
+    entries = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            platform = (row.get("platform") or "any").strip().lower()
+            entries.append({
+                "train": row["train"].strip(),
+                "arrival_ms": parse_time(row["arrival"]),
+                "platform": 0 if platform == "any" else int(platform),
+                "dwell_ms": float(row.get("dwell") or 30) * 1000.0,
+                "priority": int(row.get("priority") or 0),
+                "length": int(row.get("length") or 0) or None,
+            })
+    entries.sort(key=lambda e: e["arrival_ms"])
+    return entries
+
+
+def measure_route_times(length=None):
+    """
+    วัดเวลาที่ล็อกเส้นทางของขบวนเดียวบน Simulator เปล่า (ms) ต่อชานชาลา:
+    {platform: (เวลาจากตั้งทางเข้าถึงจอด, เวลาจากตั้งทางออกถึงออกพ้นแผนที่)}
+    """
+    times = {}
+    for platform in StationLayout.load().platforms:
+        sim = TrainSimulator()
+        marks = {}
+        sim.subscribe(lambda event, data: marks.setdefault(data["new"], sim.now) if event == "state" else None)
+        sim.set_route_in(platform)
+        sim.call_train(length)
+        while "in_station" not in marks and sim.step():
+            pass
+        start = sim.now
+        sim.set_route_out(platform)
+        while "cleared" not in marks and sim.step():
+            pass
+        times[platform] = (marks["in_station"], marks["cleared"] - start)
+    return times
+
+
+def theoretical_capacity(route_times, mean_dwell_ms):
+    """
+    ความจุทางทฤษฎี (ขบวนต่อชั่วโมง) เมื่อใช้สองชานชาลาสลับกัน
+    - ข้อจำกัดเส้นทาง: เส้นทางเข้าทั้งสองใช้ทางหลักร่วมกัน เส้นทางออกทั้งสองใช้ทางออกร่วมกัน
+      แต่ขาเข้ากับขาออกของคนละชานชาลาล็อกพร้อมกันได้ จึงถูกจำกัดด้วยฝั่งที่ช้ากว่า (max(t_in, t_out))
+    - ข้อจำกัดชานชาลา: แต่ละชานชาลาถูกจองตั้งแต่ตั้งทางเข้าจนออกพ้น (t_in + dwell + t_out) มีสองชานชาลา
+    คืนค่า (ความจุ, ขอบเขตจากเส้นทาง, ขอบเขตจากชานชาลา)
+    """
+    lock_ms = statistics.fmean(t_in + t_out for t_in, t_out in route_times.values())
+    platform_ms = lock_ms + mean_dwell_ms
+    route_bound = 3600000.0 / max(statistics.fmean(t_in for t_in, _ in route_times.values()),
+                                  statistics.fmean(t_out for _, t_out in route_times.values()))
+    platform_bound = 2 * 3600000.0 / platform_ms
+    return min(route_bound, platform_bound), route_bound, platform_bound
+
+
+# ตัวจ่ายรถไฟ: ขับ Simulator ตามตารางเวลาด้วยคิวลำดับความสำคัญ 2 ชั้น
+# - _scheduled: คำขอที่ยังไม่ถึงเวลา เรียงตาม (เวลาถึงกำหนด, priority)
+# - _ready: คำขอที่ถึงเวลาแล้วรอ interlocking เรียงตาม (priority, เวลาถึงกำหนด)
+class Dispatcher:
+
+    def __init__(self, sim, timetable):
+        self.sim = sim
+        self.entries = [dict(entry, state="scheduled", route_in_ms=None, departed_ms=None)
+                        for entry in timetable]
+        self._scheduled = []
+        self._ready = []
+        self._seq = 0
+        self._wake_pending = False
+        self._by_train_id = {}  # id ของขบวนใน Simulator -> entry ในตารางเวลา
+        self._route_times = {}  # (ชานชาลา, ความยาว) -> เวลาเข้า/ออก (วัดครั้งเดียวแล้วจำไว้)
+        self.issued = 0  # จำนวนคำสั่งที่ส่งให้ Simulator
+        self.rejected = 0  # จำนวนคำสั่งที่ Simulator ปฏิเสธ
+
+        for entry in self.entries:
+            self._push(entry["arrival_ms"], entry["priority"], IN, entry)
+        sim.subscribe(self._on_event)
+        self._wake()
+
+    # --- คิวคำขอ ---
+
+    def _push(self, due, priority, kind, entry):
+        self._seq += 1
+        heapq.heappush(self._scheduled, (due, priority, kind, self._seq, entry))
+        # ตั้งเวลาปลุกตอนคำขอถึงกำหนด (เวลาจำลองสัมบูรณ์)
+        self.sim.after(max(0.0, due - self.sim.now), self._wake)
+
+    def _wake(self):
+        """นัดให้ส่งคำขอเป็นเหตุการณ์ถัดไปของนาฬิกาจำลอง (ไม่สั่งการซ้อนใน callback ของ Simulator)"""
+        if not self._wake_pending:
+            self._wake_pending = True
+            self.sim.after(0, self._dispatch)
+
+    def _dispatch(self):
+        self._wake_pending = False
+        sim = self.sim
+        while self._scheduled and self._scheduled[0][0] <= sim.now:
+            due, priority, kind, seq, entry = heapq.heappop(self._scheduled)
+            heapq.heappush(self._ready, (priority, due, kind, seq, entry))
+
+        # ส่งคำขอตามลำดับความสำคัญทุกรายการที่ interlocking ยอมรับได้ตอนนี้
+        # (เส้นทางที่ไม่ขัดแย้งกัน เช่น เข้าชานชาลา 1 กับออกจากชานชาลา 2 ล็อกพร้อมกันได้)
+        skipped = []
+        while self._ready and not sim.emergency_active:
+            item = heapq.heappop(self._ready)
+            entry = item[4]
+            result = self._try(item[2], entry)
+            if result is None:
+                skipped.append(item)  # ยังทำไม่ได้ตอนนี้ (ชานชาลาไม่ว่างหรือเส้นทางขัดแย้ง) ลองคำขอถัดไป
+            elif result is False:
+                skipped.append(item)  # Simulator ปฏิเสธ: รอเหตุการณ์ถัดไปแล้วลองใหม่
+                break
+        for item in skipped:
+            heapq.heappush(self._ready, item)
+
+    def _try(self, kind, entry):
+        """ส่งคำขอ 1 รายการ คืนค่า True = สำเร็จ, False = ถูกปฏิเสธ, None = ยังส่งไม่ได้"""
+        sim = self.sim
+        if kind == OUT:
+            if not sim.route_available(sim.outbound_routes[entry["platform_used"]]):
+                return None
+            if not self._issue(sim.set_route_out, entry["platform_used"]):
+                return False
+            entry["departed_ms"] = sim.now
+            entry["state"] = "outbound"
+            return True
+        platform = self._choose_platform(entry)
+        if platform is None:
+            return None
+        if not self._issue(sim.set_route_in, platform):
+            return False
+        entry["route_in_ms"] = sim.now
+        entry["state"] = "inbound"
+        entry["platform_used"] = platform
+        if self._issue(sim.call_train, entry["length"]):
+            self._by_train_id[sim.route_trains[sim.inbound_routes[platform]].id] = entry
+        return True
+
+    def _choose_platform(self, entry):
+        """ชานชาลาที่ขอ (หรือชานชาลาใดก็ได้ถ้าขอ any) ที่ว่างและตั้งเส้นทางเข้าได้ตอนนี้ หรือ None"""
+        sim = self.sim
+        if sim.pending_inbound_route() is not None:
+            return None  # เส้นทางเข้าที่ตั้งไว้ยังไม่มีขบวนใช้
+        candidates = [entry["platform"]] if entry["platform"] else list(sim.platform_trains)
+        for platform in candidates:
+            if (not sim.platform_occupied[platform] and sim.platform_train(platform) is None
+                    and sim.route_available(sim.inbound_routes[platform])):
+                return platform
+        return None
+
+    def _issue(self, command, *args):
+        self.issued += 1
+        if command(*args):
+            return True
+        self.rejected += 1
+        return False
+
+    # --- เหตุการณ์จาก Simulator ---
+
+    def _on_event(self, event, data):
+        if event == "state":
+            entry = self._by_train_id.get(data["train_id"])
+            if data["new"] == "in_station" and entry is not None:
+                # จอดแล้ว: ขอทางออกเมื่อจอดครบ dwell และไม่ก่อนเวลาออกตามตาราง
+                entry["state"] = "docked"
+                due = max(self.sim.now + entry["dwell_ms"], self.scheduled_departure(entry))
+                self._push(due, entry["priority"], OUT, entry)
+            elif data["new"] == "cleared" and entry is not None:
+                entry["state"] = "done"
+                entry["cleared_ms"] = self.sim.now
+                del self._by_train_id[data["train_id"]]
+        self._wake()
+
+    # --- รายงาน ---
+
+    def route_times(self, platform, length):
+        key = (platform, length)
+        if key not in self._route_times:
+            self._route_times[key] = measure_route_times(length)[platform]
+        return self._route_times[key]
+
+    def scheduled_departure(self, entry):
+        """เวลาออกตามตาราง = เวลามาถึง + เวลาวิ่งเข้าชานชาลา + dwell"""
+        platform = entry.get("platform_used") or entry["platform"] or 1
+        t_in, _ = self.route_times(platform, entry["length"])
+        return entry["arrival_ms"] + t_in + entry["dwell_ms"]
+
+    def report(self):
+        """สรุปผล: ความล่าช้าขาเข้า/ขาออก, ปริมาณที่ทำได้จริง และความจุทางทฤษฎี"""
+        entries = self.entries
+        arrival_late = [e["route_in_ms"] - e["arrival_ms"] for e in entries if e["route_in_ms"] is not None]
+        depart_late = [e["departed_ms"] - self.scheduled_departure(e) for e in entries if e["departed_ms"] is not None]
+        done = [e for e in entries if e["state"] == "done"]
+        span_ms = (max(e["cleared_ms"] for e in done) - min(e["arrival_ms"] for e in done)) if done else 0.0
+        mean_dwell = statistics.fmean(e["dwell_ms"] for e in entries) if entries else 0.0
+        capacity, route_bound, platform_bound = theoretical_capacity(self.route_times_all(), mean_dwell)
+
+        def summary(values):
+            if not values:
+                return {"mean_s": 0.0, "p95_s": 0.0, "max_s": 0.0}
+            values = sorted(values)
+            return {"mean_s": statistics.fmean(values) / 1000, "max_s": values[-1] / 1000,
+                    "p95_s": values[min(len(values) - 1, int(len(values) * 0.95))] / 1000}
+
+        return {
+            "scheduled": len(entries),
+            "completed": len(done),
+            "unfinished": sum(e["state"] != "done" for e in entries),
+            "arrival_lateness": summary(arrival_late),
+            "departure_lateness": summary(depart_late),
+            "achieved_trains_per_hour": len(done) * 3600000.0 / span_ms if span_ms else 0.0,
+            "capacity_trains_per_hour": capacity,
+            "route_lock_bound": route_bound,
+            "platform_bound": platform_bound,
+            "commands_issued": self.issued,
+            "commands_rejected": self.rejected,
+        }
+
+    def route_times_all(self):
+        """เวลาเข้า/ออกของขบวนความยาวมาตรฐานทุกชานชาลา"""
+        return {platform: self.route_times(platform, None) for platform in self.sim.platform_trains}
+
+
+def format_report(report):
+    lines = [
+        f"Trains: {report['scheduled']} scheduled, {report['completed']} completed, "
+        f"{report['unfinished']} unfinished",
+    ]
+    for name in ("arrival_lateness", "departure_lateness"):
+        s = report[name]
+        lines.append(f"{name.replace('_', ' ').capitalize():<20} mean {s['mean_s']:8.1f} s   "
+                     f"p95 {s['p95_s']:8.1f} s   max {s['max_s']:8.1f} s")
+    lines.append(f"Achieved throughput  {report['achieved_trains_per_hour']:.1f} trains/hour")
+    lines.append(f"Theoretical capacity {report['capacity_trains_per_hour']:.1f} trains/hour "
+                 f"(route lock {report['route_lock_bound']:.1f}, platforms {report['platform_bound']:.1f})")
+    lines.append(f"Commands: {report['commands_issued']} issued, {report['commands_rejected']} rejected")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dispatch trains from a timetable and report lateness and capacity.")
+    parser.add_argument("timetable", help="timetable CSV (train,arrival,platform,dwell,priority,length)")
+    parser.add_argument("--per-train", action="store_true", help="print one line per train")
+    parser.add_argument("--gui", action="store_true", help="drive the Tkinter GUI instead of running headless")
+    args = parser.parse_args(argv)
+    timetable = load_timetable(args.timetable)
+
+    if args.gui:
+        import tkinter as tk
+        from ParknamStation import TrainApp
+        root = tk.Tk()
+        app = TrainApp(root)
+        Dispatcher(app.sim, timetable)
+        app._schedule_sim()  # ให้ GUI ปลุกนาฬิกาจำลองตามคำขอในตารางเวลา
+        root.mainloop()
+        return 0
+
+    sim = TrainSimulator()
+    dispatcher = Dispatcher(sim, timetable)
+    while sim.step():
+        pass
+
+    if args.per_train:
+        for e in dispatcher.entries:
+            late = "" if e["route_in_ms"] is None else f"{(e['route_in_ms'] - e['arrival_ms']) / 1000:+8.1f} s"
+            print(f"{e['train']:<12} P{e.get('platform_used', '-')}  {e['state']:<9} arrival {late}")
+    print(format_report(dispatcher.report()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+"""
+วาดภาพการจำลองแบบ offscreen (ไม่ต้องมีจอ / X server) เป็นไฟล์ภาพทีละเฟรม หรือส่งเป็นวิดีโอ raw ต่อให้โปรแกรมอื่น
+อ่านรางจากเลย์เอาต์ ตำแหน่งรถไฟและสีไฟสัญญาณจาก TrainSimulator โดยตรง แล้ววาดลงบัฟเฟอร์ RGB
+(ใช้ NumPy ถ้ามี วาดทั้งเส้นด้วย fancy indexing ครั้งเดียว ถ้าไม่มีใช้ bytearray แทน ได้ภาพเดียวกันทุกพิกเซล)
+ป้ายข้อความไม่ถูกวาด (ต้องใช้ฟอนต์)
+
+ใช้งาน:
+    python ParknamFrames.py session.jsonl --out frames/                  # frames/frame-000000.png ...
+    python ParknamFrames.py session.jsonl --out shot.png --at 125000     # ภาพเดียวที่เวลาจำลอง 125 วินาที
+    python ParknamFrames.py session.jsonl --fps 30 --speed 10 --format raw --out - \\
+        | ffmpeg -f rawvideo -pix_fmt rgb24 -s 1250x426 -r 30 -i - session.mp4
+    (ขนาดภาพ -s พิมพ์ไว้ที่ stderr ตอนเริ่ม)
+"""
+import argparse
+import functools
+import math
+import operator
+import os
+import struct
+import sys
+import time
+import zlib
+
+from ParknamReplay import replay
+from ParknamStation import CanvasRenderer
+
+try:
+    import numpy as np
+except ImportError:  # NumPy เป็นตัวเลือก
+    np = None
+
+# ระดับการบีบอัด PNG: 1 เร็วกว่าค่าปกติของ zlib (6) ราว 3 เท่า ไฟล์ยังเล็กเพราะพื้นหลังดำเกือบทั้งภาพ
+PNG_LEVEL = 1
+# สีของ Tk ที่ CanvasRenderer ใช้ (Tk 8.6 ใช้ค่าสีแบบเว็บสำหรับ gray/green) -> (R, G, B)
+COLORS = {"black": (0, 0, 0), "gray": (128, 128, 128), "green": (0, 128, 0), "red": (255, 0, 0)}
+
+
+def rgb(color):
+    """แปลงชื่อสีของ Tk หรือ "#rrggbb" เป็น (R, G, B)"""
+    if color.startswith("#"):
+        return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+    return COLORS[color]
+
+
+# ตัววาดภาพ offscreen: พื้นหลัง (ราง) วาดครั้งเดียว แต่ละเฟรมคัดลอกพื้นหลังแล้ววาดไฟสัญญาณและรถไฟทับ
+# เส้นหนาวาดด้วยการประทับ "แปรงวงกลม" ตามจุดที่สุ่มไว้ทุกครึ่งพิกเซลตามแนวเส้น
+# จุดของแต่ละเส้นทาง (TrackPath) คำนวณครั้งเดียวแล้วเก็บไว้ รถไฟแต่ละขบวนใช้ช่วงของจุดตามหน้าต่าง tail:head
+class FrameRasterizer:
+    STEP = 0.5  # ระยะห่างของจุดตามแนวเส้น (พิกเซล)
+    MAX_PATHS = 256  # จำนวนเส้นทางที่เก็บจุดไว้ (เกินแล้วล้างทิ้งทั้งหมด)
+
+    def __init__(self, sim, scale=1.0, use_numpy=None):
+        """
+        - sim: TrainSimulator ที่ต้องการวาด
+        - scale: ขนาดภาพเทียบกับหน้าจอของ TrainApp (1.0 = 1 พิกเซลต่อ 1 พิกเซลบน canvas)
+        - use_numpy: None = ใช้ NumPy ถ้ามี, False = ใช้ bytearray เสมอ
+        """
+        if use_numpy and np is None:
+            raise RuntimeError("NumPy is not installed")
+        self.sim = sim
+        self.scale = scale
+        self.numpy = np is not None if use_numpy is None else use_numpy
+        layout = sim.layout
+        ts = sim.ts * scale
+        self.ts = ts
+        # ขนาดภาพเป็นเลขคู่เสมอ (ตัวเข้ารหัสวิดีโอแบบ yuv420 ต้องการ)
+        centres = layout.geometry.centres
+        bottom = max(centres[1::2]) * scale + 2 * ts if len(centres) else ts
+        self.width = 2 * math.ceil(layout.width * ts / 2)
+        self.height = 2 * math.ceil(bottom / 2)
+        self._paths = {}  # TrackPath -> (xs, ys, จุดเริ่มของแต่ละไทล์)
+        self._brushes = {}  # รัศมี -> แถวของแปรงวงกลม
+        self.signals = {name: (spec["at"][0] * ts, spec["at"][1] * ts) for name, spec in layout.signals.items()}
+        self.frames = 0
+
+        # พื้นหลัง: ดำ + รางพื้นฐาน + รางชานชาลา (สีเทาเสมอ เหมือน reset_platform_track)
+        if self.numpy:
+            self.background = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        else:
+            self.background = bytearray(self.width * self.height * 3)
+        track_width = max(2, sim.ts / 2.5) * scale
+        gray = rgb("gray")
+        for segments in layout.draw:
+            self._stroke(self.background, functools.reduce(operator.add, segments), 0, None, track_width, gray)
+        for path in layout.platform_tracks.values():
+            self._stroke(self.background, path, 0, None, track_width, gray)
+
+    def render(self):
+        """วาด 1 เฟรมจากสถานะปัจจุบันของ sim คืนค่าพิกเซล RGB24 (แถวบนลงล่าง) เป็น bytes-like ขนาด width*height*3"""
+        sim = self.sim
+        buf = self.background.copy() if self.numpy else bytearray(self.background)
+        r = self.ts * 0.5
+        for name, color in sim.signal_states().items():
+            x, y = self.signals[name]
+            self._stamp(buf, [math.floor(x)], [math.floor(y)], r, rgb(color))
+        for train in sim.trains.values():
+            # วาดเฉพาะเมื่อยาวมากกว่า 1 ไทล์ (เหมือน TrainSprite)
+            if train.head - train.tail >= 2:
+                self._stroke(buf, train.path, train.tail, train.head, self.ts, rgb(CanvasRenderer.train_color(train)))
+        self.frames += 1
+        return buf
+
+    def _samples(self, path):
+        """จุดพิกเซล (x, y) ตามแนวเส้นกึ่งกลางของ path (ตัดจุดซ้ำที่ติดกัน) และ index ของจุดที่ตรงกับแต่ละไทล์"""
+        cached = self._paths.get(path)
+        if cached is not None:
+            return cached
+        if len(self._paths) >= self.MAX_PATHS:
+            self._paths.clear()
+        scale, step = self.scale, self.STEP
+        centres = path.centres()
+        xs, ys, starts = [], [], []
+        last = None
+        px = py = None
+        for i in range(0, len(centres), 2):
+            x, y = centres[i] * scale, centres[i + 1] * scale
+            if px is None:
+                points = ((x, y),)
+            else:
+                dx, dy = x - px, y - py
+                n = max(1, math.ceil(math.hypot(dx, dy) / step))
+                points = [(px + dx * k / n, py + dy * k / n) for k in range(1, n + 1)]
+            for fx, fy in points:
+                pixel = (math.floor(fx), math.floor(fy))
+                if pixel != last:
+                    xs.append(pixel[0])
+                    ys.append(pixel[1])
+                    last = pixel
+            starts.append(len(xs) - 1)  # จุดสุดท้ายที่เพิ่ม = ตำแหน่งของไทล์นี้
+            px, py = x, y
+        if self.numpy:
+            xs, ys = np.array(xs, dtype=np.intp), np.array(ys, dtype=np.intp)
+        cached = self._paths[path] = (xs, ys, starts)
+        return cached
+
+    def _stroke(self, buf, path, tail, head, width, color):
+        """วาดเส้นหนา width ตามไทล์ path[tail:head] (head=None = ถึงปลายเส้น)"""
+        xs, ys, starts = self._samples(path)
+        if not starts:
+            return
+        last = len(starts) if head is None else min(head, len(starts))
+        if last <= tail:
+            return
+        a, b = starts[tail], starts[last - 1] + 1
+        self._stamp(buf, xs[a:b], ys[a:b], max(0.5, width / 2), color)
+
+    def _brush(self, r):
+        """แปรงวงกลมรัศมี r: รายการ (dy, ครึ่งความกว้างของแถว) และ offset ทุกพิกเซล (สำหรับ NumPy)"""
+        brush = self._brushes.get(r)
+        if brush is None:
+            reach = int(r)
+            rows = [(dy, int(math.sqrt(r * r - dy * dy))) for dy in range(-reach, reach + 1)]
+            offsets = [(dx, dy) for dy, half in rows for dx in range(-half, half + 1)]
+            if self.numpy:
+                offsets = np.array(offsets, dtype=np.intp)
+                offsets = (offsets[:, 0], offsets[:, 1])
+            brush = self._brushes[r] = (rows, offsets)
+        return brush
+
+    def _stamp(self, buf, xs, ys, r, color):
+        """ประทับแปรงวงกลมรัศมี r ที่ทุกจุด (xs[i], ys[i]) ด้วยสี color (ส่วนที่เกินขอบภาพถูกตัดทิ้ง)"""
+        rows, offsets = self._brush(r)
+        width, height = self.width, self.height
+        if self.numpy:
+            # ทุกจุด x ทุก offset ของแปรง ในการกำหนดค่าครั้งเดียว
+            px = (np.asarray(xs)[:, None] + offsets[0]).ravel()
+            py = (np.asarray(ys)[:, None] + offsets[1]).ravel()
+            inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+            buf[py[inside], px[inside]] = color
+            return
+        pixel = bytes(color)
+        for x, y in zip(xs, ys):
+            for dy, half in rows:
+                row = y + dy
+                if row < 0 or row >= height:
+                    continue
+                x0, x1 = max(0, x - half), min(width, x + half + 1)
+                if x0 < x1:
+                    start = (row * width + x0) * 3
+                    buf[start:start + (x1 - x0) * 3] = pixel * (x1 - x0)
+
+
+def encode_ppm(width, height, data):
+    """ภาพ RGB24 -> ไฟล์ PPM (P6)"""
+    return b"P6\n%d %d\n255\n" % (width, height) + bytes(data)
+
+
+def encode_png(width, height, data, level=PNG_LEVEL):
+    """ภาพ RGB24 -> ไฟล์ PNG (truecolor 8 บิต ไม่ใช้ filter) ใช้แค่ zlib ของ Python"""
+    data = memoryview(data).cast("B")
+    stride = width * 3
+    # ทุกแถวขึ้นต้นด้วยไบต์ filter type 0 (None)
+    raw = b"\x00" + b"\x00".join([data[i:i + stride] for i in range(0, height * stride, stride)])
+
+    def chunk(kind, body):
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, level)) + chunk(b"IEND", b""))
+
+
+# ตัวเขียนเฟรม: ไฟล์ภาพทีละเฟรม (png/ppm) หรือต่อกันเป็นวิดีโอ raw (rgb24) ลงไฟล์/stdout
+class FrameWriter:
+    def __init__(self, out, fmt, width, height, level=PNG_LEVEL):
+        """
+        - out: โฟลเดอร์ / รูปแบบชื่อไฟล์ที่มี {frame} หรือ %d (png/ppm), ไฟล์หรือ "-" = stdout (raw)
+        - fmt: "png", "ppm" หรือ "raw"
+        """
+        self.fmt = fmt
+        self.width, self.height = width, height
+        self.level = level
+        self.count = 0
+        self.stream = None
+        if fmt == "raw":
+            self.stream = sys.stdout.buffer if out == "-" else open(out, "wb")
+            return
+        if "{" in out or "%" in out:
+            self.pattern = out
+            os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+        else:
+            os.makedirs(out, exist_ok=True)
+            self.pattern = os.path.join(out, "frame-{frame:06d}." + fmt)
+
+    def path(self, index):
+        """ชื่อไฟล์ของเฟรมที่ index"""
+        if "%" in self.pattern:
+            return self.pattern % index
+        return self.pattern.format(frame=index)
+
+    def write(self, data):
+        """เขียน 1 เฟรม (RGB24)"""
+        if self.stream is not None:
+            self.stream.write(data)
+        else:
+            save_image(self.path(self.count), self.width, self.height, data, self.fmt, self.level)
+        self.count += 1
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.flush()
+            if self.stream is not sys.stdout.buffer:
+                self.stream.close()
+            self.stream = None
+
+
+def save_image(path, width, height, data, fmt=None, level=PNG_LEVEL):
+    """เขียนภาพ 1 ไฟล์ (fmt=None = เลือกจากนามสกุล .ppm หรือ PNG)"""
+    if fmt is None:
+        fmt = "ppm" if path.endswith(".ppm") else "png"
+    encoded = encode_ppm(width, height, data) if fmt == "ppm" else encode_png(width, height, data, level)
+    with open(path, "wb") as f:
+        f.write(encoded)
+
+
+def snapshot(sim, path, scale=1.0, use_numpy=None):
+    """บันทึกภาพสถานะปัจจุบันของ sim 1 ไฟล์ (เช่น ภาพสุดท้ายของ run ใน ParknamBatch)"""
+    raster = FrameRasterizer(sim, scale, use_numpy)
+    save_image(path, raster.width, raster.height, raster.render())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a recorded Parknam session to images or raw video, headlessly.")
+    parser.add_argument("session", help="session-*.jsonl written by TrainApp")
+    parser.add_argument("--out", default="frames", help="directory or file pattern ({frame} / %%d); raw: file or - (stdout)")
+    parser.add_argument("--format", choices=["png", "ppm", "raw"], default="png", help="image format or raw rgb24 video")
+    parser.add_argument("--fps", type=float, default=30.0, help="output frames per second of video")
+    parser.add_argument("--speed", type=float, default=1.0, help="simulated seconds per second of video")
+    parser.add_argument("--until", type=float, default=None, help="stop at this simulated time (ms)")
+    parser.add_argument("--at", type=float, default=None, help="write a single image at this simulated time (ms) to --out")
+    parser.add_argument("--scale", type=float, default=1.0, help="image size relative to the GUI canvas")
+    parser.add_argument("--level", type=int, default=PNG_LEVEL, help="PNG compression level (0-9)")
+    parser.add_argument("--no-numpy", action="store_true", help="rasterise with plain Python even if NumPy is installed")
+    args = parser.parse_args(argv)
+
+    use_numpy = False if args.no_numpy else None
+    started = time.perf_counter()
+    if args.at is not None:
+        sim, result = replay(args.session, args.at)
+        snapshot(sim, args.out, args.scale, use_numpy)
+        print(f"Wrote {args.out} at {sim.now / 1000:.1f} s ({time.perf_counter() - started:.3f} s).", file=sys.stderr)
+        return 0
+
+    state = {"raster": None, "writer": None}
+    render_s = 0.0
+
+    def on_frame(sim):
+        nonlocal render_s
+        if state["raster"] is None:
+            raster = state["raster"] = FrameRasterizer(sim, args.scale, use_numpy)
+            state["writer"] = FrameWriter(args.out, args.format, raster.width, raster.height, args.level)
+            print(f"{raster.width}x{raster.height} {args.format}, {'numpy' if raster.numpy else 'python'}", file=sys.stderr)
+        t = time.perf_counter()
+        state["writer"].write(state["raster"].render())
+        render_s += time.perf_counter() - t
+
+    try:
+        sim, result = replay(args.session, args.until, on_frame=on_frame, frame_ms=1000.0 * args.speed / args.fps)
+    finally:
+        if state["writer"] is not None:
+            state["writer"].close()
+    elapsed = time.perf_counter() - started
+    frames = state["writer"].count if state["writer"] else 0
+    video_s = frames / args.fps
+    print(f"{frames} frames ({video_s:.1f} s of video, {sim.now / 1000:.1f} s simulated) in {elapsed:.2f} s: "
+          f"{frames / max(elapsed, 1e-9):.0f} frames/s, {video_s / max(elapsed, 1e-9):.1f}x real time "
+          f"({1000 * render_s / max(frames, 1):.2f} ms/frame drawing + encoding)", file=sys.stderr)
+    if result["diverged"] or result["digest_ok"] is False:
+        print(f"DIVERGED {result['diverged'] or 'final state does not match the recording'}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,421 @@
+"""
+จำลองสายรถไฟหลายสถานีต่อกัน (แต่ละสถานี = TrainSimulator 1 ตัว) กระจายไปหลาย process
+ขบวนที่วิ่งพ้นทางออกของสถานีหนึ่ง (เหตุการณ์ "exit") ถูกส่งต่อให้สถานีถัดไป ถึงสัญญาณเข้าหลังจากนั้น link_ms
+เวลาเดินทางนี้เป็น lookahead: สถานีหนึ่งเดินเวลานำสถานีก่อนหน้าได้ไม่เกิน link_ms โดยไม่มีทางได้ขบวนมาช้ากว่าเวลาของตัวเอง
+
+สถานีถูกแบ่งเป็นช่วงต่อเนื่อง (shard) ละ 1 process ส่งต่อขบวนภายใน shard โดยตรง ข้าม shard ผ่าน multiprocessing.Queue
+การคุมนาฬิกา (--sync):
+- lockstep: ผู้ประสานงานสั่งทุก shard เดินเวลาทีละหน้าต่าง (window_ms ≤ link_ms) พร้อมกัน รอครบทุกตัว
+  แล้วส่งขบวนที่ออกจาก shard หนึ่งให้ shard ถัดไปในหน้าต่างถัดไป
+- skew: แต่ละ shard เดินเวลาเองไม่รอรอบ ได้ไม่เกินนาฬิกาของ shard ก่อนหน้า + link_ms (ขบวนที่ยังไม่ได้รับจะมาไม่ทัน)
+  และไม่เกินนาฬิกาของ shard ถัดไป + max_skew_ms (จำกัดจำนวนขบวนที่ค้างอยู่ในคิว)
+ขบวนที่ถึงสถานีถูกรับหลังเหตุการณ์อื่นทั้งหมดของเวลานั้นเสมอ ผลจึงเหมือนกันทุกประการไม่ว่าจะใช้กี่ process หรือ sync แบบไหน
+
+ใช้งาน:
+    python ParknamLine.py --stations 50 --hours 2
+    python ParknamLine.py --stations 50 --workers 8 --sync skew --json line.json
+    python ParknamLine.py --stations 50 --workers 1        # ทุกสถานีใน process เดียว (ไว้เทียบความเร็ว/ผล)
+"""
+import argparse
+import collections
+import hashlib
+import heapq
+import json
+import multiprocessing
+import os
+import queue
+import random
+import statistics
+import sys
+import time
+
+from ParknamStation import StationController, TrainSimulator
+
+# ค่าเริ่มต้นของสาย
+DEFAULTS = {
+    "stations": 50,
+    "duration_ms": 3600000,
+    "arrival": "poisson",    # ขบวนเข้าสถานีแรก: "poisson" | "fixed"
+    "headway_ms": 150000,    # ระยะห่างเฉลี่ยระหว่างขบวนที่เข้าสถานีแรก
+    "train_lengths": [17],
+    "dwell_ms": 30000,       # เวลาจอดที่ชานชาลา
+    "link_ms": 60000,        # เวลาเดินทางจากทางออกของสถานีหนึ่งถึงสัญญาณเข้าของสถานีถัดไป
+    "skip_fraction": 0.0,    # โอกาสที่ขบวนวิ่งผ่านสถานีหนึ่งโดยไม่จอด (สุ่มตอนเข้าสาย)
+    "seed": 0,
+}
+
+
+# สถานี 1 แห่งในสาย: ผู้ควบคุมอัตโนมัติรับขบวนที่ส่งต่อมา ตั้งทางเข้าชานชาลาที่ว่าง จอดครบ dwell แล้วปล่อยออก
+# ขบวนที่วิ่งพ้นทางออก (เหตุการณ์ "exit") ถูกเก็บใน outbox พร้อมเวลาที่จะถึงสถานีถัดไป
+class LineStation(StationController):
+
+    def __init__(self, index, params):
+        super().__init__(TrainSimulator(), params["dwell_ms"])
+        self.index = index
+        self.params = params
+        self.incoming = []  # heap ของ (เวลาถึงสัญญาณเข้า, id, ขบวน) ที่ส่งต่อมาแล้วแต่ยังไม่ถึง
+        self.waiting = collections.deque()  # ขบวนที่ถึงสัญญาณเข้าแล้ว รอทางเข้า
+        self.on_board = {}  # train id ใน Simulator -> ขบวน (dict ที่ส่งต่อกันระหว่างสถานี)
+        self.outbox = []  # ขบวนที่ออกจากสถานีนี้แล้ว รอส่งต่อ
+
+        # ตัวชี้วัด
+        self.arrived = 0
+        self.departed = 0
+        self.route_waits = []
+
+    def receive(self, train):
+        """รับขบวนที่จะถึงสัญญาณเข้าเวลา train["due"] (ต้องไม่ก่อนนาฬิกาของสถานีนี้)"""
+        if train["due"] < self.sim.now:
+            raise RuntimeError(f"station {self.index}: {train['id']} handed over for {train['due']:.0f} ms "
+                               f"but the clock is already at {self.sim.now:.0f} ms")
+        heapq.heappush(self.incoming, (train["due"], train["id"], train))
+
+    def advance(self, until):
+        """เดินเวลาถึง until ขบวนที่ถึงสัญญาณเข้าถูกรับหลังเหตุการณ์อื่นของเวลาเดียวกัน (ไม่ขึ้นกับว่ารับมาเมื่อไร)"""
+        sim, incoming = self.sim, self.incoming
+        while incoming and incoming[0][0] <= until:
+            due, _, train = heapq.heappop(incoming)
+            sim.run_until(due)
+            self._arrive(train)
+        sim.run_until(until)
+
+    def _arrive(self, train):
+        self.arrived += 1
+        train["at"] = self.sim.now
+        self.waiting.append(train)
+        self._wake()
+
+    # --- การสั่งการ ---
+
+    def _admit(self, now):
+        """รับขบวนที่รอนานที่สุดเข้าชานชาลาแรกที่ว่าง (ขาเข้าใช้ตอนรางร่วมกัน รับได้ครั้งละขบวน)"""
+        sim = self.sim
+        if self.waiting:
+            platform = self._free_platform()
+            if platform is not None and sim.set_route_in(platform):
+                train = self.waiting[0]
+                through = bool(train["skip"] >> self.index & 1)
+                if sim.call_train(train["length"], train["speed"], through=through, accel=train["accel"]):
+                    self.waiting.popleft()
+                    self.route_waits.append(now - train["at"])
+                    self.on_board[sim.route_trains[sim.inbound_routes[platform]].id] = train
+
+    def _free_platform(self):
+        sim = self.sim
+        for platform, route in sorted(sim.inbound_routes.items()):
+            if sim.route_available(route) and not sim.platform_occupied[platform] and sim.platform_trains[platform] is None:
+                return platform
+        return None
+
+    def _on_event(self, event, data):
+        sim = self.sim
+        if event == "exit":
+            train = self.on_board.pop(data["train_id"], None)
+            if train is not None:
+                self.departed += 1
+                train.update(left=sim.now, due=sim.now + self.params["link_ms"], speed=data["speed"], accel=data["accel"])
+                self.outbox.append(train)
+        super()._on_event(event, data)
+
+    def metrics(self):
+        return {
+            "station": self.index,
+            "arrived": self.arrived,
+            "departed": self.departed,
+            "waiting_at_end": len(self.waiting) + len(self.incoming),
+            "route_wait_mean_ms": statistics.fmean(self.route_waits) if self.route_waits else 0.0,
+            "route_wait_max_ms": max(self.route_waits, default=0.0),
+            "ticks": self.sim.ticks,
+            "digest": self.sim.state_digest(),
+        }
+
+
+def schedule_trains(params):
+    """ขบวนที่เข้าสถานีแรกตลอดช่วงจำลอง (สุ่มจาก seed เดียวกันเสมอ ไม่ขึ้นกับจำนวน process)"""
+    rng = random.Random(params["seed"])
+    trains, t = [], 0.0
+    while True:
+        if params["arrival"] == "fixed":
+            t += params["headway_ms"]
+        elif params["arrival"] == "poisson":
+            t += rng.expovariate(1.0 / params["headway_ms"])
+        else:
+            raise ValueError(f"unknown arrival pattern {params['arrival']!r}")
+        if t >= params["duration_ms"]:
+            return trains
+        skip = 0  # บิตที่ k = วิ่งผ่านสถานี k โดยไม่จอด
+        for station in range(params["stations"]):
+            if rng.random() < params["skip_fraction"]:
+                skip |= 1 << station
+        trains.append({"id": f"L{len(trains) + 1:04d}", "due": t, "entered": t, "length": rng.choice(params["train_lengths"]),
+                       "speed": 1.0, "accel": None, "skip": skip})
+
+
+# ช่วงของสถานีที่ต่อกันใน process เดียว: ส่งต่อขบวนภายในช่วงโดยตรง
+# ขบวนที่ออกจากสถานีสุดท้ายของช่วงถูกคืนให้ผู้เรียกส่งต่อข้าม process
+class Shard:
+
+    def __init__(self, first, count, params):
+        self.stations = [LineStation(index, params) for index in range(first, first + count)]
+        self.now = 0.0
+        self.busy_s = 0.0  # เวลาจริงที่ใช้จำลอง
+        self.wait_s = 0.0  # เวลาจริงที่รอ shard อื่น / ผู้ประสานงาน
+        if first == 0:
+            for train in schedule_trains(params):
+                self.stations[0].receive(train)
+
+    def receive(self, trains):
+        for train in trains:
+            self.stations[0].receive(train)
+
+    def advance(self, until):
+        """เดินเวลาทุกสถานีในช่วงถึง until (ตามลำดับสาย) คืนค่าขบวนที่ออกจากสถานีสุดท้ายของช่วง"""
+        started = time.perf_counter()
+        stations = self.stations
+        for station, following in zip(stations, stations[1:]):
+            station.advance(until)
+            # ขบวนที่เพิ่งออกถึงสถานีถัดไปหลังจากนั้น link_ms (สถานีถัดไปยังไม่ได้เดินเวลาในรอบนี้)
+            for train in station.outbox:
+                following.receive(train)
+            station.outbox.clear()
+        last = stations[-1]
+        last.advance(until)
+        out, last.outbox = last.outbox, []
+        self.now = until
+        self.busy_s += time.perf_counter() - started
+        return out
+
+    def report(self):
+        return {"stations": [station.metrics() for station in self.stations],
+                "busy_s": self.busy_s, "wait_s": self.wait_s}
+
+
+def split_stations(stations, workers):
+    """แบ่งสถานีเป็นช่วงต่อเนื่องเท่าๆ กัน: รายการ (สถานีแรก, จำนวนสถานี)"""
+    workers = max(1, min(workers, stations))
+    base, extra = divmod(stations, workers)
+    shards, first = [], 0
+    for i in range(workers):
+        count = base + (i < extra)
+        shards.append((first, count))
+        first += count
+    return shards
+
+
+def run_worker(index, first, count, params, sync, inboxes, results):
+    """process ลูก: จำลอง 1 shard แล้วส่งรายงาน (และขบวนที่จบสาย ถ้าเป็น shard สุดท้าย) กลับทาง results"""
+    shard = Shard(first, count, params)
+    completed = []
+    if sync == "lockstep":
+        inbox = inboxes[index]
+        while True:
+            started = time.perf_counter()
+            message = inbox.get()
+            shard.wait_s += time.perf_counter() - started
+            if message[0] == "stop":
+                break
+            _, until, trains = message
+            shard.receive(trains)
+            results.put(("advanced", index, shard.advance(until)))
+    else:
+        completed = _run_skew(shard, index, params, inboxes)
+    results.put(("done", index, shard.report(), completed))
+
+
+def _run_skew(shard, index, params, inboxes):
+    """
+    เดินเวลาของ shard เองโดยไม่รอรอบ (bounded skew)
+    - ข้อความจาก shard ก่อนหน้า ("trains", ขบวน, t): ส่งขบวนที่ออกจนถึงเวลา t ครบแล้ว -> เดินได้ถึง t + link_ms
+    - ข้อความจาก shard ถัดไป ("clock", t): shard ถัดไปเดินถึง t แล้ว -> เดินได้ถึง t + max_skew_ms
+    ข้อความจากผู้ส่งเดียวกันมาถึงตามลำดับที่ส่ง (Queue เป็น FIFO ต่อผู้ส่ง)
+    """
+    end, link, window, skew = params["duration_ms"], params["link_ms"], params["window_ms"], params["max_skew_ms"]
+    inbox = inboxes[index]
+    upstream = inboxes[index - 1] if index > 0 else None
+    downstream = inboxes[index + 1] if index + 1 < len(inboxes) else None
+    up_clock = 0.0 if upstream is not None else float("inf")
+    down_clock = 0.0 if downstream is not None else float("inf")
+    completed = []
+    while shard.now < end:
+        horizon = min(end, shard.now + window, up_clock + link, down_clock + skew)
+        if horizon > shard.now:
+            out = shard.advance(horizon)
+            if downstream is not None:
+                downstream.put(("trains", out, horizon))
+            else:
+                completed.extend(out)
+            if upstream is not None and up_clock < end:
+                upstream.put(("clock", horizon))  # shard ก่อนหน้าที่จบแล้วไม่อ่านคิวอีก
+            block = False
+        else:
+            block = True  # ต้องรอ shard ข้างเคียง
+        while True:
+            try:
+                if block:
+                    started = time.perf_counter()
+                    message = inbox.get()
+                    shard.wait_s += time.perf_counter() - started
+                    block = False
+                else:
+                    message = inbox.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "trains":
+                shard.receive(message[1])
+                up_clock = message[2]
+            else:
+                down_clock = message[1]
+    return completed
+
+
+def _receive(results, processes):
+    """อ่านผลจาก process ลูก (แจ้ง RuntimeError ถ้ามี process ที่ล้มไปก่อนส่งผล แทนที่จะรอไปตลอด)"""
+    while True:
+        try:
+            return results.get(timeout=1.0)
+        except queue.Empty:
+            failed = [p.name for p in processes if p.exitcode not in (None, 0)]
+            if failed:
+                raise RuntimeError(f"worker process failed: {', '.join(failed)}") from None
+
+
+def run_line(params, workers=None, sync="lockstep"):
+    """
+    จำลองทั้งสาย คืนค่ารายงาน (dict)
+    - workers: จำนวน process (None = จำนวน CPU, 1 = ทุกสถานีใน process นี้)
+    - sync: "lockstep" หรือ "skew"
+    """
+    params = dict(DEFAULTS, **params)
+    params.setdefault("window_ms", params["link_ms"])
+    params.setdefault("max_skew_ms", 4 * params["link_ms"])
+    if not 0 < params["window_ms"] <= params["link_ms"]:
+        raise ValueError("window_ms must be positive and not longer than link_ms")
+    if params["max_skew_ms"] <= 0:
+        raise ValueError("max_skew_ms must be positive")
+    if sync not in ("lockstep", "skew"):
+        raise ValueError(f"unknown sync mode {sync!r}")
+    shards = split_stations(params["stations"], workers or os.cpu_count())
+    end, window = params["duration_ms"], params["window_ms"]
+    started = time.perf_counter()
+
+    if len(shards) == 1:
+        shard = Shard(0, params["stations"], params)
+        completed = []
+        t = 0.0
+        while t < end:
+            t = min(end, t + window)
+            completed.extend(shard.advance(t))
+        reports = [shard.report()]
+    else:
+        context = multiprocessing.get_context()
+        inboxes = [context.Queue() for _ in shards]
+        results = context.Queue()
+        processes = [context.Process(target=run_worker, args=(i, first, count, params, sync, inboxes, results), daemon=True)
+                     for i, (first, count) in enumerate(shards)]
+        for process in processes:
+            process.start()
+        completed = []
+        reports = [None] * len(shards)
+        if sync == "lockstep":
+            # ผู้ประสานงาน: ทุก shard เดินหน้าต่างเดียวกันพร้อมกัน ขบวนที่ออกจาก shard หนึ่งถึง shard ถัดไปไม่ก่อน
+            # เวลาออก + link_ms >= จุดจบหน้าต่างนี้ จึงส่งให้ในหน้าต่างถัดไปได้ทัน
+            handoffs = [[] for _ in shards]
+            t = 0.0
+            while t < end:
+                t = min(end, t + window)
+                for i, inbox in enumerate(inboxes):
+                    inbox.put(("advance", t, handoffs[i]))
+                handoffs = [[] for _ in shards]
+                for _ in shards:
+                    _, i, out = _receive(results, processes)
+                    if i + 1 < len(shards):
+                        handoffs[i + 1] = out
+                    else:
+                        completed.extend(out)
+            for inbox in inboxes:
+                inbox.put(("stop",))
+        for _ in shards:
+            _, i, report, done = _receive(results, processes)
+            reports[i] = report
+            completed.extend(done)
+        for process in processes:
+            process.join()
+
+    wall = time.perf_counter() - started
+    stations = [station for report in reports for station in report["stations"]]
+    journeys = sorted(train["left"] - train["entered"] for train in completed)
+    digest = hashlib.sha1(repr(([s["digest"] for s in stations], [(t["id"], t["left"]) for t in completed])).encode())
+    return {
+        "stations": params["stations"],
+        "workers": len(shards),
+        "sync": sync if len(shards) > 1 else "inline",
+        "duration_ms": end,
+        "wall_s": wall,
+        "speedup_vs_realtime": end / 1000.0 / wall if wall else 0.0,
+        "entered": stations[0]["arrived"] if stations else 0,
+        "completed": len(completed),
+        "journey_mean_ms": statistics.fmean(journeys) if journeys else 0.0,
+        "journey_p95_ms": journeys[min(len(journeys) - 1, int(len(journeys) * 0.95))] if journeys else 0.0,
+        "ticks": sum(s["ticks"] for s in stations),
+        "shards": [{"stations": len(report["stations"]), "busy_s": report["busy_s"], "wait_s": report["wait_s"]}
+                   for report in reports],
+        "digest": digest.hexdigest()[:16],
+        "per_station": stations,
+    }
+
+
+def format_report(report):
+    lines = [
+        f"{report['stations']} stations on {report['workers']} workers ({report['sync']}), "
+        f"{report['duration_ms'] / 1000:.0f} s simulated in {report['wall_s']:.2f} s "
+        f"({report['speedup_vs_realtime']:.0f}x real time, {report['ticks']} ticks)",
+        f"trains entered {report['entered']}, completed the line {report['completed']}, "
+        f"journey mean {report['journey_mean_ms'] / 1000:.1f} s, p95 {report['journey_p95_ms'] / 1000:.1f} s",
+    ]
+    busy = [shard["busy_s"] for shard in report["shards"]]
+    waits = [shard["wait_s"] for shard in report["shards"]]
+    lines.append(f"shard busy {min(busy):.2f}-{max(busy):.2f} s, waiting {min(waits):.2f}-{max(waits):.2f} s")
+    lines.append(f"digest {report['digest']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate a line of Parknam-style stations across worker processes.")
+    parser.add_argument("--stations", type=int, default=DEFAULTS["stations"])
+    parser.add_argument("--hours", type=float, default=DEFAULTS["duration_ms"] / 3600000, help="simulated duration")
+    parser.add_argument("--headway", type=float, default=DEFAULTS["headway_ms"] / 1000, help="mean seconds between trains entering the line")
+    parser.add_argument("--arrival", choices=["poisson", "fixed"], default=DEFAULTS["arrival"])
+    parser.add_argument("--dwell", type=float, default=DEFAULTS["dwell_ms"] / 1000, help="seconds at each platform")
+    parser.add_argument("--link", type=float, default=DEFAULTS["link_ms"] / 1000, help="seconds between stations")
+    parser.add_argument("--skip", type=float, default=DEFAULTS["skip_fraction"], help="chance to run through a station")
+    parser.add_argument("--seed", type=int, default=DEFAULTS["seed"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (1 = run inline)")
+    parser.add_argument("--sync", choices=["lockstep", "skew"], default="lockstep", help="clock coordination between workers")
+    parser.add_argument("--window", type=float, help="seconds per lock-step window / skew step (default = --link)")
+    parser.add_argument("--max-skew", type=float, help="seconds a worker may run ahead of the next one in skew mode (default = 4 x --link)")
+    parser.add_argument("--per-station", action="store_true", help="print every station's metrics")
+    parser.add_argument("--json", help="write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    params = {"stations": args.stations, "duration_ms": args.hours * 3600000, "headway_ms": args.headway * 1000,
+              "arrival": args.arrival, "dwell_ms": args.dwell * 1000, "link_ms": args.link * 1000,
+              "skip_fraction": args.skip, "seed": args.seed}
+    if args.window is not None:
+        params["window_ms"] = args.window * 1000
+    if args.max_skew is not None:
+        params["max_skew_ms"] = args.max_skew * 1000
+    report = run_line(params, args.workers, args.sync)
+    print(format_report(report))
+    if args.per_station:
+        print(f"   {'station':>7}{'arrived':>9}{'departed':>10}{'waiting':>9}{'wait mean (s)':>15}{'wait max (s)':>14}")
+        for s in report["per_station"]:
+            print(f"   {s['station']:>7}{s['arrived']:>9}{s['departed']:>10}{s['waiting_at_end']:>9}"
+                  f"{s['route_wait_mean_ms'] / 1000:>15.1f}{s['route_wait_max_ms'] / 1000:>14.1f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+เล่นซ้ำ (replay) บันทึกคำสั่งที่ TrainApp เขียนไว้ (SessionRecorder) โดยไม่ใช้ GUI
+นาฬิกาจำลองเดินเร็วที่สุดเท่าที่ CPU ทำได้ แต่ผลลัพธ์ตรงกับตอนที่บันทึกทุก tick
+
+ใช้งาน:
+    python ParknamReplay.py session-20250101-080000.jsonl
+    python ParknamReplay.py session.jsonl --until 125000 --verbose   # หยุดที่เวลาจำลอง 125 วินาที
+"""
+import argparse
+import json
+import sys
+import time
+
+from ParknamStation import SessionRecorder, TrainSimulator
+
+# คำสั่งที่อนุญาตให้เล่นซ้ำ (ตรงกับ handle_* ของ TrainApp)
+COMMANDS = {"set_route_in", "set_route_out", "call_train", "emergency_stop"}
+
+
+def load_session(path):
+    """อ่านไฟล์บันทึก คืนค่า (header, รายการคำสั่ง)"""
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != SessionRecorder.FORMAT:
+            raise ValueError(f"{path}: not a session recording")
+        if header.get("version") != SessionRecorder.VERSION:
+            # ผลการจำลองของรุ่นอื่นต่างจาก Simulator ปัจจุบัน (ดู SessionRecorder.VERSION) แจ้งชัดๆ แทนการเล่นแล้วไม่ตรง
+            raise ValueError(f"{path}: unsupported version {header.get('version')} "
+                             f"(this simulator replays version {SessionRecorder.VERSION} recordings)")
+        records = [json.loads(line) for line in f if line.strip()]
+    return header, records
+
+
+def replay(path, until=None, logger_callback=None, on_command=None, on_frame=None, frame_ms=None):
+    """
+    เล่นซ้ำไฟล์บันทึกบน TrainSimulator แบบ headless
+    - until: หยุดที่เวลาจำลองนี้ (ms) แทนการเล่นจนจบ
+    - on_command(sim, record): ถูกเรียกก่อนทำแต่ละคำสั่ง
+    - on_frame(sim): ถูกเรียกทุก frame_ms ของเวลาจำลอง (เริ่มที่ 0) เช่น ใช้วาดภาพ (ดู ParknamFrames.py)
+    คืนค่า (sim, ผลลัพธ์) โดยผลลัพธ์มี commands, diverged (ข้อความหรือ None), digest_ok (True/False/None)
+    """
+    header, records = load_session(path)
+    # ไฟล์บันทึกรุ่นก่อนไม่มี "layout" (ใช้สถานีปากน้ำ)
+    sim = TrainSimulator(screen_width=header.get("screen_width", 1250), logger_callback=logger_callback,
+                         layout=header.get("layout"))
+    result = {"commands": 0, "diverged": None, "digest_ok": None}
+    next_frame = 0.0
+
+    def advance(t):
+        # หยุดที่เวลาของทุกเฟรมระหว่างทาง (ผลการจำลองเหมือนเดินรวดเดียว เพราะ run_until ทำเหตุการณ์ตามลำดับเวลาเสมอ)
+        nonlocal next_frame
+        while on_frame is not None and next_frame <= t:
+            sim.run_until(next_frame)
+            on_frame(sim)
+            next_frame += frame_ms
+        sim.run_until(t)
+
+    for record in records:
+        t, ticks, name, *args = record
+        if until is not None and t > until:
+            advance(until)
+            break
+        advance(t)
+
+        # จำนวน tick ต้องตรงกับตอนบันทึก ถ้าไม่ตรงแปลว่าการจำลองไม่ deterministic แล้ว
+        if sim.ticks != ticks:
+            result["diverged"] = f"at {t:.1f} ms before {name}: {sim.ticks} ticks, recorded {ticks}"
+            break
+        if name == "end":
+            result["digest_ok"] = sim.state_digest() == args[0]
+            break
+        if name not in COMMANDS:
+            raise ValueError(f"{path}: unknown command {name!r}")
+
+        if on_command is not None:
+            on_command(sim, record)
+        getattr(sim, name)(*args)
+        result["commands"] += 1
+    else:
+        # ไฟล์ไม่มีรายการ "end" (เช่นโปรแกรมล่ม): เล่นต่อจนคิวเหตุการณ์ว่างหรือถึง until
+        if until is not None:
+            advance(until)
+        elif on_frame is not None:
+            while sim.next_event_time() is not None:
+                advance(min(sim.next_event_time(), next_frame))
+        else:
+            while sim.step():
+                pass
+    return sim, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded Parknam control session headlessly.")
+    parser.add_argument("session", help="session-*.jsonl written by TrainApp")
+    parser.add_argument("--until", type=float, default=None, help="stop at this simulated time (ms)")
+    parser.add_argument("--verbose", "-v", action="store_true", help="print commands and simulator log")
+    args = parser.parse_args(argv)
+
+    def show_log(record):
+        print(f"{record.sim_time:12.1f}  {record.text}")
+
+    def show_command(sim, record):
+        print(f"{record[0]:12.1f}  > {record[2]}({', '.join(map(repr, record[3:]))})")
+
+    started = time.perf_counter()
+    try:
+        sim, result = replay(args.session, args.until,
+                             logger_callback=show_log if args.verbose else None,
+                             on_command=show_command if args.verbose else None)
+    except ValueError as e:  # ไม่ใช่ไฟล์บันทึก หรือรุ่นที่เล่นซ้ำไม่ได้
+        print(f"Cannot replay {e}", file=sys.stderr)
+        return 2
+    elapsed = time.perf_counter() - started
+
+    print(f"Replayed {result['commands']} commands, {sim.ticks} ticks, "
+          f"{sim.now / 1000:.1f} s simulated in {elapsed:.3f} s.")
+    print(f"State: {sim.state}, route: {sim.route_locked}, trains: {len(sim.trains)}, digest: {sim.state_digest()}")
+    if result["diverged"]:
+        print(f"DIVERGED {result['diverged']}")
+        return 1
+    if result["digest_ok"] is False:
+        print("DIVERGED: final state does not match the recording.")
+        return 1
+    if result["digest_ok"]:
+        print("Final state matches the recording.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
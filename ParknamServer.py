@@ -0,0 +1,477 @@
+"""
+เซิร์ฟเวอร์ควบคุมและ telemetry ของสถานีปากน้ำ (asyncio, TCP เฉพาะในเครื่อง)
+ให้โปรแกรมภายนอก (dashboard, test harness) สั่งงานและดูสถานะของ Simulator ได้ด้วยความเร็วสูงโดยไม่ต้องกดปุ่มใน GUI
+event loop ของ asyncio ทำงานใน thread แยก ส่วนคำสั่งถูกส่งไปทำบน thread เจ้าของ Simulator
+(thread ของ Tk หรือลูป headless) ผ่าน pump() จึงไม่บล็อก mainloop ของ Tk
+
+ใช้งาน:
+    python ParknamServer.py                          # headless: Simulator + เซิร์ฟเวอร์ที่ 127.0.0.1:8765
+    python ParknamServer.py --gui                    # GUI + เซิร์ฟเวอร์ (คำสั่งผ่าน handle_* เหมือนกดปุ่ม)
+    python ParknamServer.py --client route_in:1 arrive --watch 15   # ไคลเอนต์ทดสอบ: ส่งคำสั่งแล้วดู telemetry
+    python ParknamServer.py --client route_in:1 route_in:2 --repeat 10000   # วัดจำนวนคำสั่งต่อวินาที
+
+โปรโตคอล: JSON 1 object ต่อ 1 บรรทัด (UTF-8)
+    -> {"id": 1, "op": "batch", "cmds": [["route_in", 1], ["arrive"], ["route_out", 2], ["emergency"]]}
+    <- {"type": "result", "id": 1, "results": [true, true, false, true]}
+    -> {"id": 2, "op": "subscribe"}          (หรือ "unsubscribe")
+    <- {"type": "snapshot", "seq": 7, "state": {...}}       สถานะเต็ม (ครั้งแรก และหลังตามไม่ทัน)
+    <- {"type": "diff", "seq": 8, "changes": {...}}         เฉพาะ key ที่เปลี่ยน (null = ไม่มีแล้ว)
+    <- {"type": "error", "id": 3, "error": "..."}
+สถานะเป็น dict แบน: t, state, route, platform/<n> (ชานชาลาไม่ว่าง), train/<id> ([state, route, platform, head, tail, speed])
+ไคลเอนต์ที่อ่านช้าจนบัฟเฟอร์ขาออกเกิน HIGH_WATER จะถูกข้าม diff (ไม่เข้าคิวสะสม)
+แล้วได้ snapshot ใหม่เมื่ออ่านทัน ผู้ส่งคำสั่งค้างได้ไม่เกิน MAX_INFLIGHT batch (เกินนั้นเซิร์ฟเวอร์หยุดอ่าน socket)
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import queue
+import sys
+import threading
+import time
+
+from ParknamStation import TrainSimulator
+
+# คำสั่ง -> เมธอดของ TrainSimulator (headless) และของ TrainApp (GUI: log และบันทึกคำสั่งเหมือนกดปุ่ม)
+COMMANDS = {
+    "route_in": ("set_route_in", "handle_route_in"),
+    "route_out": ("set_route_out", "handle_route_out"),
+    "arrive": ("call_train", "handle_arrive"),
+    "emergency": ("emergency_stop", "handle_emergency"),
+}
+
+
+def snapshot(sim):
+    """สถานะของ Simulator เป็น dict แบน (key -> ค่าที่แปลงเป็น JSON ได้) ใช้คำนวณ diff"""
+    state = {"t": round(sim.now, 1), "state": sim.state, "route": sim.route_locked}
+    for platform, occupied in sim.platform_occupied.items():
+        state[f"platform/{platform}"] = occupied
+    for train in sim.trains.values():
+        state[f"train/{train.id}"] = [train.state, train.route, train.platform,
+                                      train.head, train.tail, round(train.speed, 3)]
+    return state
+
+
+_MISSING = object()
+
+
+def diff(old, new):
+    """key ที่ค่าเปลี่ยนหรือเพิ่มขึ้น และ key ที่หายไป (ค่า None)"""
+    changes = {key: value for key, value in new.items() if old.get(key, _MISSING) != value}
+    changes.update((key, None) for key in old if key not in new)
+    return changes
+
+
+def apply(state, message):
+    """อัปเดตสถานะฝั่งไคลเอนต์ด้วยข้อความ snapshot หรือ diff"""
+    if message["type"] == "snapshot":
+        state.clear()
+        state.update(message["state"])
+        return
+    for key, value in message["changes"].items():
+        if value is None and key.startswith("train/"):
+            state.pop(key, None)
+        else:
+            state[key] = value
+
+
+def _encode(message):
+    return (json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+# การเชื่อมต่อ 1 ไคลเอนต์ (ใช้บน thread ของ event loop เท่านั้น)
+class _Client:
+    __slots__ = ("writer", "inflight", "subscribed", "stale", "dropped")
+
+    def __init__(self, writer, max_inflight):
+        self.writer = writer
+        self.inflight = asyncio.Semaphore(max_inflight)  # batch ที่ส่งมาแล้วแต่ยังไม่ได้ผลลัพธ์
+        self.subscribed = False
+        self.stale = True  # ต้องได้ snapshot เต็มก่อน diff ถัดไป
+        self.dropped = 0  # จำนวน diff ที่ข้ามเพราะไคลเอนต์อ่านไม่ทัน
+
+
+# เซิร์ฟเวอร์ TCP แบบ asyncio ที่รันใน thread แยก ส่วน Simulator ถูกแตะเฉพาะใน pump() บน thread เจ้าของ
+class ControlServer:
+
+    HIGH_WATER = 64 * 1024  # บัฟเฟอร์ขาออกเกินนี้: ข้าม diff ของไคลเอนต์นั้น (ส่ง snapshot เมื่ออ่านทัน)
+    HARD_LIMIT = 4 * 1024 * 1024  # บัฟเฟอร์ขาออกเกินนี้ (ไม่อ่านผลลัพธ์เลย): ตัดการเชื่อมต่อ
+    MAX_LINE = 1024 * 1024  # ความยาวสูงสุดของ 1 ข้อความ (ไบต์)
+    MAX_BATCH = 1000  # จำนวนคำสั่งสูงสุดใน 1 batch
+    MAX_INFLIGHT = 8  # batch ที่ค้างได้ต่อไคลเอนต์
+    TELEMETRY_MS = 50  # ส่ง telemetry อย่างมากทุก 50 ms (เวลาจริง) และเฉพาะเมื่อมีอะไรเปลี่ยน
+
+    def __init__(self, sim, execute=None, host="127.0.0.1", port=8765):
+        """
+        - sim: TrainSimulator
+        - execute(name, args): ทำคำสั่ง 1 คำสั่งบน thread เจ้าของ sim คืนผลลัพธ์ (None = เรียกเมธอดของ sim ตรงๆ)
+        - port: 0 = ให้ระบบเลือกพอร์ตว่าง (ดูพอร์ตจริงได้จาก self.port หลัง start())
+        """
+        self.sim = sim
+        self.execute = execute or (lambda name, args: getattr(sim, COMMANDS[name][0])(*args))
+        self.host = host
+        self.port = port
+        self.inbox = queue.Queue()  # (client, id, cmds) ที่รอทำบน thread ของ sim
+        self._wakeup = threading.Event()  # ตั้งเมื่อมีคำสั่งเข้าคิว (ปลุก wait())
+        self.clients = set()
+        self.commands = 0  # จำนวนคำสั่งที่ทำไปแล้ว
+        self.seq = 0  # ลำดับของ telemetry ที่ส่งล่าสุด
+        self._state = None  # สถานะล่าสุดที่ส่งไปแล้ว (thread ของ sim)
+        self._published = None  # (seq, state) ล่าสุด สำหรับส่ง snapshot ให้ผู้สมัครใหม่ (thread ของ event loop)
+        self._next_publish = 0.0
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    # --- ฝั่ง thread เจ้าของ Simulator ---
+
+    def start(self):
+        """เริ่ม event loop ใน thread แยก แล้วรอจนเปิดพอร์ตเสร็จ คืนค่าพอร์ตที่ใช้"""
+        ready = threading.Event()
+        error = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._server = self._loop.run_until_complete(asyncio.start_server(
+                    self._handle, self.host, self.port, limit=self.MAX_LINE))
+            except OSError as e:
+                error.append(e)
+                ready.set()
+                return
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="parknam-server", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if error:
+            raise error[0]
+        return self.port
+
+    def stop(self):
+        """ปิดทุกการเชื่อมต่อและหยุด event loop"""
+        if self._loop is None or self._loop.is_closed():
+            return
+
+        async def shutdown():
+            self._server.close()
+            for client in list(self.clients):
+                client.writer.close()
+            await self._server.wait_closed()
+            self._loop.stop()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop)
+        self._thread.join(timeout=5)
+
+    def wait(self, timeout):
+        """รอจนมีคำสั่งเข้ามาหรือครบ timeout (วินาที) ใช้ในลูป headless แทน time.sleep"""
+        woken = self._wakeup.wait(timeout)
+        self._wakeup.clear()
+        return woken
+
+    def pump(self):
+        """ทำคำสั่งที่รออยู่ทั้งหมด แล้วส่ง telemetry ถ้าถึงรอบ (เรียกบน thread เจ้าของ sim เท่านั้น)"""
+        while True:
+            try:
+                client, request_id, cmds = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            reply = {"type": "result", "id": request_id, "results": []}
+            for i, (name, *args) in enumerate(cmds):
+                try:
+                    result = self.execute(name, args)
+                except Exception as e:  # คำสั่งพังต้องไม่ทำให้ลูปของ Tk/headless หยุด
+                    reply.setdefault("errors", {})[i] = f"{type(e).__name__}: {e}"
+                    result = False
+                reply["results"].append(result is not False)
+            self.commands += len(cmds)
+            self._call(self._reply, client, _encode(reply))
+        now = time.monotonic()
+        if now >= self._next_publish:
+            self._next_publish = now + self.TELEMETRY_MS / 1000
+            self.publish()
+
+    def publish(self):
+        """ส่ง diff ของสถานะตั้งแต่ครั้งก่อน (ถ้ามีอะไรเปลี่ยนนอกจากเวลา)"""
+        state = snapshot(self.sim)
+        changes = diff(self._state, state) if self._state is not None else state
+        if self._state is not None and changes.keys() <= {"t"}:
+            return
+        self._state = state
+        self.seq += 1
+        self._call(self._broadcast, self.seq, changes, state)
+
+    def _call(self, callback, *args):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(callback, *args)
+            except RuntimeError:
+                pass  # loop ถูกปิดระหว่างทาง
+
+    # --- ฝั่ง thread ของ event loop ---
+
+    async def _handle(self, reader, writer):
+        client = _Client(writer, self.MAX_INFLIGHT)
+        self.clients.add(client)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break  # ข้อความยาวเกิน MAX_LINE หรือการเชื่อมต่อหลุด
+                if not line:
+                    break
+                if line.strip():
+                    await self._dispatch(client, line)
+        finally:
+            self.clients.discard(client)
+            writer.close()
+
+    async def _dispatch(self, client, line):
+        try:
+            message = json.loads(line)
+            request_id = message.get("id")
+            op = message.get("op", "batch")
+        except (ValueError, AttributeError):
+            self._send(client, _encode({"type": "error", "id": None, "error": "invalid JSON object"}))
+            return
+        if op == "subscribe":
+            client.subscribed, client.stale = True, True
+            if self._published is not None:
+                self._resync(client, *self._published)
+        elif op == "unsubscribe":
+            client.subscribed = False
+        elif op == "batch":
+            cmds = message.get("cmds")
+            error = self._validate(cmds)
+            if error:
+                self._send(client, _encode({"type": "error", "id": request_id, "error": error}))
+                return
+            await client.inflight.acquire()  # ครบ MAX_INFLIGHT: หยุดอ่าน socket จนกว่าผลลัพธ์จะออกไป
+            self.inbox.put((client, request_id, cmds))
+            self._wakeup.set()
+        else:
+            self._send(client, _encode({"type": "error", "id": request_id, "error": f"unknown op {op!r}"}))
+
+    def _validate(self, cmds):
+        if not isinstance(cmds, list) or not cmds:
+            return "cmds must be a non-empty list"
+        if len(cmds) > self.MAX_BATCH:
+            return f"batch larger than {self.MAX_BATCH} commands"
+        for cmd in cmds:
+            # ตรวจชนิดก่อนค้นใน dict: ค่าที่ hash ไม่ได้ (list/dict จาก JSON) จะทำให้ TypeError หลุดออกไปตัดการเชื่อมต่อ
+            if not isinstance(cmd, list) or not cmd or not isinstance(cmd[0], str) or cmd[0] not in COMMANDS:
+                return f"unknown command {cmd!r} (expected one of {', '.join(COMMANDS)})"
+            if cmd[0] in ("route_in", "route_out") and (
+                    len(cmd) != 2 or type(cmd[1]) is not int or cmd[1] not in self.sim.platform_trains):
+                return f"{cmd[0]} needs a platform number: {cmd!r}"
+            if cmd[0] in ("arrive", "emergency") and len(cmd) != 1:
+                return f"{cmd[0]} takes no arguments: {cmd!r}"
+        return None
+
+    def _send(self, client, data):
+        transport = client.writer.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > self.HARD_LIMIT:
+            transport.abort()  # ไม่อ่านข้อมูลเลย: ตัดทิ้งแทนการเก็บบัฟเฟอร์ไม่จำกัด
+            return
+        client.writer.write(data)
+
+    def _reply(self, client, data):
+        self._send(client, data)
+        client.inflight.release()
+
+    def _resync(self, client, seq, state):
+        self._send(client, _encode({"type": "snapshot", "seq": seq, "state": state}))
+        client.stale = False
+
+    def _broadcast(self, seq, changes, state):
+        """ส่ง diff ให้ผู้สมัครทุกราย (encode ครั้งเดียว) ไคลเอนต์ที่ค้างอยู่ถูกข้ามแล้วได้ snapshot ภายหลัง"""
+        self._published = (seq, state)
+        data = None
+        for client in self.clients:
+            if not client.subscribed:
+                continue
+            if client.writer.transport.get_write_buffer_size() > self.HIGH_WATER:
+                client.stale = True
+                client.dropped += 1
+            elif client.stale:
+                self._resync(client, seq, state)
+            else:
+                data = data or _encode({"type": "diff", "seq": seq, "changes": changes})
+                self._send(client, data)
+
+
+# ไคลเอนต์ asyncio อย่างง่ายสำหรับทดสอบ/ตัวอย่าง: ส่ง batch แล้วรอผล, รับ telemetry เข้าคิวและรวมเป็นสถานะ
+class ControlClient:
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.state = {}  # สถานะล่าสุดที่ประกอบจาก snapshot/diff
+        self.telemetry = asyncio.Queue()  # ข้อความ snapshot/diff ที่ได้รับ
+        self.seq = None  # seq ของ telemetry ล่าสุดที่นำมารวมแล้ว
+        self.gaps = 0  # จำนวนครั้งที่ seq ขาดช่วง (เซิร์ฟเวอร์ข้าม diff เพราะอ่านไม่ทัน แล้วส่ง snapshot ตามมา)
+        self._ids = itertools.count(1)
+        self._pending = {}  # id -> Future ของผลลัพธ์
+        self._reader_task = asyncio.ensure_future(self._read())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765):
+        reader, writer = await asyncio.open_connection(host, port, limit=ControlServer.MAX_LINE)
+        return cls(reader, writer)
+
+    def send(self, cmds):
+        """ส่ง batch โดยไม่รอ คืน Future ของรายการผลลัพธ์ (ส่งต่อกันหลาย batch ได้แบบ pipeline)"""
+        request_id = next(self._ids)
+        future = self._pending[request_id] = asyncio.get_running_loop().create_future()
+        self.writer.write(_encode({"id": request_id, "op": "batch", "cmds": cmds}))
+        return future
+
+    async def call(self, cmds):
+        """ส่ง batch แล้วรอผลลัพธ์ (list ของ True/False ตามลำดับคำสั่ง)"""
+        future = self.send(cmds)
+        await self.writer.drain()
+        return await future
+
+    async def subscribe(self):
+        self.writer.write(_encode({"op": "subscribe"}))
+        await self.writer.drain()
+
+    async def close(self):
+        self.writer.close()
+        await self._reader_task
+
+    async def _read(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            kind = message.get("type")
+            if kind in ("result", "error"):
+                future = self._pending.pop(message.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if kind == "result":
+                    future.set_result(message["results"])
+                else:
+                    future.set_exception(ValueError(message["error"]))
+            elif kind in ("snapshot", "diff"):
+                if kind == "diff" and message["seq"] != self.seq + 1:
+                    self.gaps += 1  # diff ที่ขาดไปทำให้สถานะไม่ครบ: ข้ามจนกว่าจะได้ snapshot
+                    continue
+                apply(self.state, message)
+                self.seq = message["seq"]
+                self.telemetry.put_nowait(message)
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("server closed the connection"))
+
+
+def run_headless(server, time_scale=1.0, frame_ms=16):
+    """ลูป headless: เดินนาฬิกาจำลองตามเวลาจริง × time_scale ตื่นทันทีเมื่อมีคำสั่ง (Ctrl+C เพื่อหยุด)"""
+    sim = server.sim
+    sim_base, wall_base = sim.now, time.monotonic()
+    while True:
+        server.wait(frame_ms / 1000)
+        sim.run_until(sim_base + (time.monotonic() - wall_base) * 1000 * time_scale)
+        server.pump()
+
+
+def attach_tk(server, app, pump_ms=10, idle_ms=200):
+    """
+    ให้ TrainApp เรียก pump() ผ่าน root.after() บน thread ของ Tk
+    (ถี่ทุก pump_ms ขณะมีไคลเอนต์ ไม่มีใครต่อ = ทุก idle_ms) คำสั่งไปที่ handle_* เหมือนการกดปุ่ม
+    """
+    server.execute = lambda name, args: getattr(app, COMMANDS[name][1])(*args)
+
+    def loop():
+        server.pump()
+        app.root.after(pump_ms if server.clients else idle_ms, loop)
+    app.root.after(idle_ms, loop)
+
+
+def _parse_command(text):
+    """"route_in:1" -> ["route_in", 1], "arrive" -> ["arrive"]"""
+    name, _, arg = text.partition(":")
+    return [name, int(arg)] if arg else [name]
+
+
+async def _client_main(args):
+    client = await ControlClient.connect(args.host, args.port)
+    cmds = [_parse_command(text) for text in args.client]
+    if args.watch:
+        await client.subscribe()
+    start = time.perf_counter()
+    futures = [client.send(cmds) for _ in range(args.repeat)]
+    await client.writer.drain()
+    results = await asyncio.gather(*futures)
+    elapsed = time.perf_counter() - start
+    print(f"results: {results[-1]}")
+    if args.repeat > 1:
+        total = len(cmds) * args.repeat
+        print(f"{total} commands in {args.repeat} batches: {elapsed:.3f} s ({total / elapsed:,.0f} commands/s)")
+    deadline = time.monotonic() + args.watch
+    while time.monotonic() < deadline:
+        try:
+            message = await asyncio.wait_for(client.telemetry.get(), deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            break
+        body = message.get("changes", message.get("state"))
+        print(f"{message['type']:<8} #{message['seq']:<5} {json.dumps(body, ensure_ascii=False)}")
+    await client.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local control/telemetry server for the Parknam station simulator.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on / connect to (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (default: 8765)")
+    parser.add_argument("--gui", action="store_true", help="run the Tkinter GUI alongside the server")
+    parser.add_argument("--layout", help="station layout file (default: layouts/parknam.json)")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="headless: simulated time per wall time")
+    parser.add_argument("--client", nargs="+", metavar="CMD",
+                        help="act as a test client: send one batch, e.g. route_in:1 arrive route_out:2 emergency")
+    parser.add_argument("--repeat", type=int, default=1, help="client: send the batch this many times (pipelined)")
+    parser.add_argument("--watch", type=float, default=0.0, help="client: print telemetry for this many seconds")
+    args = parser.parse_args(argv)
+
+    if args.client:
+        return asyncio.run(_client_main(args))
+
+    if args.gui:
+        import tkinter as tk
+        from ParknamStation import TrainApp
+        root = tk.Tk()
+        app = TrainApp(root, layout=args.layout)
+        server = ControlServer(app.sim, host=args.host, port=args.port)
+        attach_tk(server, app)
+    else:
+        server = ControlServer(TrainSimulator(layout=args.layout), host=args.host, port=args.port)
+    try:
+        port = server.start()
+    except OSError as e:
+        print(f"Cannot listen on {args.host}:{args.port}: {e}", file=sys.stderr)
+        return 1
+    print(f"Listening on {args.host}:{port}")
+    try:
+        if args.gui:
+            root.mainloop()
+        else:
+            run_headless(server, args.time_scale)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
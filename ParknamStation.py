@@ -1,639 +1,3792 @@
-import tkinter as tk
-import datetime
-
-# คลาสสำหรับเก็บข้อมูลพิกัด (x, y) ของแต่ละช่อง
-class Tile:
-    def __init__(self, x, y):
-        self.x = x  # พิกัดแกน X
-        self.y = y  # พิกัดแกน Y
-
-# คลาสหลักที่จัดการตรรกะการจำลองทั้งหมด (State, Train, Paths)
-class TrainSimulator:
-    
-    # ฟังก์ชันเริ่มต้น (Constructor) ของคลาส
-    def __init__(self, canvas, screen_width, screen_height, logger_callback):
-        """
-        ตั้งค่าเริ่มต้นทั้งหมดสำหรับ Simulator
-        - canvas: พื้นที่วาดรูปของ tkinter
-        - screen_width, screen_height: ขนาดหน้าจอ
-        - logger_callback: ฟังก์ชันสำหรับส่งข้อความกลับไปแสดงใน Log ของ GUI
-        """
-        
-        self.canvas = canvas
-        # 'ts' (Tile Size) คำนวณขนาดของไทล์แต่ละช่อง เทียบกับความกว้างหน้าจอ
-        self.ts = screen_width / 125.0  
-        self.train_length = 17  # ความยาวของรถไฟ (จำนวนไทล์)
-        self.log = logger_callback  # เก็บฟังก์ชัน log ไว้ใช้งาน
-        
-        # --- คำนวณเลย์เอาต์ของสถานี ---
-        total_tile_width = 125  # ความกว้างทั้งหมดของแผนที่ (จำนวนไทล์)
-        
-        # กำหนดขนาดของส่วนต่างๆ ในสถานี
-        diag_len = 10      # ความยาวของส่วนทางเบี่ยง (เฉียง)
-        horiz_len = 25     # ความยาวของส่วนชานชาลา (ตรง)
-        # ความกว้างรวมของสถานี (เบี่ยงขึ้น + ตรง + เบี่ยงลง)
-        station_width_tiles = diag_len + horiz_len + diag_len
-        
-        # คำนวณจุด  เริ่มต้นของสถานี 
-        station_start_x = (total_tile_width // 2) - (station_width_tiles // 2) + 1
-        
-        diag_y_start = 40  # พิกัด y เริ่มต้นของทางหลัก (ก่อนเบี่ยง)
-        
-        # --- สร้างรายการพิกัด (List of Tile) สำหรับเส้นทางต่างๆ ---
-        
-        # 1. เส้นทางเบี่ยงขึ้น (ชานชาลาบน)
-        self.path_top_diag_up = [Tile((station_start_x + i) * self.ts, (diag_y_start - i) * self.ts) for i in range(diag_len + 1)]
-        
-        # 2. เส้นทางตรง (ชานชาลาบน)
-        horiz_start_x = station_start_x + diag_len
-        station_top_y = diag_y_start - diag_len
-        self.path_top_horizontal = [Tile(x * self.ts, station_top_y * self.ts) for x in range(horiz_start_x, horiz_start_x + horiz_len)]
-
-        # 3. เส้นทางเบี่ยงลง (ชานชาลาบน)
-        diag_down_start_x = horiz_start_x + horiz_len
-        self.path_top_diag_down = [Tile((diag_down_start_x + i) * self.ts, (station_top_y + i) * self.ts) for i in range(diag_len + 1)]
-        
-        # 4. เส้นทางหลัก (ก่อนเข้าสถานี)
-        station_end_x = diag_down_start_x + diag_len
-        self.path_main = [Tile(i * self.ts, 40 * self.ts) for i in range(station_start_x)]
-        
-        # 5. เส้นทางกลาง (ชานชาลาล่าง)
-        self.path_middle = [Tile(i * self.ts, 40 * self.ts) for i in range(station_start_x, station_end_x + 1)]
-        
-        # 6. เส้นทางออกหลัก (หลังออกจากสถานี)
-        self.path_end = [Tile(i * self.ts, 40 * self.ts) for i in range(station_end_x + 1, int(125 + self.train_length))]
-        
-        
-        # --- รวมเส้นทางย่อยเป็นเส้นทางเต็ม (ขาเข้า) ---
-        # เส้นทางที่ 1 (บน): ทางหลัก + เบี่ยงขึ้น + ชานชาลาบน + เบี่ยงลง + เส้นทางออกหลัก
-        self.path_top_station = (
-            self.path_main + self.path_top_diag_up + 
-            self.path_top_horizontal + self.path_top_diag_down
-        )
-        # เส้นทางที่ 2 (ล่าง): ทางหลัก + ชานชาลาล่าง + เส้นทางออกหลัก
-        self.path_bottom_station = self.path_main + self.path_middle
-        
-        
-        # --- ตัวแปรสถานะ (State) ของ Simulator ---
-        self.train_path = []  # เส้นทางที่รถไฟขบวนปัจจุบันกำลังวิ่ง
-        self.train_index = 0  # ตำแหน่ง (index) ปัจจุบันของหัวรถไฟใน train_path
-        self.train_positions = []  # รายการพิกัด (Tile) ที่ตัวรถไฟทั้งหมดครอบครอง
-        self.train_rects = [] 
-        
-        self.state = "ready"  # สถานะปัจจุบัน: ready, running, in_station, leaving, emergency
-        self.use_top_station = True  # เก็บว่าเส้นทางที่ตั้งไว้ใช้ชานชาลาบนหรือไม่
-        self.last_platform = 0  # เก็บหมายเลขชานชาลาล่าสุดที่ใช้งาน
-        
-        self.platform_occupied = {1: False, 2: False} # สถานะว่าชานชาลาว่างหรือไม่
-        self.route_locked = None  # สถานะการล็อกเส้นทาง (เช่น "P1_IN", "P2_OUT")
-        
-        self.station_stop_index = 0 # ตำแหน่ง (index) ใน path ที่รถไฟต้องหยุด (คำนวณใน set_route_in)
-        
-        
-        self.train_id_counter = 100  # ตัวนับ ID รถไฟ
-        self.current_train_id = None  # ID ของรถไฟขบวนปัจจุบัน
-        
-        
-        self.log("[SIM] Simulator initialized.")
-
-        
-        # --- วาดส่วน Track ที่แสดงสถานะ Occupancy (ทับเส้นทางพื้นฐาน) ---
-        self.track_width = max(2, self.ts / 2.5) # ความหนาของเส้น Track
-        
-        # สร้างเส้นสำหรับชานชาลา 1 (บน)
-        p1_coords = []
-        for tile in self.path_top_horizontal:
-            p1_coords.extend([tile.x + self.ts / 2, tile.y + self.ts / 2])
-        self.track_p1_id = self.canvas.create_line(p1_coords, fill="gray", width=self.track_width, tags="track_platform")
-
-        # สร้างเส้นสำหรับชานชาลา 2 (ล่าง)
-        p2_coords = []
-        for tile in self.path_middle:
-            # วาดเฉพาะส่วนที่ตรงกับชานชาลาบน (เพื่อความสวยงาม)
-            if tile.x >= horiz_start_x * self.ts and tile.x < diag_down_start_x * self.ts:
-                p2_coords.extend([tile.x + self.ts / 2, tile.y + self.ts / 2])
-        self.track_p2_id = self.canvas.create_line(p2_coords, fill="gray", width=self.track_width, tags="track_platform")
-        self.log("[SIM] Platform occupancy segments created.")
-
-
-    def draw_base_tracks(self):
-        """วาดเส้นทางรถไฟพื้นฐาน (สีเทา) ทั้งหมด"""
-        self.canvas.delete("track_base")  # ลบของเก่า
-        track_color = "gray"
-        
-        # 1. วาดเส้นทางหลักด้านล่าง (เส้นเต็ม)
-        bottom_track_path = self.path_main + self.path_middle + self.path_end
-        bottom_coords = []
-        for tile in bottom_track_path:
-            bottom_coords.extend([tile.x + self.ts / 2, tile.y + self.ts / 2])
-        self.canvas.create_line(bottom_coords, fill=track_color, width=self.track_width, tags="track_base")
-
-        # 2. วาดเส้นทางเบี่ยง (ส่วนโค้ง)
-        top_track_path = self.path_top_diag_up + self.path_top_diag_down
-        top_coords = []
-        for tile in top_track_path:
-            top_coords.extend([tile.x + self.ts / 2, tile.y + self.ts / 2])
-        self.canvas.create_line(top_coords, fill=track_color, width=self.track_width, tags="track_base")
-        
-        # 3. ย้ายเส้นชานชาลา (track_p1, track_p2) มาไว้ข้างหน้าสุด
-        self.canvas.tag_raise(self.track_p1_id)
-        self.canvas.tag_raise(self.track_p2_id)
-
-
-    def draw_train(self):
-        """วาดตัวรถไฟ (ตามพิกัดใน self.train_positions)"""
-        self.canvas.delete("train")  # ลบรถไฟเก่า
-        self.train_rects.clear()
-
-        # ถ้าไม่มีพิกัดรถไฟ ก็ไม่ต้องวาด
-        if not self.train_positions:
-            return
-        
-        # กำหนดสีรถไฟตามสถานะ
-        train_color = "#4ade80"  # สีเขียว (จอด)
-        if self.state == "running" or self.state == "leaving":
-            train_color = "#f87171"  # สีแดง (กำลังวิ่ง)
-
-        # แปลงรายการ Tile เป็นรายการพิกัด (x, y, x, y, ...)
-        train_coords = []
-        for pos in self.train_positions:
-            train_coords.extend([pos.x + self.ts / 2, pos.y + self.ts / 2])
-        
-        # วาดรถไฟเป็นเส้นหนา (ถ้ามีความยาวมากกว่า 1)
-        if len(self.train_positions) > 1:
-            self.canvas.create_line(
-                train_coords, fill=train_color, width=self.ts,
-                capstyle=tk.ROUND, joinstyle=tk.ROUND, tags="train"
-            )
-
-
-    def set_route_in(self, platform):
-        """ตั้งค่าเส้นทางสำหรับรถไฟขาเข้า (INBOUND)"""
-        
-        # ตรวจสอบว่าระบบล็อกอยู่หรือไม่
-        if self.route_locked:
-            self.log(f"[ERROR] Cannot set route: System is locked ({self.route_locked}).")
-            return
-        # ตรวจสอบว่าชานชาลาว่างหรือไม่
-        if self.platform_occupied[platform]:
-            self.log(f"[ERROR] Cannot set route: Platform {platform} is occupied.")
-            return
-
-        # ตั้งค่าตัวแปรสำหรับเส้นทางนี้
-        self.use_top_station = (platform == 1)
-        self.last_platform = platform
-        self.route_locked = f"P{platform}_IN"  # ล็อกระบบสำหรับขาเข้า
-        
-        # คำนวณจุดหยุดรถไฟ 
-        # จุดหยุด = กึ่งกลางของชานชาลา + ครึ่งหนึ่งของความยาวรถไฟ
-        half_train = self.train_length // 2
-        if self.use_top_station:
-            # (ทางหลัก + ทางเบี่ยงขึ้น) + (ครึ่งชานชาลาบน) + ครึ่งขบวน
-            self.station_stop_index = len(self.path_main) + len(self.path_top_diag_up) + (len(self.path_top_horizontal) // 2) + half_train
-        else:
-            # (ทางหลัก) + (ครึ่งชานชาลากลาง) + ครึ่งขบวน
-            self.station_stop_index = len(self.path_main) + (len(self.path_middle) // 2) + half_train
-        
-        self.log(f"[SYS] Route set: INBOUND to Platform {platform}. System locked.")
-        
-
-    def set_route_out(self, platform):
-        """ตั้งค่าเส้นทางสำหรับรถไฟขาออก (OUTBOUND)"""
-        
-        # ตรวจสอบเงื่อนไขต่างๆ
-        if self.route_locked:
-            self.log(f"[ERROR] Cannot set route: System is locked ({self.route_locked}).")
-            return
-        if not self.platform_occupied[platform]:
-            self.log(f"[ERROR] Cannot depart: Platform {platform} is empty.")
-            return
-        if self.state != "in_station":
-            self.log(f"[ERROR] Cannot depart: Train not in station.")
-            return
-        
-        # ล็อกเส้นทาง
-        self.route_locked = f"P{platform}_OUT"
-        self.log(f"[SYS] Route set: OUTBOUND from Platform {platform}. System locked.")
-        
-        # สั่งให้รถไฟเริ่มเคลื่อนที่ (ฟังก์ชันนี้จะถูกเรียกจาก _move_train)
-        self.release_train()
-
-    def call_train(self):
-        """
-        'เรียก' รถไฟขบวนใหม่เข้ามาในระบบ (เริ่มจำลองการเคลื่อนที่ขาเข้า)
-        """
-        if self.state != "ready": return  # ต้องอยู่ในสถานะพร้อม
-        # ต้องมีเส้นทางขาเข้า (IN) ตั้งค่าไว้แล้ว
-        if not self.route_locked or not self.route_locked.endswith("_IN"):
-            self.log(f"[ERROR] Cannot arrive: No inbound route set.")
-            return
-
-        # สร้าง ID รถไฟใหม่
-        self.current_train_id = f"ขบวนที่ {self.train_id_counter}"
-        self.train_id_counter += 1
-        
-        # เลือกเส้นทาง (path) ตามที่ตั้งค่าไว้ (บนหรือล่าง)
-        self.train_path = self.path_top_station if self.use_top_station else self.path_bottom_station
-        self.train_index = 0
-        self.train_positions.clear()
-        
-        # เปลี่ยนสถานะเป็น "กำลังวิ่ง"
-        self.state = "running"
-        self.log(f"[TRAIN] {self.current_train_id} arriving on route {self.route_locked}.")
-        
-        # เริ่มการเคลื่อนที่ครั้งแรก
-        self._move_train()
-
-    def release_train(self):
-        """
-        เตรียมการและเริ่มการเคลื่อนที่ขาออก
-        """
-        
-        # ตรวจสอบว่าอยู่ในสถานะจอด และตั้งเส้นทางขาออก (OUT) แล้ว
-        if self.state != "in_station" or not self.route_locked.endswith("_OUT"):
-             self.log(f"[ERROR] Release train failed. State: {self.state}, Route: {self.route_locked}")
-             return
-        
-        self.log(f"[TRAIN] {self.current_train_id} departing from Platform {self.last_platform}.")
-        
-        # --- คำนวณเส้นทางที่เหลือ (สำคัญ) ---
-        
-        # 1. หาพิกัดหัวรถไฟปัจจุบัน
-        current_head = self.train_positions[-1] 
-        
-        # 2. กำหนด path ส่วนที่รถไฟจอดอยู่
-        start_path_segment = (self.path_top_horizontal + self.path_top_diag_down) if self.use_top_station else self.path_middle
-        
-        try:
-            # 3. หาว่าหัวรถไฟอยู่ index ที่เท่าไหร่ใน path ส่วนนั้น
-            current_path_index = -1
-            for i, tile in enumerate(start_path_segment):
-                if tile.x == current_head.x and tile.y == current_head.y:
-                    current_path_index = i
-                    break
-            
-            # 4. สร้าง train_path ใหม่ = ส่วนที่เหลือของ path เดิม + path_end
-            if current_path_index != -1:
-                self.train_path = (start_path_segment[current_path_index:] + self.path_end)
-            else:
-                # ถ้าหาไม่เจอ (เกิดข้อผิดพลาด) ให้ใช้ path_end ไปเลย
-                self.train_path = self.path_end
-        except IndexError:
-            self.train_path = self.path_end
-            
-        # 5. รีเซ็ต index และตั้งสถานะ "กำลังออก"
-        self.train_index = 0
-        self.state = "leaving"
-        
-        # เริ่มการเคลื่อนที่
-        self._move_train()
-
-    def emergency_stop(self):
-        """หยุดฉุกเฉิน - เคลียร์ทุกอย่างและรีเซ็ต"""
-        self.log("[!!EMERGENCY!!] All signals RED. Train movement halted.")
-        
-        self.state = "emergency"  # ตั้งสถานะฉุกเฉิน (เพื่อหยุด _move_train)
-        self.route_locked = "EMERGENCY" # ล็อกระบบ
-        
-        # เคลียร์รถไฟและสถานะชานชาลา
-        self.canvas.delete("train")
-        self.train_positions.clear()
-        self.platform_occupied = {1: False, 2: False}
-        self.current_train_id = None
-        
-        # รีเซ็ตสี Track ชานชาลา
-        self.canvas.itemconfig(self.track_p1_id, fill="gray")
-        self.canvas.itemconfig(self.track_p2_id, fill="gray")
-        
-        # หน่วงเวลา 2 วินาที แล้วค่อยเรียกฟังก์ชันรีเซ็ต
-        self.canvas.after(2000, self.reset_from_emergency)
-        
-    def reset_from_emergency(self):
-        """รีเซ็ตสถานะกลับเป็น 'พร้อม' หลังจากหยุดฉุกเฉิน"""
-        self.log("[SYS] System resetting from emergency.")
-        self.state = "ready"
-        self.route_locked = None
-
-    def _move_train(self):
-        """
-        ฟังก์ชันหลักที่ขับเคลื่อนรถไฟ (Loop)
-        จะเรียกตัวเองซ้ำๆ ผ่าน self.canvas.after()
-        """
-        
-        # ถ้าอยู่ในสถานะฉุกเฉิน ให้หยุดทันที
-        if self.state == "emergency":
-            self.log("[TRAIN] Movement halted by emergency stop.")
-            return
-
-        delay_ms = 70  # ความเร็วรถไฟ (ยิ่งน้อยยิ่งเร็ว)
-
-        # --- ส่วนที่ 1: รถไฟยังมีเส้นทางเหลือให้วิ่ง (เพิ่มหัว) ---
-        if self.train_index < len(self.train_path):
-            # 1. เอาพิกัดถัดไป (หัวรถไฟ)
-            head = self.train_path[self.train_index]
-            self.train_positions.append(head)
-            
-            # 2. ถ้าขบวนยาวเกิน ให้ลบหาง (pop 0)
-            if len(self.train_positions) > self.train_length: 
-                self.train_positions.pop(0)
-            
-            # 3. วาดรถไฟ
-            self.draw_train()
-            
-            # 4. ตรวจสอบว่าถึงจุดหยุด (สำหรับขาเข้า) หรือยัง
-            if self.state == "running" and self.train_index >= self.station_stop_index:
-                self.state = "in_station"  # เปลี่ยนสถานะเป็น "จอดในสถานี"
-                self.route_locked = None   # ปลดล็อกเส้นทาง
-                self.platform_occupied[self.last_platform] = True # ตั้งค่าว่าชานชาลาไม่ว่าง
-                
-                # เปลี่ยนสี Track ชานชาลา (ในโค้ดนี้คือเปลี่ยนกลับเป็นสีเทา)
-                platform_track_id = self.track_p1_id if self.last_platform == 1 else self.track_p2_id
-                self.canvas.itemconfig(platform_track_id, fill="gray") # (อาจเปลี่ยนเป็นสีแดง/ส้ม เพื่อโชว์ว่า occupied)
-                
-                self.log(f"[TRAIN] {self.current_train_id} at Platform {self.last_platform}. Route unlocked.")
-                self.draw_train()  # วาดซ้ำ (อาจเปลี่ยนสี)
-                return  # หยุด Loop (รอคำสั่งใหม่)
-                
-            # 5. ถ้ายังไม่ถึงจุดหยุด ให้เลื่อน index และเรียกตัวเองใหม่
-            self.train_index += 1
-            self.canvas.after(delay_ms, self._move_train)
-            
-        # --- ส่วนที่ 2: รถไฟวิ่งเลยเส้นทางแล้ว (ลบหาง) ---
-        elif self.train_positions:
-            # 1. รถไฟวิ่งพ้น path แล้ว แต่ตัวขบวนยังค้างอยู่
-            # 2. ลบหาง (pop 0) จนกว่าขบวนจะหายไปหมด
-            self.train_positions.pop(0)
-            self.draw_train()
-            self.canvas.after(delay_ms, self._move_train)
-            
-        # --- ส่วนที่ 3: รถไฟออกจากแผนที่ไปหมดแล้ว ---
-        else:
-            # 1. รถไฟหายไปหมดแล้ว (สำหรับขาออก)
-            self.log(f"[TRAIN] {self.current_train_id} has left Platform {self.last_platform}. Map clear.")
-            self.state = "ready"  # สถานะพร้อม
-            self.route_locked = None  # ปลดล็อก
-            self.platform_occupied[self.last_platform] = False # ชานชาลาว่าง
-            self.current_train_id = None
-            
-            # 2. รีเซ็ตสี Track ชานชาลา
-            platform_track_id = self.track_p1_id if self.last_platform == 1 else self.track_p2_id
-            self.canvas.itemconfig(platform_track_id, fill="gray")
-            
-            # 3. ลบรถไฟ (เผื่อค้าง)
-            self.canvas.delete("train")
-            self.train_path, self.train_index, self.train_positions = [], 0, [] # รีเซ็ตตัวแปร
-
-# คลาสที่จัดการหน้าจอ GUI (ปุ่ม, หน้าต่าง, Log)
-class TrainApp:
-    def __init__(self, root):
-        """
-        ตั้งค่าหน้าต่างโปรแกรม (GUI) ทั้งหมด
-        - root: หน้าต่างหลักของ tkinter
-        """
-        self.root = root
-        self.root.title("🚉 ระบบควบคุมสถานีรถไฟ (Interlocking)")
-        self.root.attributes('-fullscreen', True)  # เต็มจอ
-        self.screen_width = self.root.winfo_screenwidth()
-        self.screen_height = self.root.winfo_screenheight()
-
-        # --- สร้าง Frame หลัก ---
-        self.main_frame = tk.Frame(root, bg="black")
-        self.main_frame.pack(fill="both", expand=True)
-
-        # 1. Canvas (ส่วนวาดรูป)
-        self.canvas = tk.Canvas(self.main_frame, width=self.screen_width, height=self.screen_height * 0.85, bg="black", borderwidth=0, highlightthickness=0)
-        self.canvas.pack(side="top", fill="x")
-
-        # 2. Log Frame (ส่วนแสดงข้อความ)
-        log_frame_height = self.screen_height * 0.15
-        self.log_frame = tk.Frame(self.main_frame, height=log_frame_height, bg="#111")
-        self.log_frame.pack(side="bottom", fill="x")
-        self.log_frame.pack_propagate(False)  # กัน Frame หดตัว
-
-        # สร้าง Text widget และ Scrollbar สำหรับ Log
-        log_scroll = tk.Scrollbar(self.log_frame, orient="vertical")
-        self.log_text = tk.Text(self.log_frame, bg="#111", fg="white", font=("Arial", 10),
-                                  wrap="word", yscrollcommand=log_scroll.set, state="disabled",
-                                  borderwidth=0, highlightthickness=0)
-        log_scroll.config(command=self.log_text.yview)
-        
-        log_scroll.pack(side="right", fill="y")
-        self.log_text.pack(side="left", fill="both", expand=True, padx=10, pady=5)
-        
-        self.log_message("[APP] Application started. Welcome, controller.")
-        
-        # --- สร้าง Simulator ---
-        # ส่ง canvas และฟังก์ชัน log_message ไปให้ Simulator ใช้งาน
-        self.sim = TrainSimulator(self.canvas, self.screen_width, self.screen_height, self.log_message)
-        
-        # ผูกปุ่ม Escape เพื่อออกจากโหมดเต็มจอ
-        self.root.bind("<Escape>", self.close_fullscreen)
-        
-        # --- วาดองค์ประกอบ UI ลงบน Canvas ---
-        ts = self.sim.ts
-        signal_radius = ts * 0.5
-        
-        # สัญญาณ S-01 (Home Signal)
-        s1_tile_x = len(self.sim.path_main) - 10  # พิกัด x
-        s1_x, s1_y = ts * s1_tile_x, ts * 42  # พิกัด y (เยื้องลงมา)
-        self.signal_1 = self.canvas.create_oval(s1_x - signal_radius, s1_y - signal_radius, s1_x + signal_radius, s1_y + signal_radius, fill="red", outline="", tags="signal")
-        self.canvas.create_text(s1_x, s1_y + ts * 1.5, text="S-01 (Home)", fill="white", font=("Arial", 9), tags="label")
-
-        # สัญญาณ S-P1 (Departure P1)
-        p1_tile_x = self.sim.path_top_horizontal[0].x / ts + 2 # พิกัด x (ต้นชานชาลา)
-        p1_x, p1_y = ts * p1_tile_x, self.sim.path_top_horizontal[0].y - ts * 1.5 # พิกัด y (เยื้องขึ้น)
-        self.signal_p1_depart = self.canvas.create_oval(p1_x - signal_radius, p1_y - signal_radius, p1_x + signal_radius, p1_y + signal_radius, fill="red", outline="", tags="signal")
-        self.canvas.create_text(p1_x, p1_y - ts, text="S-P1", fill="white", font=("Arial", 9), tags="label")
-        self.canvas.create_text(p1_x + ts * 10, p1_y, text="ชานชาลา 1 (บน)", fill="white", font=("Arial", 11), tags="label")
-
-        # สัญญาณ S-P2 (Departure P2)
-        p2_tile_x = self.sim.path_middle[0].x / ts + 2 # พิกัด x (ต้นชานชาลา)
-        p2_x, p2_y = ts * p2_tile_x, self.sim.path_middle[0].y + ts * 1.5 # พิกัด y (เยื้องลง)
-        self.signal_p2_depart = self.canvas.create_oval(p2_x - signal_radius, p2_y - signal_radius, p2_x + signal_radius, p2_y + signal_radius, fill="red", outline="", tags="signal")
-        self.canvas.create_text(p2_x, p2_y + ts, text="S-P2", fill="white", font=("Arial", 9), tags="label")
-        self.canvas.create_text(p2_x + ts * 20, p2_y, text="ชานชาลา 2 (ล่าง)", fill="white", font=("Arial", 11), tags="label")
-
-        # สัญญาณ S-03 (Starter Signal)
-        s3_tile_x = len(self.sim.path_main) + len(self.sim.path_middle) + 5 # พิกัด x (หลังสถานี)
-        s3_x, s3_y = ts * s3_tile_x, ts * 42 # พิกัด y (เยื้องลง)
-        self.signal_3 = self.canvas.create_oval(s3_x - signal_radius, s3_y - signal_radius, s3_x + signal_radius, s3_y + signal_radius, fill="red", outline="", tags="signal")
-        self.canvas.create_text(s3_x, s3_y + ts * 1.5, text="S-03 (Starter)", fill="white", font=("Arial", 9), tags="label")
-        
-        # --- ป้ายชื่อและสถานะ ---
-        self.status_label = tk.Label(self.canvas, text="สถานะ: พร้อม",bg="black", font=("Arial", 12, "bold"), fg="green")
-        self.canvas.create_window(self.screen_width / 2, self.screen_height * 0.73, window=self.status_label)
-        
-        self.station_name_label = tk.Label(self.canvas, text="สถานีรถไฟปากน้ำ",bg="black", font=("Arial", 36, "bold"), fg="cyan")
-        self.canvas.create_window(self.screen_width / 2, self.screen_height * 0.1, window=self.station_name_label)
-        
-        self.clock_label = tk.Label(self.canvas, text="", bg="black", font=("Arial", 18, "bold"), fg="white")
-        self.canvas.create_window(self.screen_width / 2, self.screen_height * 0.1 + 50, window=self.clock_label)
-        
-        
-        # --- สร้างปุ่มควบคุม ---
-        btn_y_pos = self.screen_height * 0.78 # ตำแหน่ง Y ของปุ่ม
-        btn_font = ("Arial", 10, "bold")
-        
-        # ปุ่มตั้งเส้นทางเข้า (Inbound)
-        self.btn_route_p1 = tk.Button(self.canvas, text="เส้นทางเข้า P1 (บน)", width=20, command=lambda: self.handle_route_in(1), font=btn_font, relief="raised", bg="#c7d2fe", fg="black")
-        self.btn_route_p2 = tk.Button(self.canvas, text="เส้นทางเข้า P2 (ล่าง)", width=20, command=lambda: self.handle_route_in(2), font=btn_font, relief="raised", bg="#c7d2fe", fg="black")
-        
-        # ปุ่มเรียกรถไฟ (Arrive)
-        self.btn_arrive = tk.Button(self.canvas, text="รถไฟเข้า", width=20, command=self.handle_arrive, font=btn_font, relief="raised", bg="#fef08a", fg="black", state="disabled")
-        
-        # ปุ่มตั้งเส้นทางออก (Outbound)
-        self.btn_depart_p1 = tk.Button(self.canvas, text="ออกเส้นทาง P1", width=20, command=lambda: self.handle_route_out(1), font=btn_font, relief="raised", bg="#bbf7d0", fg="black", state="disabled")
-        self.btn_depart_p2 = tk.Button(self.canvas, text="ออกเส้นทาง P2", width=20, command=lambda: self.handle_route_out(2), font=btn_font, relief="raised", bg="#bbf7d0", fg="black", state="disabled")
-        
-        # ปุ่มหยุดฉุกเฉิน
-        self.btn_emergency = tk.Button(self.canvas, text="!! หยุดฉุกเฉิน !!", width=20, command=self.handle_emergency, font=btn_font, relief="raised", bg="#dc2626", fg="white")
-
-        # --- จัดวางปุ่มลงบน Canvas ---
-        self.canvas.create_window(self.screen_width * 0.35, btn_y_pos, window=self.btn_route_p1)
-        self.canvas.create_window(self.screen_width * 0.35, btn_y_pos + 40, window=self.btn_route_p2)
-        
-        self.canvas.create_window(self.screen_width * 0.5, btn_y_pos, window=self.btn_arrive)
-        
-        self.canvas.create_window(self.screen_width * 0.65, btn_y_pos, window=self.btn_depart_p1)
-        self.canvas.create_window(self.screen_width * 0.65, btn_y_pos + 40, window=self.btn_depart_p2)
-        
-        self.canvas.create_window(self.screen_width * 0.5, btn_y_pos + 40, window=self.btn_emergency)
-        
-        # --- เริ่มการทำงาน ---
-        self.sim.draw_base_tracks() # วาด Track ครั้งแรก
-        self._update_time()         # เริ่ม Loop นาฬิกา
-        self._monitor()             # เริ่ม Loop ตรวจสอบสถานะ (UI update)
-
-    def log_message(self, msg):
-        """เพิ่มข้อความลงในกล่อง Log (Text widget)"""
-        try:
-            now = datetime.datetime.now().strftime("%H:%M:%S")
-            formatted_msg = f"[{now}] {msg}\n"
-            
-            self.log_text.config(state="normal")  # เปิดให้แก้ไข
-            self.log_text.insert(tk.END, formatted_msg) # เพิ่มข้อความ
-            self.log_text.see(tk.END)  # เลื่อนไปล่างสุด
-            self.log_text.config(state="disabled") # ปิดการแก้ไข
-        except Exception as e:
-            print(f"Log Error: {e}")  # พิมพ์ error ถ้า GUI พัง
-
-    def close_fullscreen(self, event=None):
-        """ออกจากโหมดเต็มจอ (เมื่อกด Escape)"""
-        self.log_message("[APP] Closing fullscreen.")
-        self.root.attributes('-fullscreen', False)
-
-    
-    def _update_time(self):
-        """อัปเดตนาฬิกา (เรียกตัวเองทุก 1 วินาที)"""
-        time_str = datetime.datetime.now().strftime("%H:%M:%S")
-        now = f"เวลาปัจจุบัน: {time_str}"
-        self.clock_label.config(text=now)
-        self.root.after(1000, self._update_time)  # เรียกใหม่ในอีก 1000ms
-    
-    # --- ฟังก์ชัน 'Handle' (ตัวกลางเชื่อมปุ่มกับ Simulator) ---
-
-    def handle_route_in(self, platform):
-        """ถูกเรียกเมื่อกดปุ่ม 'เส้นทางเข้า P1/P2'"""
-        self.log_message(f"[CONTROL] Requesting INBOUND route to P{platform}...")
-        self.sim.set_route_in(platform) # เรียกฟังก์ชันของ Sim
-
-    def handle_route_out(self, platform):
-        """ถูกเรียกเมื่อกดปุ่ม 'ออกเส้นทาง P1/P2'"""
-        self.log_message(f"[CONTROL] Requesting OUTBOUND route from P{platform}...")
-        self.sim.set_route_out(platform) # เรียกฟังก์ชันของ Sim
-        
-    def handle_arrive(self):
-        """ถูกเรียกเมื่อกดปุ่ม 'รถไฟเข้า'"""
-        self.log_message(f"[CONTROL] Simulating train arrival...")
-        self.sim.call_train() # เรียกฟังก์ชันของ Sim
-        
-    def handle_emergency(self):
-        """ถูกเรียกเมื่อกดปุ่ม 'หยุดฉุกเฉิน'"""
-        self.log_message("[CONTROL] !! EMERGENCY STOP PRESSED !!")
-        self.sim.emergency_stop() # เรียกฟังก์ชันของ Sim
-
-    
-    def _monitor(self):
-        """
-        ลูปหลักของ GUI (เรียกตัวเองทุก 100ms)
-        ทำหน้าที่ตรวจสอบสถานะจาก Simulator แล้วอัปเดต UI
-        """
-        self._update_ui()
-        self.root.after(100, self._monitor)  # เรียกใหม่ในอีก 100ms
-        
-    def _update_ui(self):
-        """
-        ฟังก์ชันสำคัญ: อัปเดตสถานะของ GUI (ปุ่ม, ไฟ, ข้อความ)
-        ตามสถานะ (state) จาก Simulator
-        """
-        
-        # 1. ดึงสถานะปัจจุบันจาก Simulator
-        state = self.sim.state
-        route = self.sim.route_locked
-        p1_occ = self.sim.platform_occupied[1]
-        p2_occ = self.sim.platform_occupied[2]
-        train_id = self.sim.current_train_id
-        
-        # 2. คำนวณเงื่อนไขของ UI
-        is_ready = state == "ready" and not route
-        is_in_station = state == "in_station" and not route
-        is_moving = state in ["running", "leaving"] or route
-        
-        # 3. อัปเดตสถานะปุ่ม (เปิด/ปิด)
-        # ปุ่มตั้งทางเข้า: ต้อง 'พร้อม' และ ชานชาลา 'ว่าง'
-        self.btn_route_p1.config(state="normal" if is_ready and not p1_occ else "disabled")
-        self.btn_route_p2.config(state="normal" if is_ready and not p2_occ else "disabled")
-        
-        # ปุ่มรถไฟเข้า: ต้องมี 'เส้นทางเข้า (IN)' ตั้งไว้ และ สถานะ 'พร้อม'
-        self.btn_arrive.config(state="normal" if route and route.endswith("_IN") and state == "ready" else "disabled")
-        
-        # ปุ่มตั้งทางออก: ต้อง 'จอดในสถานี' และ ชานชาลา 'มีรถ'
-        self.btn_depart_p1.config(state="normal" if is_in_station and p1_occ else "disabled")
-        self.btn_depart_p2.config(state="normal" if is_in_station and p2_occ else "disabled")
-
-        # ปุ่มฉุกเฉิน: ปิดการใช้งานถ้ากำลังฉุกเฉินอยู่ (รอรีเซ็ต)
-        self.btn_emergency.config(state="disabled" if state == "emergency" else "normal")
-
-        # 4. อัปเดตไฟสัญญาณ
-        # ตั้งค่าเริ่มต้นเป็นสีแดงทั้งหมด
-        self.canvas.itemconfig(self.signal_1, fill="red")
-        self.canvas.itemconfig(self.signal_p1_depart, fill="red")
-        self.canvas.itemconfig(self.signal_p2_depart, fill="red")
-        self.canvas.itemconfig(self.signal_3, fill="red")
-
-        # เปลี่ยนเป็นสีเขียวตามเส้นทางที่ล็อก
-        if route == "P1_IN":
-            self.canvas.itemconfig(self.signal_1, fill="green") # S-01 เขียว
-        elif route == "P2_IN":
-            self.canvas.itemconfig(self.signal_1, fill="green") # S-01 เขียว
-        elif route == "P1_OUT":
-            self.canvas.itemconfig(self.signal_p1_depart, fill="green") # S-P1 เขียว
-            self.canvas.itemconfig(self.signal_3, fill="green")      # S-03 เขียว
-        elif route == "P2_OUT":
-            self.canvas.itemconfig(self.signal_p2_depart, fill="green") # S-P2 เขียว
-            self.canvas.itemconfig(self.signal_3, fill="green")      # S-03 เขียว
-        
-        # 5. อัปเดตข้อความสถานะ (Status Label)
-        if state == "ready" and not route:
-            self.status_label.config(text="สถานะ: พร้อม (Ready)", fg="green")
-        elif state == "in_station":
-            platform = self.sim.last_platform
-            train_id_text = train_id if train_id else "รถไฟ"
-            self.status_label.config(text=f"สถานะ: {train_id_text} จอดที่ P{platform}", fg="cyan")
-        elif state == "running":
-            train_id_text = train_id if train_id else "รถไฟ"
-            self.status_label.config(text=f"สถานะ: {train_id_text} กำลังเข้า (Running)", fg="yellow")
-        elif state == "leaving":
-            train_id_text = train_id if train_id else "รถไฟ"
-            self.status_label.config(text=f"สถานะ: {train_id_text} กำลังออก (Leaving)", fg="yellow")
-        elif state == "emergency":
-            self.status_label.config(text="สถานะ: หยุดฉุกเฉิน (EMERGENCY)", fg="red")
-        elif route:
-            self.status_label.config(text=f"สถานะ: ตั้งเส้นทางแล้ว ({route})", fg="orange")
-        
-
-# --- จุดเริ่มต้นของโปรแกรม ---
-if __name__ == "__main__":
-    root = tk.Tk()  # สร้างหน้าต่างหลัก
-    app = TrainApp(root) # สร้างแอป GUI
-    root.mainloop() # เริ่มการทำงานของ GUI
\ No newline at end of file
+import tkinter as tk
+from array import array
+import argparse
+import bisect
+import collections
+import collections.abc
+import copy
+import cProfile
+import datetime
+import functools
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import mmap
+import operator
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+
+try:
+    import numpy as np  # ไม่บังคับ: ถ้ามีจะใช้คำนวณการเคลื่อนที่ของทุกขบวนแบบ vectorised
+except ImportError:
+    np = None
+
+# คลาสสำหรับเก็บข้อมูลพิกัด (x, y) ของแต่ละช่อง
+# (สร้างขึ้นเมื่อมีคนขอเท่านั้น ข้อมูลจริงเก็บใน TrackGeometry)
+class Tile:
+    __slots__ = ("x", "y", "id")
+
+    def __init__(self, x, y, id=None):
+        self.x = x  # พิกัดแกน X
+        self.y = y  # พิกัดแกน Y
+        self.id = id  # หมายเลขไทล์ใน TrackGeometry (None = ไม่ได้มาจาก geometry)
+
+
+# คลาสสำหรับเก็บพิกัดของทุกไทล์ในแผนที่ไว้ใน array ต่อเนื่อง (tile id = index ใน array)
+class TrackGeometry:
+    def __init__(self, ts):
+        """
+        - ts: ขนาดไทล์ (พิกเซล)
+        """
+        self.ts = ts
+        self.xs = array("d")  # พิกัด x (มุมซ้ายบน) ของแต่ละไทล์
+        self.ys = array("d")  # พิกัด y (มุมซ้ายบน) ของแต่ละไทล์
+        # พิกัดกึ่งกลางไทล์ที่คำนวณไว้ล่วงหน้า (cx0, cy0, cx1, cy1, ...) ส่งให้ create_line/coords ได้เลย
+        self.centres = array("d")
+        # ช่อง (gx, gy) -> tile id ใช้รวมไทล์ช่องเดียวกันเป็นไทล์เดียว (ใช้ตอนสร้างเส้นทางเท่านั้น)
+        self._cells = {}
+        self.routes = {}  # ชื่อเส้นทาง -> TrackPath
+        # ดัชนีย้อนกลับ: tile id -> [(ชื่อเส้นทาง, ตำแหน่งในเส้นทาง), ...] ของทุกเส้นทางที่ลงทะเบียน
+        # (สร้างตอน locate() ครั้งแรก ไม่ทำตอนเริ่มโปรแกรม)
+        self.tile_routes = None
+
+    @classmethod
+    def from_arrays(cls, ts, xs, ys, centres):
+        """
+        สร้าง geometry จาก array พิกัดที่คำนวณไว้แล้ว (เช่น memoryview จากไฟล์ cache ที่ mmap ไว้)
+        ไม่คัดลอกข้อมูล: เวลาที่ใช้ไม่ขึ้นกับจำนวนไทล์ (คัดลอกเป็น array เมื่อมีการ add() ไทล์ใหม่เท่านั้น)
+        """
+        geometry = cls(ts)
+        geometry.xs, geometry.ys, geometry.centres = xs, ys, centres
+        geometry._cells = None
+        return geometry
+
+    def __len__(self):
+        return len(self.xs)
+
+    def compact(self):
+        """ทิ้งดัชนีช่องที่ใช้ตอนสร้าง (ดัชนีนี้ใช้หน่วยความจำมากกว่า array พิกัดหลายเท่า)"""
+        self._cells = None
+
+    def add(self, gx, gy):
+        """เพิ่มไทล์ที่ช่อง (gx, gy) แล้วคืน tile id (ถ้ามีอยู่แล้วคืน id เดิม)"""
+        if self._cells is None:
+            # ถูก compact ไปแล้ว: สร้างดัชนีช่องกลับมาจาก array พิกัด
+            # (พิกัดที่มาจาก cache เป็น memoryview แบบอ่านอย่างเดียว ต้องคัดลอกเป็น array ก่อนเพิ่มไทล์)
+            if isinstance(self.xs, memoryview):
+                self.xs, self.ys, self.centres = (array("d", a.tobytes()) for a in (self.xs, self.ys, self.centres))
+            ts = self.ts
+            self._cells = {(round(x / ts), round(y / ts)): i for i, (x, y) in enumerate(zip(self.xs, self.ys))}
+        tile_id = self._cells.get((gx, gy))
+        if tile_id is None:
+            tile_id = self._cells[(gx, gy)] = len(self.xs)
+            ts = self.ts
+            self.xs.append(gx * ts)
+            self.ys.append(gy * ts)
+            self.centres.append(gx * ts + ts / 2)
+            self.centres.append(gy * ts + ts / 2)
+        return tile_id
+
+    def path(self, cells):
+        """สร้าง TrackPath จากรายการช่อง (gx, gy)"""
+        return TrackPath(self, array("l", [self.add(gx, gy) for gx, gy in cells]))
+
+    def tile(self, tile_id):
+        """สร้าง Tile (x, y) ของ tile id ที่ระบุ"""
+        return Tile(self.xs[tile_id], self.ys[tile_id], tile_id)
+
+    def add_route(self, name, path):
+        """ลงทะเบียนเส้นทาง (ดัชนี tile id -> ตำแหน่ง สร้างเมื่อใช้ครั้งแรก แล้วหาตำแหน่งได้ใน O(1))"""
+        self.routes[name] = path
+        self.tile_routes = None
+        return path
+
+    def locate(self, tile_id):
+        """คืนรายการ (ชื่อเส้นทาง, ตำแหน่ง) ของทุกเส้นทางที่ผ่านไทล์นี้"""
+        if self.tile_routes is None:
+            self.tile_routes = {}
+            for name, path in self.routes.items():
+                for offset, tid in enumerate(path.ids):
+                    self.tile_routes.setdefault(tid, []).append((name, offset))
+        return self.tile_routes.get(tile_id, [])
+
+
+# เส้นทาง = ลำดับของ tile id (index ชี้เข้า TrackGeometry) ไม่ได้เก็บ Tile object
+class TrackPath(collections.abc.Sequence):
+    __slots__ = ("geometry", "ids", "_centres", "offsets")
+
+    def __init__(self, geometry, ids):
+        self.geometry = geometry
+        self.ids = ids  # array ของ tile id
+        self._centres = None  # พิกัดกึ่งกลางของทั้งเส้น (สร้างเมื่อใช้ครั้งแรก)
+        self.offsets = None  # tile id -> ตำแหน่งในเส้นทาง (สร้างด้วย build_index)
+
+    def build_index(self):
+        """สร้างดัชนี tile id -> ตำแหน่งในเส้นทาง (ทำครั้งเดียวตอนหาตำแหน่งครั้งแรก)"""
+        if self.offsets is None:
+            self.offsets = {tile_id: i for i, tile_id in enumerate(self.ids)}
+
+    def offset_of(self, tile_id):
+        """ตำแหน่งของไทล์ในเส้นทางนี้ (O(1)) หรือ None ถ้าไทล์ไม่อยู่บนเส้นทาง"""
+        self.build_index()
+        return self.offsets.get(tile_id)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return TrackPath(self.geometry, self.ids[i])
+        return self.geometry.tile(self.ids[i])
+
+    def __add__(self, other):
+        """ต่อเส้นทาง (ต่อกันแค่ array ของ id ไม่คัดลอก Tile)"""
+        ids = array("l", self.ids)
+        ids.extend(other.ids)
+        return TrackPath(self.geometry, ids)
+
+    def centres(self):
+        """พิกัดกึ่งกลาง (x, y, x, y, ...) ของทั้งเส้น เป็น array('d') (คำนวณครั้งเดียวแล้วเก็บไว้)"""
+        if self._centres is None:
+            src = self.geometry.centres
+            out = array("d")
+            for tile_id in self.ids:
+                out.append(src[2 * tile_id])
+                out.append(src[2 * tile_id + 1])
+            self._centres = out
+        return self._centres
+
+
+# ตาราง interlocking ที่ compile แล้ว: 1 บิตต่อ 1 เส้นทาง เก็บเส้นทางที่ล็อกอยู่เป็นจำนวนเต็มตัวเดียว
+# ตรวจว่าตั้งเส้นทางได้ไหม / ล็อก / ปลดล็อก ใช้การคำนวณบิตไม่กี่ครั้ง ไม่ขึ้นกับจำนวนเส้นทาง
+# ผังที่ประกาศไว้ (ส่วน "interlocking" ของไฟล์เลย์เอาต์ ดู layouts/parknam.json):
+# - sections: ตอนราง (track section) แต่ละเส้นทางจองตอนรางที่ใช้ทั้งหมด เส้นทางที่ใช้ตอนรางร่วมกันล็อกพร้อมกันไม่ได้
+# - points: ประแจที่เส้นทางต้องตั้งไว้ (normal = ทางตรง, reverse = ทางเบี่ยง)
+# - flank: ตอนรางป้องกันด้านข้าง ต้องไม่ถูกเส้นทางอื่นจองขณะเส้นทางนี้ล็อก
+# - signals: ไฟสัญญาณที่เป็นสีเขียวเมื่อเส้นทางนี้ล็อก
+# - kind/platform: ชนิดเส้นทาง (in = เข้าชานชาลา, out = ออกจากชานชาลา) และหมายเลขชานชาลา
+class Interlocking:
+    def __init__(self, layout):
+        """
+        - layout: dict ผัง interlocking (sections, routes)
+        """
+        self.routes = layout["routes"]  # ชื่อเส้นทาง -> รายละเอียดตามที่ประกาศ
+        self.names = list(self.routes)  # บิตที่ i = เส้นทาง names[i]
+        self.bit = {name: 1 << i for i, name in enumerate(self.names)}
+        sections = {name: i for i, name in enumerate(layout.get("sections", ()))}
+
+        # 1. ดัชนีย้อนกลับ: ตอนราง/ประแจ -> bitmask ของเส้นทางที่ใช้
+        users = collections.defaultdict(int)  # ตอนราง -> เส้นทางที่จอง
+        flankers = collections.defaultdict(int)  # ตอนราง -> เส้นทางที่ต้องการให้ตอนรางนี้ว่าง
+        point_users = collections.defaultdict(int)  # ประแจ -> เส้นทางที่ต้องตั้งประแจนี้
+        point_pos = collections.defaultdict(int)  # (ประแจ, ท่า) -> เส้นทางที่ต้องการท่านี้
+        self.signals = collections.defaultdict(int)  # สัญญาณ -> เส้นทางที่ทำให้เป็นไฟเขียว
+        self.kinds = collections.defaultdict(int)  # ชนิดเส้นทาง -> bitmask
+        self.sections = {}  # เส้นทาง -> bitmask ของตอนรางที่จอง
+        for name, spec in self.routes.items():
+            bit = self.bit[name]
+            mask = 0
+            for section in spec.get("sections", ()):
+                mask |= 1 << self._section_index(sections, name, section)
+                users[section] |= bit
+            self.sections[name] = mask
+            for section in spec.get("flank", ()):
+                self._section_index(sections, name, section)
+                flankers[section] |= bit
+            for point, position in spec.get("points", {}).items():
+                point_users[point] |= bit
+                point_pos[point, position] |= bit
+            for signal in spec.get("signals", ()):
+                self.signals[signal] |= bit
+            self.kinds[spec.get("kind")] |= bit
+
+        # 2. ตารางขัดแย้ง: เส้นทาง -> bitmask ของเส้นทางที่ล็อกพร้อมกันไม่ได้
+        #    (ใช้ตอนรางร่วมกัน, ตอนรางของฝ่ายหนึ่งเป็น flank ของอีกฝ่าย, หรือต้องการประแจคนละท่า)
+        self.conflicts = {}
+        for name, spec in self.routes.items():
+            mask = 0
+            for section in spec.get("sections", ()):
+                mask |= users[section] | flankers[section]
+            for section in spec.get("flank", ()):
+                mask |= users[section]
+            for point, position in spec.get("points", {}).items():
+                mask |= point_users[point] & ~point_pos[point, position]
+            self.conflicts[name] = mask & ~self.bit[name]
+
+        self.locked = 0  # bitmask ของเส้นทางที่ล็อกอยู่
+
+    def tables(self):
+        """ตารางที่ compile แล้วเป็น dict (แปลงเป็น JSON ได้) ใช้เก็บลงไฟล์ cache ของเลย์เอาต์"""
+        return {"routes": self.routes, "conflicts": self.conflicts, "sections": self.sections,
+                "signals": dict(self.signals), "kinds": dict(self.kinds)}
+
+    @classmethod
+    def from_tables(cls, tables):
+        """สร้างจากตารางที่ compile ไว้แล้ว (ผลของ tables()) โดยไม่คำนวณตารางขัดแย้งใหม่"""
+        self = cls.__new__(cls)
+        self.routes = tables["routes"]
+        self.names = list(self.routes)
+        self.bit = {name: 1 << i for i, name in enumerate(self.names)}
+        self.conflicts = dict(tables["conflicts"])
+        self.sections = dict(tables["sections"])
+        self.signals = collections.defaultdict(int, tables["signals"])
+        self.kinds = collections.defaultdict(int, tables["kinds"])
+        self.locked = 0
+        return self
+
+    @staticmethod
+    def _section_index(sections, route, section):
+        if section not in sections:
+            raise ValueError(f"route {route}: unknown track section {section!r}")
+        return sections[section]
+
+    def available(self, name):
+        """ตั้งเส้นทางนี้ได้ตอนนี้หรือไม่ (ยังไม่ล็อก และไม่ขัดแย้งกับเส้นทางที่ล็อกอยู่)"""
+        return not self.locked & (self.conflicts[name] | self.bit[name])
+
+    def lock(self, name):
+        """ล็อกเส้นทาง คืนค่า False ถ้าขัดแย้งกับเส้นทางที่ล็อกอยู่"""
+        if self.locked & (self.conflicts[name] | self.bit[name]):
+            return False
+        self.locked |= self.bit[name]
+        return True
+
+    def release(self, name):
+        """ปลดล็อกเส้นทาง คืนค่า True ถ้าเส้นทางนี้ล็อกอยู่"""
+        bit = self.bit[name]
+        if not self.locked & bit:
+            return False
+        self.locked &= ~bit
+        return True
+
+    def is_locked(self, name):
+        return bool(self.locked & self.bit[name])
+
+    def locked_routes(self, mask=-1):
+        """ชื่อเส้นทางที่ล็อกอยู่ (เฉพาะที่อยู่ใน mask เช่น kinds["in"]) เรียงตามลำดับที่ประกาศ"""
+        bits = self.locked & mask
+        names = []
+        while bits:
+            low = bits & -bits
+            names.append(self.names[low.bit_length() - 1])
+            bits ^= low
+        return names
+
+    def signal_clear(self, signal):
+        """ไฟสัญญาณนี้เป็นสีเขียวหรือไม่ (มีเส้นทางที่ใช้สัญญาณนี้ล็อกอยู่)"""
+        return bool(self.locked & self.signals.get(signal, 0))
+
+    def conflicting(self, name):
+        """ชื่อเส้นทางที่ล็อกอยู่และขัดแย้งกับเส้นทางนี้ (ใช้เขียนข้อความ error)"""
+        return self.locked_routes(self.conflicts[name] | self.bit[name])
+
+
+# เลย์เอาต์สถานีที่อ่านจากไฟล์ JSON (nodes, segments, routes, platforms, signals, interlocking ดู layouts/parknam.json)
+# ผล compile (พิกัดไทล์, tile id ของทุก segment/เส้นทาง, ตารางชานชาลา/สัญญาณ/interlocking) เก็บเป็นไฟล์ binary
+# ตาม hash ของเนื้อหาไฟล์ ครั้งต่อไปเปิดด้วย mmap แล้วใช้ได้เลย เวลาเริ่มโปรแกรมจึงไม่ขึ้นกับจำนวนไทล์
+class StationLayout:
+
+    DEFAULT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "layouts", "parknam.json")
+    CACHE_DIR = ".layout-cache"  # โฟลเดอร์ cache (อยู่ข้างไฟล์เลย์เอาต์)
+    CACHE_MAGIC = b"PNLAYOUT"
+    CACHE_VERSION = 2  # เพิ่มเมื่อวิธี compile หรือรูปแบบไฟล์ cache เปลี่ยน (cache เก่าจะถูกสร้างใหม่)
+    # header ของไฟล์ cache: magic, version, ความยาวสารบัญ (JSON), sha256 ของเลย์เอาต์
+    # ต่อด้วยสารบัญแล้วตามด้วย array ทั้งหมด (เริ่มที่ขอบ 8 ไบต์ ทุกค่ามีขนาด 8 ไบต์)
+    HEADER = struct.Struct("=8sII32s")
+
+    def __init__(self, path, ts, tables, arrays):
+        """
+        - path: ไฟล์เลย์เอาต์
+        - ts: ขนาดไทล์ (พิกเซล)
+        - tables: ตารางที่ compile แล้ว (dict ที่แปลงเป็น JSON ได้)
+        - arrays: ชื่อ -> array (หรือ memoryview จากไฟล์ cache) ของพิกัดไทล์และ tile id
+        """
+        self.path = path
+        self.ts = ts
+        self.from_cache = isinstance(arrays["xs"], memoryview)
+        self.name = tables["name"]
+        self.width = tables["width"]  # ความกว้างของแผนที่ (จำนวนไทล์) ts = ความกว้างจอ / width
+        self.train_length = tables["train_length"]
+        self.signals = tables["signals"]  # ชื่อสัญญาณ -> ตำแหน่งไฟและป้าย (หน่วยไทล์)
+        self.interlocking = tables["interlocking"]  # ผลของ Interlocking.tables()
+        self.geometry = TrackGeometry.from_arrays(ts, arrays["xs"], arrays["ys"], arrays["centres"])
+        self.segments = {name: TrackPath(self.geometry, arrays["segment:" + name]) for name in tables["segments"]}
+        self.segment_ends = tables["segment_ends"]  # segment -> [x0, y0, x1, y1] ช่องแรกและช่องสุดท้าย
+        self.routes = {name: TrackPath(self.geometry, arrays["route:" + name]) for name in tables["routes"]}
+        self.route_segments = tables["routes"]  # เส้นทางที่ตั้งชื่อไว้ -> รายชื่อ segment
+        self.entry, self.exit = tables["entry"], tables["exit"]  # segment ทางเข้า/ออกของสถานี (ใช้ค้นเส้นทาง)
+        self.switches = tables["switches"]  # ประแจ -> ช่อง [x, y]
+        # หมายเลขชานชาลา -> segment, เส้นทางเข้า/ออก (ถ้าตั้งชื่อไว้) หรือ entry/exit, ป้าย
+        self.platforms = {int(key): spec for key, spec in tables["platforms"].items()}
+        # ส่วนของรางที่เปลี่ยนสีตามสถานะชานชาลา
+        self.platform_tracks = {platform: TrackPath(self.geometry, arrays[f"platform:{platform}"])
+                                for platform in self.platforms}
+        self.draw = [[self.segments[name] for name in names] for names in tables["draw"]]  # เส้นรางพื้นฐานที่วาด
+
+    @classmethod
+    def load(cls, path=None, screen_width=1250, cache_dir=None):
+        """
+        โหลดเลย์เอาต์ (None = สถานีปากน้ำ) ใช้ไฟล์ cache ถ้ามีและตรงกับเนื้อหาไฟล์ ไม่งั้น compile แล้วเขียน cache
+        - cache_dir: โฟลเดอร์ cache (None = .layout-cache ข้างไฟล์เลย์เอาต์, False = ไม่ใช้ cache)
+        """
+        path = path or cls.DEFAULT
+        with open(path, "rb") as f:
+            source = f.read()
+        # cache ผูกกับเนื้อหาไฟล์ ความกว้างจอ (ขนาดไทล์) และรูปแบบตัวเลขของเครื่อง
+        key = f"|{cls.CACHE_VERSION}|{screen_width!r}|{sys.byteorder}|{array('l').itemsize}".encode()
+        digest = hashlib.sha256(source + key).digest()
+        cache_path = None
+        if cache_dir is not False:
+            stem = os.path.splitext(os.path.basename(path))[0]
+            cache_path = os.path.join(cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), cls.CACHE_DIR),
+                                      f"{stem}-{digest.hex()[:16]}.bin")
+            try:
+                return cls._load_cache(path, cache_path, digest, screen_width)
+            except (OSError, ValueError, KeyError):
+                pass  # ยังไม่มี cache หรือไฟล์เสีย: compile ใหม่
+        spec = json.loads(source)
+        ts = screen_width / spec["width"]
+        tables, arrays = cls.compile(spec, ts)
+        if cache_path is not None:
+            try:
+                cls._save_cache(cache_path, digest, tables, arrays)
+            except OSError:
+                pass  # เขียน cache ไม่ได้ (เช่น โฟลเดอร์อ่านอย่างเดียว) ก็ยังใช้งานได้ แค่เริ่มช้ากว่า
+        return cls(path, ts, tables, arrays)
+
+    @classmethod
+    def compile(cls, spec, ts):
+        """ขยายเลย์เอาต์เป็นไทล์: คืนค่า (tables, arrays) สำหรับสร้าง StationLayout และเขียนไฟล์ cache"""
+        nodes = spec["nodes"]
+        geometry = TrackGeometry(ts)
+        arrays = {}
+
+        # 1. segment: เส้นตรงหรือเส้นเฉียง 45 องศาต่อกันผ่าน node ที่ระบุ (ไทล์ช่องเดียวกันได้ tile id เดียวกัน)
+        ends = {}  # segment -> ช่องแรกและช่องสุดท้าย (ใช้ต่อ segment เป็นกราฟใน TrackGraph)
+        for name, points in spec["segments"].items():
+            cells = []
+            for i in range(len(points) - 1):
+                start = cls._lookup(nodes, "node", f"segment {name}", points[i])
+                end = cls._lookup(nodes, "node", f"segment {name}", points[i + 1])
+                cells.extend(cls._line(name, start, end)[1 if i else 0:])
+            arrays["segment:" + name] = geometry.path(cells).ids
+            ends[name] = [*cells[0], *cells[-1]]
+        geometry.compact()
+
+        # 2. เส้นทางที่ตั้งชื่อไว้ (ไม่บังคับ): ต่อ segment ตามลำดับ
+        offsets = {}  # (เส้นทาง, segment) -> ตำแหน่งเริ่มของ segment ในเส้นทาง
+        for name, parts in spec.get("routes", {}).items():
+            ids = array("l")
+            for part in parts:
+                offsets.setdefault((name, part), len(ids))
+                ids.extend(cls._lookup(arrays, "segment", f"route {name}", "segment:" + part))
+            arrays["route:" + name] = ids
+
+        # 3. ชานชาลา: เส้นทางเข้า/ออกที่ตั้งชื่อไว้ต้องผ่าน segment ของชานชาลา
+        # (ไม่ระบุ inbound/outbound = ค้นเส้นทาง entry -> ชานชาลา -> exit จากกราฟตอนใช้งาน ด้วย TrackGraph)
+        platforms = {}
+        for key, platform in spec["platforms"].items():
+            segment = cls._lookup(arrays, "segment", f"platform {key}", "segment:" + platform["segment"])
+            platforms[key] = dict(platform)
+            if "inbound" in platform:
+                for route in (platform["inbound"], platform["outbound"]):
+                    if (route, platform["segment"]) not in offsets:
+                        raise ValueError(f"platform {key}: route {route!r} does not pass segment {platform['segment']!r}")
+            else:
+                for end in ("entry", "exit"):
+                    cls._lookup(spec["segments"], "segment", f"platform {key} {end}", platform.get(end, spec.get(end)))
+            # ส่วนที่เปลี่ยนสีตามสถานะชานชาลา (highlight_x = ช่วงพิกัด x หน่วยไทล์ [เริ่ม, จบ) ถ้าไม่ระบุ = ทั้ง segment)
+            x_min, x_max = (x * ts for x in platform.get("highlight_x", (-math.inf, math.inf)))
+            arrays[f"platform:{key}"] = array("l", [i for i in segment if x_min <= geometry.xs[i] < x_max])
+
+        for names in spec.get("draw", ()):
+            for name in names:
+                cls._lookup(spec["segments"], "segment", "draw", name)
+        # ประแจ: ชื่อ -> ช่องของ node (segment ที่เริ่มหรือจบที่ช่องนี้ผ่านประแจนี้)
+        switches = {name: cls._lookup(nodes, "node", f"switch {name}", node) for name, node in spec.get("switches", {}).items()}
+
+        arrays.update(xs=geometry.xs, ys=geometry.ys, centres=geometry.centres)
+        tables = {
+            "name": spec.get("name", ""),
+            "width": spec["width"],
+            "train_length": spec["train_length"],
+            "segments": list(spec["segments"]),
+            "segment_ends": ends,
+            "routes": spec.get("routes", {}),
+            "entry": spec.get("entry"),
+            "exit": spec.get("exit"),
+            "switches": switches,
+            "platforms": platforms,
+            "signals": spec.get("signals", {}),
+            "draw": spec.get("draw", []),
+            "interlocking": Interlocking(spec.get("interlocking", {"routes": {}})).tables(),
+        }
+        return tables, arrays
+
+    @staticmethod
+    def _lookup(table, kind, owner, key):
+        if key not in table:
+            raise ValueError(f"{owner}: unknown {kind} {key!r}")
+        return table[key]
+
+    @staticmethod
+    def _line(name, start, end):
+        """ช่อง (gx, gy) จาก start ถึง end (รวมทั้งสองปลาย) ได้เฉพาะเส้นตรงแนวนอน/แนวตั้งหรือเฉียง 45 องศา"""
+        (x0, y0), (x1, y1) = start, end
+        dx, dy = x1 - x0, y1 - y0
+        if dx and dy and abs(dx) != abs(dy):
+            raise ValueError(f"segment {name}: {start} -> {end} is not straight or 45-degree diagonal")
+        sx, sy = (dx > 0) - (dx < 0), (dy > 0) - (dy < 0)
+        return [(x0 + sx * i, y0 + sy * i) for i in range(max(abs(dx), abs(dy)) + 1)]
+
+    @classmethod
+    def _save_cache(cls, cache_path, digest, tables, arrays):
+        """เขียนไฟล์ cache (เขียนไฟล์ชั่วคราวแล้ว os.replace: โปรเซสอื่นไม่เห็นไฟล์ที่เขียนไม่ครบ)"""
+        toc = {"tables": tables, "arrays": {}}
+        offset = 0
+        for name, values in arrays.items():
+            toc["arrays"][name] = [values.typecode, offset, len(values)]
+            offset += len(values) * values.itemsize
+        toc_bytes = json.dumps(toc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        pad = -(cls.HEADER.size + len(toc_bytes)) % 8
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(cls.HEADER.pack(cls.CACHE_MAGIC, cls.CACHE_VERSION, len(toc_bytes), digest))
+            f.write(toc_bytes + b"\0" * pad)
+            for values in arrays.values():
+                values.tofile(f)
+        os.replace(tmp_path, cache_path)
+
+    @classmethod
+    def _load_cache(cls, path, cache_path, digest, screen_width):
+        """เปิดไฟล์ cache ด้วย mmap: array ทั้งหมดเป็น memoryview ชี้เข้าไฟล์ตรงๆ (ไม่อ่าน/คัดลอกข้อมูลไทล์)"""
+        with open(cache_path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(buf) < cls.HEADER.size:
+            raise ValueError(f"{cache_path}: truncated")
+        magic, version, toc_len, stored = cls.HEADER.unpack_from(buf)
+        if magic != cls.CACHE_MAGIC or version != cls.CACHE_VERSION or stored != digest:
+            raise ValueError(f"{cache_path}: stale cache")
+        start = cls.HEADER.size + toc_len
+        toc = json.loads(buf[cls.HEADER.size:start])
+        start += -start % 8
+        view = memoryview(buf)
+        arrays = {}
+        for name, (typecode, offset, count) in toc["arrays"].items():
+            end = start + offset + count * array(typecode).itemsize
+            if end > len(buf):
+                raise ValueError(f"{cache_path}: truncated")
+            arrays[name] = view[start + offset:end].cast(typecode)
+        tables = toc["tables"]
+        return cls(path, screen_width / tables["width"], tables, arrays)
+
+
+# เส้นทางที่ได้จาก TrackGraph: ลำดับ segment, TrackPath ที่ต่อแล้ว และจุดหยุดที่คำนวณไว้ล่วงหน้า
+class TrackRoute:
+    __slots__ = ("segments", "path", "stops")
+
+    def __init__(self, segments, path, lengths):
+        """
+        - segments: ชื่อ segment ตามลำดับที่วิ่ง
+        - path: TrackPath ของทั้งเส้น
+        - lengths: segment -> จำนวนไทล์
+        """
+        self.segments = segments
+        self.path = path
+        # segment -> จุดหยุดพื้นฐาน (กึ่งกลาง segment ในเส้นทางนี้) จุดหยุดจริง = stops[segment] + ความยาวขบวน // 2
+        self.stops = {}
+        offset = 0
+        for name in segments:
+            self.stops.setdefault(name, offset + lengths[name] // 2)
+            offset += lengths[name]
+
+
+# กราฟของราง: segment (วิ่งตามลำดับไทล์) ต่อไปยัง segment ที่ไทล์แรกอยู่ช่องเดียวกันหรือติดกับไทล์สุดท้ายของมัน
+# จุดที่แยก/รวมหลายทางคือประแจ ค้นเส้นทางด้วย A* (ระยะ Chebyshev เป็น heuristic) แล้วเก็บใน LRU cache
+# ปิด segment หรือประแจเสียจะลบเฉพาะเส้นทางใน cache ที่ผ่าน segment นั้น
+class TrackGraph:
+
+    CACHE_SIZE = 1024
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.lengths = {name: len(path) for name, path in layout.segments.items()}
+        ends = layout.segment_ends
+        starts = collections.defaultdict(list)  # ช่องแรก -> segment ที่เริ่มที่ช่องนั้น
+        for name, (x0, y0, _, _) in ends.items():
+            starts[x0, y0].append(name)
+        self.next = {}  # segment -> segment ที่วิ่งต่อได้
+        for name, (_, _, x1, y1) in ends.items():
+            self.next[name] = [other for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                               for other in starts.get((x1 + dx, y1 + dy), ()) if other != name]
+        # ประแจ -> segment ที่เริ่มหรือจบที่ช่องของประแจ
+        touching = collections.defaultdict(set)
+        for name, (x0, y0, x1, y1) in ends.items():
+            touching[x0, y0].add(name)
+            touching[x1, y1].add(name)
+        self.switches = {name: set(touching[tuple(cell)]) for name, cell in layout.switches.items()}
+        # ลำดับ segment -> TrackRoute ที่สร้างแล้ว (ใช้ร่วมกับกราฟจาก blank() เส้นทางเดิมได้ TrackPath ตัวเดิม)
+        self._built = {}
+        self._reset()
+
+    def _reset(self):
+        """ล้างการปิดทาง / ประแจเสีย และ cache (โครงสร้างกราฟคงเดิม)"""
+        self.closed = set()  # segment ที่ถูกปิด
+        self.failed = set()  # ประแจที่เสีย
+        self._blocked = collections.Counter()  # segment -> จำนวนสาเหตุที่ใช้ไม่ได้ (ปิดเอง + ประแจเสีย)
+        self.cache = collections.OrderedDict()  # key -> TrackRoute หรือ None (ไม่มีทาง) เรียงจากใช้ล่าสุด
+        self._users = collections.defaultdict(set)  # segment -> key ใน cache ที่เส้นทางผ่าน segment นี้
+        self._stale = collections.defaultdict(set)  # segment ที่ใช้ไม่ได้ -> key ที่ค้นไว้ตอนที่มันใช้ไม่ได้
+        self._deps = {}  # key -> segment ที่ key ลงทะเบียนไว้ใน _users / _stale (ใช้ลบออกตอน evict)
+        self.hits = self.misses = 0
+
+    def blank(self):
+        """กราฟใหม่ที่ใช้โครงสร้างรางเดียวกัน (ไม่ต้องต่อ segment ใหม่) แต่ยังไม่มีการปิดทางและ cache ว่าง"""
+        graph = copy.copy(self)
+        graph._reset()
+        return graph
+
+    # --- การค้นเส้นทาง ---
+
+    def find(self, src, dst, via=None):
+        """
+        เส้นทางที่สั้นที่สุด (จำนวนไทล์) จาก segment src ถึง dst (ผ่าน via ถ้าระบุ) รวมทั้งสองปลาย
+        คืนค่า TrackRoute หรือ None ถ้าไม่มีทาง (เช่น segment ถูกปิด) ผลถูกเก็บใน LRU cache
+        """
+        key = (src, via, dst)
+        cache = self.cache
+        if key in cache:
+            cache.move_to_end(key)
+            self.hits += 1
+            return cache[key]
+        return self._store(key, self._join(src, via, dst))
+
+    def named(self, name):
+        """เส้นทางที่ตั้งชื่อไว้ในเลย์เอาต์ (ใช้ TrackPath เดิมของเลย์เอาต์) หรือ None ถ้าผ่าน segment ที่ใช้ไม่ได้"""
+        key = ("route", name)
+        cache = self.cache
+        if key in cache:
+            cache.move_to_end(key)
+            self.hits += 1
+            return cache[key]
+        segments = tuple(self.layout.route_segments[name])
+        route = None
+        if not any(self._blocked[seg] for seg in segments):
+            route = TrackRoute(segments, self.layout.routes[name], self.lengths)
+        return self._store(key, route)
+
+    def through(self, segments):
+        """เส้นทางตามลำดับ segment ที่ระบุ (ไม่ตรวจว่าปิดอยู่หรือไม่ ใช้สร้างเส้นทางของขบวนเดิมคืน)"""
+        return self._build(tuple(segments))
+
+    def _store(self, key, route):
+        """เก็บผลลง cache พร้อมดัชนีย้อนกลับ segment -> key (ลบตัวที่ใช้นานที่สุดเมื่อเต็ม)"""
+        self.misses += 1
+        cache = self.cache
+        cache[key] = route
+        deps = set(route.segments) if route is not None else set()
+        for seg in deps:
+            self._users[seg].add(key)
+        # ผลที่ค้นตอนมี segment ใช้ไม่ได้ อาจไม่ใช่ทางที่สั้นที่สุดเมื่อเปิดกลับมา
+        blocked = [seg for seg, n in self._blocked.items() if n]
+        for seg in blocked:
+            self._stale[seg].add(key)
+        deps.update(blocked)
+        self._deps[key] = deps
+        if len(cache) > self.CACHE_SIZE:
+            self._evict(next(iter(cache)))
+        return route
+
+    def _evict(self, key):
+        if key not in self.cache:
+            return
+        del self.cache[key]
+        for seg in self._deps.pop(key):
+            self._users[seg].discard(key)
+            self._stale[seg].discard(key)
+
+    def _join(self, src, via, dst):
+        if via is None:
+            segments = self._search(src, dst)
+        else:
+            first, second = self._search(src, via), self._search(via, dst)
+            segments = first + second[1:] if first is not None and second is not None else None
+        return None if segments is None else self._build(segments)
+
+    def _build(self, segments):
+        route = self._built.get(segments)
+        if route is not None:
+            return route
+        if len(self._built) >= 4 * self.CACHE_SIZE:
+            self._built.clear()
+        ids = array("l")
+        for seg in segments:
+            ids.extend(self.layout.segments[seg].ids)
+        route = self._built[segments] = TrackRoute(segments, TrackPath(self.layout.geometry, ids), self.lengths)
+        return route
+
+    def _search(self, src, dst):
+        """A* บนกราฟ segment: ต้นทุน = จำนวนไทล์, heuristic = ระยะ Chebyshev ถึงช่องแรกของ dst (ไม่เกินระยะจริง)"""
+        for seg in (src, dst):
+            if seg not in self.lengths:
+                raise KeyError(f"unknown segment {seg!r}")
+        blocked, lengths, ends = self._blocked, self.lengths, self.layout.segment_ends
+        if blocked[src] or blocked[dst]:
+            return None
+        gx, gy = ends[dst][0], ends[dst][1]
+
+        def estimate(seg):
+            _, _, x, y = ends[seg]
+            return max(0, max(abs(gx - x), abs(gy - y)) - 1) + lengths[dst]
+
+        cost = {src: lengths[src]}
+        parent = {src: None}
+        heap = [(cost[src] + (estimate(src) if src != dst else 0), 0, src)]
+        order = itertools.count(1)
+        while heap:
+            _, _, seg = heapq.heappop(heap)
+            if seg == dst:
+                segments = []
+                while seg is not None:
+                    segments.append(seg)
+                    seg = parent[seg]
+                return tuple(reversed(segments))
+            for other in self.next[seg]:
+                if blocked[other]:
+                    continue
+                c = cost[seg] + lengths[other]
+                if c < cost.get(other, math.inf):
+                    cost[other], parent[other] = c, seg
+                    heapq.heappush(heap, (c + (estimate(other) if other != dst else 0), next(order), other))
+        return None
+
+    # --- การปิดทาง / ประแจเสีย ---
+
+    def close_segment(self, name):
+        """ปิด segment (ไม่มีเส้นทางใหม่ผ่าน) คืนค่าจำนวนเส้นทางใน cache ที่ถูกลบ"""
+        if name not in self.lengths:
+            raise KeyError(f"unknown segment {name!r}")
+        if name in self.closed:
+            return 0
+        self.closed.add(name)
+        return self._block([name], 1)
+
+    def open_segment(self, name):
+        """เปิด segment ที่ปิดไว้ คืนค่าจำนวนเส้นทางใน cache ที่ถูกลบ"""
+        if name not in self.closed:
+            return 0
+        self.closed.discard(name)
+        return self._block([name], -1)
+
+    def fail_switch(self, name):
+        """ประแจเสีย: ทุก segment ที่ผ่านประแจนี้ใช้ไม่ได้ คืนค่าจำนวนเส้นทางใน cache ที่ถูกลบ"""
+        if name not in self.switches:
+            raise KeyError(f"unknown switch {name!r}")
+        if name in self.failed:
+            return 0
+        self.failed.add(name)
+        return self._block(self.switches[name], 1)
+
+    def repair_switch(self, name):
+        """ซ่อมประแจ คืนค่าจำนวนเส้นทางใน cache ที่ถูกลบ"""
+        if name not in self.failed:
+            return 0
+        self.failed.discard(name)
+        return self._block(self.switches[name], -1)
+
+    def blocked(self, segment):
+        """segment นี้ใช้ไม่ได้อยู่หรือไม่ (ปิดอยู่ หรือผ่านประแจที่เสีย)"""
+        return bool(self._blocked[segment])
+
+    def _block(self, segments, delta):
+        """
+        ปรับจำนวนสาเหตุที่ segment ใช้ไม่ได้ แล้วลบเฉพาะเส้นทางที่ได้รับผลกระทบ:
+        segment เพิ่งใช้ไม่ได้ = ลบเส้นทางที่ผ่าน, เพิ่งใช้ได้อีกครั้ง = ลบผลที่ค้นไว้ระหว่างที่มันใช้ไม่ได้
+        """
+        affected = set()
+        for seg in segments:
+            before = self._blocked[seg]
+            self._blocked[seg] += delta
+            if not before:
+                affected |= self._users[seg]
+            elif not self._blocked[seg]:
+                affected |= self._stale[seg]
+        for key in affected:
+            self._evict(key)
+        return len(affected)
+
+
+# ค่าการเคลื่อนที่ของรถไฟ 1 ค่า (เช่น speed) ที่เก็บเป็นคอลัมน์ใน FleetKinematics เมื่อขบวนอยู่ใน Simulator
+# (ก่อนเข้าร่วม fleet เก็บไว้ในตัว Train เอง) คืนค่าเป็น float/int ของ Python เสมอ ไม่ใช่ scalar ของ NumPy
+class FleetField:
+
+    def __init__(self, kind=float):
+        self.kind = kind
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.local = "_" + name
+
+    def __get__(self, train, owner=None):
+        if train is None:
+            return self
+        fleet = train.fleet
+        if fleet is None:
+            return getattr(train, self.local)
+        return self.kind(fleet.columns[self.name][train.slot])
+
+    def __set__(self, train, value):
+        fleet = train.fleet
+        if fleet is None:
+            setattr(train, self.local, value)
+        else:
+            fleet.columns[self.name][train.slot] = value
+
+
+# สถานะการเคลื่อนที่ของรถไฟทุกขบวนเก็บเป็นคอลัมน์ (1 ช่อง = 1 ขบวน) แทนการเก็บแยกในแต่ละ Train
+# update() คำนวณความเร็ว/เบรก/ระยะของทุกขบวนในครั้งเดียว: วนลูป Python กับ array
+# หรือ NumPy เมื่อขบวนมากพอที่ NumPy จะเร็วกว่า (ผลลัพธ์ตรงกันทุกบิตทั้งสองแบบ)
+class FleetKinematics:
+
+    FLOAT_COLUMNS = ("progress", "speed", "max_speed", "accel", "target", "braking")
+    INT_COLUMNS = ("head", "tail", "active")
+    # จำนวนช่องที่เริ่มใช้ NumPy (use_numpy=None) วัดด้วย benchmarks/bench_fleet.py: ต่ำกว่านี้ต้นทุนต่อการเรียก NumPy
+    # และการอ่านค่าทีละช่อง (FleetField) มากกว่าที่ประหยัดได้ สถานีปกติจึงใช้ pure Python เสมอ
+    NUMPY_MIN_TRAINS = 1000
+
+    def __init__(self, capacity=64, use_numpy=None):
+        """
+        - capacity: จำนวนช่องเริ่มต้น (ขยายเองเมื่อเต็ม)
+        - use_numpy: None = pure Python แล้วเปลี่ยนเป็น NumPy (ถ้าติดตั้งไว้) เมื่อมีถึง NUMPY_MIN_TRAINS ช่อง
+          True = ใช้ NumPy เสมอ, False = ใช้ pure Python เสมอ
+        """
+        if use_numpy and np is None:
+            raise RuntimeError("NumPy is not installed")
+        self.use_numpy = use_numpy
+        self.np = np if use_numpy else None
+        self.columns = {}
+        self.capacity = 0
+        self.size = 0  # จำนวนช่องที่เคยใช้ (ช่องที่ว่างแล้วอยู่ใน _free)
+        self.trains = []  # ช่อง -> Train (None = ว่าง)
+        self._free = []
+        self._grow(capacity)
+
+    def _pick_backend(self):
+        """use_numpy=None: ย้ายทุกคอลัมน์เป็น NumPy array ครั้งเดียวเมื่อ fleet โตถึง NUMPY_MIN_TRAINS ช่อง"""
+        if self.np is None and self.use_numpy is None and np is not None and self.size >= self.NUMPY_MIN_TRAINS:
+            self.np = np
+            for name, column in self.columns.items():
+                self.columns[name] = np.array(column, dtype=np.float64 if name in self.FLOAT_COLUMNS else np.int64)
+
+    def _grow(self, capacity):
+        for name in self.FLOAT_COLUMNS + self.INT_COLUMNS:
+            old = self.columns.get(name)
+            if self.np is not None:
+                dtype = self.np.float64 if name in self.FLOAT_COLUMNS else self.np.int64
+                column = self.np.zeros(capacity, dtype=dtype)
+                if old is not None:
+                    column[:self.capacity] = old
+            else:
+                column = old if old is not None else array("d" if name in self.FLOAT_COLUMNS else "q")
+                column.extend([0] * (capacity - self.capacity))
+            self.columns[name] = column
+        self.trains.extend([None] * (capacity - self.capacity))
+        self.capacity = capacity
+
+    def add(self, train):
+        """ย้ายค่าการเคลื่อนที่ของขบวนเข้าคอลัมน์ (ขบวนเริ่มในสถานะกำลังเคลื่อนที่)"""
+        if self._free:
+            slot = self._free.pop()
+        else:
+            if self.size == self.capacity:
+                self._grow(self.capacity * 2)
+            slot = self.size
+            self.size += 1
+            self._pick_backend()
+        values = {name: getattr(train, name) for name in ("progress", "speed", "braking")}
+        train.fleet, train.slot = self, slot
+        for name, value in values.items():
+            setattr(train, name, value)
+        self.sync(train)
+        c = self.columns
+        c["max_speed"][slot] = train.max_speed
+        c["accel"][slot] = train.accel or 0.0
+        self.trains[slot] = train
+        self.activate(train, train.stop_index)
+        return slot
+
+    def activate(self, train, target=None):
+        """ให้ขบวนเคลื่อนที่ใน update() โดยเบรกหยุดที่ target (index ใน path, None = ไม่มีจุดหยุด)"""
+        self.columns["active"][train.slot] = 1
+        self.columns["target"][train.slot] = -1.0 if target is None else target
+
+    def sync(self, train):
+        """คัดลอกหน้าต่างตัวรถไฟ (tail, head) ที่ Simulator เลื่อนแล้วเข้าคอลัมน์ (ใช้คำนวณระยะเบรก)"""
+        self.columns["head"][train.slot] = train.head
+        self.columns["tail"][train.slot] = train.tail
+
+    def deactivate(self, train):
+        """หยุดคำนวณขบวนนี้ (เช่น จอดที่ชานชาลา) แต่ยังเก็บช่องไว้"""
+        self.columns["active"][train.slot] = 0
+
+    def remove(self, train):
+        """คืนช่องของขบวนที่ออกจากระบบแล้ว (ค่าคงเหลืออยู่ในตัว Train)"""
+        slot = train.slot
+        values = {name: getattr(train, name) for name in ("progress", "speed", "braking")}
+        train.fleet = None
+        for name, value in values.items():
+            setattr(train, name, value)
+        self.columns["active"][slot] = 0
+        self.trains[slot] = None
+        self._free.append(slot)
+
+    def clear(self):
+        """ล้างทุกขบวน (เช่น ตอนหยุดฉุกเฉิน)"""
+        for train in self.trains[:self.size]:
+            if train is not None:
+                self.remove(train)
+
+    def dump(self):
+        """คัดลอกค่าทุกคอลัมน์ของช่อง [0, size) เป็นไบต์ (8 ไบต์ต่อค่า เรียงตาม FLOAT_COLUMNS + INT_COLUMNS)"""
+        return b"".join(memoryview(self.columns[name])[:self.size].tobytes()
+                        for name in self.FLOAT_COLUMNS + self.INT_COLUMNS)
+
+    def load(self, data, trains, free):
+        """
+        คืนค่าคอลัมน์จาก dump() เข้า fleet ที่ยังว่าง โดยขบวนอยู่ช่องเดิมและช่องว่างเรียงตามเดิม
+        (update() จึงคำนวณตามลำดับช่องเดิมทุกประการ)
+        - trains: ช่อง -> Train (None = ว่าง) ยาวเท่าจำนวนช่องที่เคยใช้
+        - free: ลำดับช่องว่างที่จะถูกใช้ซ้ำ
+        """
+        size = self.size = len(trains)
+        self._pick_backend()
+        capacity = self.capacity
+        while capacity < size:
+            capacity *= 2
+        if capacity > self.capacity:
+            self._grow(capacity)
+        chunk = size * 8
+        for i, name in enumerate(self.FLOAT_COLUMNS + self.INT_COLUMNS):
+            column = self.columns[name]
+            raw = data[i * chunk:(i + 1) * chunk]
+            if self.np is not None:
+                column[:size] = self.np.frombuffer(raw, dtype=column.dtype)
+            else:
+                values = array(column.typecode)
+                values.frombytes(raw)
+                column[:size] = values
+        self.trains[:size] = trains
+        self._free = list(free)
+        for slot, train in enumerate(trains):
+            if train is not None:
+                train.fleet, train.slot = self, slot
+
+    def occupied_ranges(self):
+        """ช่วงไทล์ที่ขบวนครอบครอง: (slots, tails, heads) ตัวขบวน = train.path.ids[tail:head]"""
+        slots = [slot for slot in range(self.size) if self.trains[slot] is not None]
+        tails, heads = self.columns["tail"], self.columns["head"]
+        return slots, [tails[s] for s in slots], [heads[s] for s in slots]
+
+    def update(self):
+        """
+        tick เดียวของทุกขบวนที่เคลื่อนที่: เร่งจนถึง max_speed, เบรกให้หยุดพอดี target
+        (v² = 2·a·ระยะที่เหลือ), บวกระยะสะสม แล้วคืนรายการ (ช่อง, จำนวนไทล์ที่ต้องเลื่อน)
+        ของขบวนที่สะสมครบ 1 ไทล์ขึ้นไป (หักจำนวนไทล์นั้นออกจาก progress แล้ว)
+        """
+        if self.np is not None:
+            return self._update_numpy()
+        c = self.columns
+        progress, speed, max_speed, accel = c["progress"], c["speed"], c["max_speed"], c["accel"]
+        target, braking, head, active = c["target"], c["braking"], c["head"], c["active"]
+        crossing = []
+        for i in range(self.size):
+            if not active[i]:
+                continue
+            a = accel[i]
+            if a > 0.0:
+                v = min(max_speed[i], speed[i] + a)
+                if target[i] >= 0.0:
+                    # ขบวนจอดเมื่อหัวเลย target จึงเหลือระยะ target + 1 - head - progress ไทล์
+                    remaining = max(0.0, target[i] + 1.0 - head[i] - progress[i])
+                    # ไม่ให้ช้ากว่า accel (คลานเข้าจุดหยุดได้เสมอ ไม่ค้างก่อนถึง)
+                    v = min(v, max(a, math.sqrt(2.0 * a * remaining)))
+                speed[i] = v
+                braking[i] = v * v / (2.0 * a)
+            p = progress[i] + speed[i]
+            if p >= 1.0:
+                steps = int(p)
+                crossing.append((i, steps))
+                p -= steps
+            progress[i] = p
+        return crossing
+
+    def _update_numpy(self):
+        np, c, n = self.np, self.columns, self.size
+        progress, speed, max_speed, accel = c["progress"][:n], c["speed"][:n], c["max_speed"][:n], c["accel"][:n]
+        target, braking, head = c["target"][:n], c["braking"][:n], c["head"][:n]
+        active = c["active"][:n].astype(bool)
+        driven = active & (accel > 0.0)
+        v = np.minimum(max_speed, speed + accel)
+        remaining = np.maximum(0.0, target + 1.0 - head - progress)
+        v = np.where(target >= 0.0, np.minimum(v, np.maximum(accel, np.sqrt(2.0 * accel * remaining))), v)
+        speed[driven] = v[driven]
+        braking[driven] = speed[driven] ** 2 / (2.0 * accel[driven])
+        progress[active] += speed[active]
+        slots = np.flatnonzero(active & (progress >= 1.0))
+        steps = np.floor(progress[slots])
+        progress[slots] -= steps
+        return list(zip(slots.tolist(), steps.astype(np.int64).tolist()))
+
+
+# คลาสสำหรับเก็บข้อมูลรถไฟ 1 ขบวน (แต่ละขบวนมีเส้นทาง ตำแหน่ง และความเร็วของตัวเอง)
+class Train:
+    
+    # ค่าการเคลื่อนที่ที่ย้ายไปเก็บใน FleetKinematics เมื่อขบวนเข้าสู่ Simulator
+    progress = FleetField()
+    speed = FleetField()
+    braking = FleetField()  # ระยะเบรกจนหยุดที่ความเร็วปัจจุบัน (ไทล์) คำนวณใน FleetKinematics.update()
+    
+    def __init__(self, train_id, path, length, platform, route, stop_index, speed=1.0, accel=None):
+        """
+        - train_id: ชื่อ/ID ของขบวน
+        - path: เส้นทาง (TrackPath) ที่ขบวนนี้จะวิ่ง
+        - length: ความยาวขบวน (จำนวนไทล์)
+        - platform: ชานชาลาที่ขบวนนี้ใช้
+        - route: เส้นทางที่ล็อกให้ขบวนนี้ (เช่น "P1_IN")
+        - stop_index: ตำแหน่งหยุดใน path (None = วิ่งผ่านไม่จอด)
+        - speed: ความเร็วสูงสุด (ไทล์ต่อ tick, 1.0 = 1 ไทล์ทุก 70ms)
+        - accel: อัตราเร่ง/หน่วง (ไทล์ต่อ tick ต่อ tick) None = เปลี่ยนความเร็วทันที
+        """
+        self.id = train_id
+        self.fleet = None  # FleetKinematics ที่เก็บค่าการเคลื่อนที่ (None = เก็บในตัวเอง)
+        self.slot = None  # ช่องของขบวนนี้ใน fleet
+        self.path = path
+        # ตัวรถไฟเก็บเป็นหน้าต่าง (window) path[tail:head] แทน list ของ Tile
+        # เลื่อนหัว/ตัดหางแค่บวก index จึงเป็น O(1) ไม่ขึ้นกับความยาวขบวน
+        self.tail = 0  # index ของไทล์หางรถไฟใน path
+        self.head = 0  # index ถัดจากไทล์หัวรถไฟ (จำนวนไทล์ที่หัวรถไฟวิ่งผ่านมาแล้ว)
+        self.length = length
+        self.platform = platform
+        self.route = route
+        self.stop_index = stop_index
+        self.max_speed = speed
+        self.speed = speed  # ความเร็วปัจจุบัน (ไทล์ต่อ tick)
+        self.accel = accel
+        self.braking = 0.0
+        self.progress = 0.0  # ระยะที่สะสมไว้ (ครบ 1.0 = เลื่อนได้ 1 ไทล์)
+        self.state = "running"  # running, in_station, leaving
+        self.blocked = False  # ถูกขบวนอื่นขวางอยู่หรือไม่
+        self.halt_index = None  # จุดหยุดฉุกเฉิน (index ใน path) ระหว่างหยุดฉุกเฉิน (None = ไม่ได้ถูกสั่งหยุด)
+
+    @property
+    def index(self):
+        """index ของไทล์ถัดไปที่หัวรถไฟจะเข้า (ชื่อเดิม train_index)"""
+        return self.head
+
+    @property
+    def positions(self):
+        """ไทล์ที่ตัวรถไฟครอบครอง (หาง -> หัว) เป็น view ที่ไม่คัดลอก list"""
+        return TrainBody(self.path, self.tail, self.head)
+
+
+# มุมมอง (view) แบบอ่านอย่างเดียวของตัวรถไฟ: path[tail:head] ใช้แทน list ของ Tile แบบเดิม
+class TrainBody(collections.abc.Sequence):
+    __slots__ = ("path", "tail", "head")
+
+    def __init__(self, path, tail, head):
+        self.path = path
+        self.tail = tail
+        self.head = head
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.path[self.tail + j] for j in range(*i.indices(self.head - self.tail))]
+        n = self.head - self.tail
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("train body index out of range")
+        return self.path[self.tail + i]
+
+# บันทึกการทำงาน 1 รายการแบบมีโครงสร้าง (แทนข้อความที่จัดรูปแบบไว้แล้ว)
+class LogRecord:
+    __slots__ = ("wall", "sim_time", "category", "message", "data")
+
+    def __init__(self, category, message, sim_time=None, data=None, wall=None):
+        self.wall = time.time() if wall is None else wall  # เวลาจริง (epoch วินาที)
+        self.sim_time = sim_time  # เวลาจำลอง (ms) หรือ None ถ้าไม่ได้มาจาก Simulator
+        self.category = category  # หมวด เช่น "SYS", "TRAIN", "ERROR"
+        self.message = message  # ข้อความ (ไม่มีป้ายหมวดนำหน้า)
+        self.data = data or {}  # ข้อมูลประกอบ เช่น train_id, platform
+
+    @property
+    def text(self):
+        """ข้อความรูปแบบเดิม เช่น "[SYS] Route set: ..." """
+        return f"[{self.category}] {self.message}" if self.category else self.message
+
+    def __str__(self):
+        return self.text
+
+    def to_dict(self):
+        """แปลงเป็น dict สำหรับเขียนเป็น JSON"""
+        return {"wall": self.wall, "sim_time": self.sim_time, "category": self.category,
+                "message": self.message, "data": self.data}
+
+
+# บัฟเฟอร์วงแหวนของ log: เก็บรายการล่าสุดไม่เกิน capacity และจำว่ารายการไหนยังไม่ได้แสดง
+class LogBuffer:
+
+    def __init__(self, capacity=1000):
+        self.records = collections.deque(maxlen=capacity)  # รายการล่าสุด (เก่าสุดถูกทิ้งอัตโนมัติ)
+        self._pending = collections.deque(maxlen=capacity)  # รายการที่ยังไม่ถูกดึงไปแสดง
+        self.dropped = 0  # จำนวนรายการที่ถูกทิ้งก่อนได้แสดง (มาเร็วกว่าที่ flush ทัน)
+
+    def append(self, record):
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self.records.append(record)
+        self._pending.append(record)
+
+    def drain(self):
+        """ดึงรายการที่ยังไม่แสดงออกมาทั้งหมด (เรียงจากเก่าไปใหม่)"""
+        records = list(self._pending)
+        self._pending.clear()
+        return records
+
+    def __len__(self):
+        return len(self.records)
+
+
+# เขียน log ลงไฟล์ JSONL (1 บรรทัดต่อ 1 รายการ) จาก thread เบื้องหลัง ไม่ให้ GUI ต้องรอดิสก์
+class JsonlFileSink:
+
+    def __init__(self, path, max_bytes=5_000_000, backups=3, flush_interval=1.0, queue_size=10000):
+        """
+        - path: ไฟล์ log (เมื่อเกิน max_bytes จะหมุนเป็น path.1, path.2, ... เก็บไว้ backups ไฟล์)
+        - flush_interval: เขียนบัฟเฟอร์ลงดิสก์อย่างน้อยทุกกี่วินาที
+        - queue_size: ถ้าคิวเต็ม (ดิสก์ช้า) จะทิ้งรายการแทนการบล็อก GUI
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.dropped = 0  # จำนวนรายการที่ถูกทิ้งเพราะคิวเต็ม
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = open(path, "a", encoding="utf-8", buffering=64 * 1024)
+        self._size = self._file.tell()
+        self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self._thread.start()
+
+    def emit(self, record):
+        """ส่งรายการเข้าคิว (ไม่บล็อก)"""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """เขียนรายการที่ค้างในคิวให้หมดแล้วปิดไฟล์"""
+        if self._thread.is_alive():
+            self._queue.put(None)  # สัญญาณให้ thread หยุด
+            self._thread.join()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                record = False  # ไม่มีรายการใหม่: แค่ flush
+            if record is None:
+                break
+            if record:
+                self._write(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self._file.flush()
+                last_flush = time.monotonic()
+        self._file.close()
+
+    def _write(self, line):
+        size = len(line.encode("utf-8"))
+        if self._size and self._size + size > self.max_bytes:
+            self._rotate()
+        self._file.write(line)
+        self._size += size
+
+    def _rotate(self):
+        """ปิดไฟล์ปัจจุบัน เลื่อน path.N -> path.N+1 (ไฟล์เก่าสุดถูกลบ) แล้วเปิดไฟล์ใหม่"""
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8", buffering=64 * 1024)
+        self._size = 0
+
+
+# บันทึกคำสั่งของผู้ควบคุมลงไฟล์ (ต่อท้ายอย่างเดียว) เพื่อนำไปเล่นซ้ำด้วย ParknamReplay.py
+# บรรทัดแรกเป็น header (JSON object) บรรทัดถัดไปเป็น [เวลาจำลอง, จำนวน tick, ชื่อคำสั่ง, อาร์กิวเมนต์...]
+class SessionRecorder:
+    
+    FORMAT = "parknam-session"
+    # เพิ่มทุกครั้งที่รูปแบบไฟล์เปลี่ยน หรือคำสั่งชุดเดิมให้ผลการจำลองต่างไปจากเดิม (ไฟล์รุ่นเก่าจะเล่นซ้ำไม่ตรง)
+    # 1: ใช้ตั้งแต่เริ่มบันทึกจนถึงการหยุดฉุกเฉินแบบเบรกหยุด ระหว่างนั้นนาฬิกาจำลอง การเคลื่อนที่ของขบวน
+    #    interlocking และการค้นเส้นทางเปลี่ยนไปโดยไม่ได้เพิ่มรุ่น ไฟล์รุ่น 1 จึงเล่นซ้ำกับ Simulator ปัจจุบันไม่ได้
+    # 2: หยุดฉุกเฉินแบบเบรกหยุด (รุ่น 1 ล้างรถไฟทุกขบวน)
+    VERSION = 2
+
+    def __init__(self, path, sim):
+        self.sim = sim
+        self._file = open(path, "w", encoding="utf-8")
+        header = {"format": self.FORMAT, "version": self.VERSION,
+                  "screen_width": sim.ts * sim.layout.width, "train_length": sim.train_length,
+                  "layout": sim.layout.path,
+                  "started": datetime.datetime.now().isoformat(timespec="seconds")}
+        self._write(header)
+
+    def record(self, name, args=()):
+        """บันทึกคำสั่ง 1 รายการ ณ เวลาจำลองปัจจุบัน (เรียกหลังเดินนาฬิกาถึงเวลานั้นแล้ว)"""
+        self._write([self.sim.now, self.sim.ticks, name, *args])
+
+    def close(self):
+        """บันทึกรายการ "end" พร้อมลายนิ้วมือของสถานะสุดท้าย แล้วปิดไฟล์"""
+        if not self._file.closed:
+            self.record("end", (self.sim.state_digest(),))
+            self._file.close()
+
+    def _write(self, item):
+        # flush ทุกบรรทัด: ถ้าโปรแกรมล่ม log ก็ยังครบถึงคำสั่งสุดท้าย
+        self._file.write(json.dumps(item, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+
+# ฮิสโตแกรมแบบช่อง (bucket) คงที่: บันทึกค่าได้ O(log จำนวนช่อง) ไม่เก็บค่าทุกค่าไว้
+# ใช้เก็บ latency (ms) และค่านับต่อเฟรม แล้วประมาณ percentile จากช่อง
+class Histogram:
+
+    LATENCY_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+    COUNTS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+    def __init__(self, bounds=LATENCY_MS):
+        self.bounds = bounds  # ขอบบนของแต่ละช่อง (ช่องสุดท้ายคือ > ขอบบนสุด)
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """ค่าประมาณ percentile ที่ q (0-1) = ขอบบนของช่องที่ค่าลำดับนั้นตกอยู่ (None ถ้ายังไม่มีค่า)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+# ตัวชี้วัดแบบสะสมทีละเหตุการณ์ของ TrainTimeline: ถามค่าได้ทันที (O(1) ต่อค่า) ไม่ต้องสแกนเหตุการณ์ย้อนหลัง
+# - headway: ระยะห่างระหว่างขบวนที่เข้ามา (ล่าสุด และค่าเฉลี่ยของ window ขบวนล่าสุด)
+# - dwell: เวลาจอด (จอดถึงจุดหยุด -> เริ่มออก) เก็บเป็นฮิสโตแกรม แล้วประมาณ percentile จากช่อง
+# - occupancy: สัดส่วนเวลาที่ชานชาลาไม่ว่าง (เวลาสะสม + ช่วงที่ยังไม่ว่างอยู่ตอนนี้)
+class TimelineStats:
+
+    DWELL_S = (5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 300, 600)
+
+    def __init__(self, started=0.0, window=20, dwell_bounds=DWELL_S):
+        """
+        - started: เวลาจำลองที่เริ่มนับ (ms) ใช้เป็นตัวหารของ occupancy
+        - window: จำนวน headway ล่าสุดที่ใช้หาค่าเฉลี่ยแบบเลื่อน
+        - dwell_bounds: ขอบบนของช่องฮิสโตแกรมเวลาจอด (วินาที)
+        """
+        self.counts = collections.Counter()  # ชนิดเหตุการณ์ -> จำนวน
+        self.last_arrival = None
+        self.headways = collections.deque(maxlen=window)  # ms
+        self._headway_sum = 0.0
+        self.dwell = Histogram(dwell_bounds)  # วินาที
+        self._stopped = {}  # ขบวน -> เวลาที่จอด (ms)
+        self.busy_ms = collections.Counter()  # ชานชาลา -> เวลาไม่ว่างสะสม (ช่วงที่จบแล้ว)
+        self.busy_since = {}  # ชานชาลา -> เวลาที่เริ่มไม่ว่าง (เฉพาะที่ยังไม่ว่างอยู่)
+        self.started = started
+        self.now = started  # เวลาของเหตุการณ์ล่าสุด
+
+    def observe(self, t, kind, train, platform):
+        """ปรับตัวชี้วัดด้วยเหตุการณ์ 1 รายการ (train = index ของขบวน หรือ -1)"""
+        self.now = t
+        self.counts[kind] += 1
+        if kind == "arrival":
+            if self.last_arrival is not None:
+                headways = self.headways
+                if len(headways) == headways.maxlen:
+                    self._headway_sum -= headways[0]
+                headways.append(t - self.last_arrival)
+                self._headway_sum += t - self.last_arrival
+            self.last_arrival = t
+        elif kind == "stop":
+            self._stopped[train] = t
+        elif kind == "depart":
+            since = self._stopped.pop(train, None)
+            if since is not None:
+                self.dwell.observe((t - since) / 1000)
+        elif kind == "clear":
+            self._stopped.pop(train, None)
+        elif kind == "occupied":
+            self.busy_since.setdefault(platform, t)
+        elif kind == "vacated":
+            since = self.busy_since.pop(platform, None)
+            if since is not None:
+                self.busy_ms[platform] += t - since
+
+    def headway(self):
+        """(headway ล่าสุด, ค่าเฉลี่ยของ window ล่าสุด) เป็น ms หรือ (None, None) ถ้ายังมีไม่ถึง 2 ขบวน"""
+        if not self.headways:
+            return None, None
+        return self.headways[-1], self._headway_sum / len(self.headways)
+
+    def dwell_quantile(self, q):
+        """เวลาจอด (วินาที) ที่ percentile q (0-1) หรือ None ถ้ายังไม่มีขบวนออก"""
+        return self.dwell.quantile(q)
+
+    def occupancy(self, platform, now=None):
+        """สัดส่วนเวลาที่ชานชาลาไม่ว่าง ตั้งแต่ started ถึงเวลา now (None = เหตุการณ์ล่าสุด)"""
+        now = self.now if now is None else now
+        if now <= self.started:
+            return 0.0
+        busy = self.busy_ms[platform]
+        since = self.busy_since.get(platform)
+        if since is not None:
+            busy += now - since
+        return busy / (now - self.started)
+
+    def snapshot(self, platforms, now=None):
+        """ตัวชี้วัดทั้งหมดเป็น dict (สำหรับ dashboard / metrics)"""
+        last, mean = self.headway()
+        report = {"events": sum(self.counts.values()), "trains": self.counts["arrival"],
+                  "headway_last_ms": last, "headway_mean_ms": mean, "dwell_count": self.dwell.count,
+                  "dwell_p50_s": self.dwell_quantile(0.5), "dwell_p95_s": self.dwell_quantile(0.95),
+                  "emergencies": self.counts["emergency"]}
+        for platform in platforms:
+            report[f"occupancy_p{platform}"] = self.occupancy(platform, now)
+        return report
+
+
+# เส้นเวลาของทุกขบวนแบบคอลัมน์ (ต่อท้ายอย่างเดียว): 1 แถวต่อ 1 เหตุการณ์ในวงจรชีวิตของขบวน
+# แต่ละคอลัมน์เป็น array ชนิดเดียว (เวลา, ชนิด, ขบวน, ชานชาลา, เส้นทาง) ชื่อขบวน/เส้นทางเก็บเป็น index ของตารางชื่อ
+# ครบ chunk_rows แถวแล้วเขียนเป็น chunk ลงไฟล์ (ไม่เก็บในหน่วยความจำต่อ) ถ้าไม่ระบุไฟล์จะเก็บทุก chunk ไว้ในหน่วยความจำ
+# รูปแบบไฟล์: header (magic, version, เวลาเริ่ม) แล้วตามด้วย chunk: จำนวนแถว, ความยาว JSON ของชื่อใหม่, JSON, แล้วคอลัมน์ทีละคอลัมน์
+# (ไบต์ตามลำดับของเครื่องเหมือน checkpoint)
+class TrainTimeline:
+
+    MAGIC = b"PNTIMELN"
+    VERSION = 1
+    HEADER = struct.Struct("=8sHd")
+    CHUNK = struct.Struct("=II")
+    # ชนิดเหตุการณ์ (ค่าในคอลัมน์ kind = ตำแหน่งใน tuple นี้)
+    KINDS = ("route_set", "arrival", "stop", "depart", "clear", "emergency", "recover", "occupied", "vacated")
+    KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+    COLUMNS = (("t", "d"), ("kind", "B"), ("train", "i"), ("platform", "h"), ("route", "h"))
+
+    def __init__(self, path=None, chunk_rows=65536, started=0.0):
+        """
+        - path: ไฟล์ที่เขียน chunk ต่อท้าย (None = เก็บในหน่วยความจำ)
+        - chunk_rows: จำนวนแถวต่อ 1 chunk
+        - started: เวลาจำลองที่เริ่มบันทึก (ms) เช่น sim.now ตอน attach
+        """
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.started = started
+        self.stats = TimelineStats(started)  # ตัวชี้วัดที่ปรับตามทุกเหตุการณ์
+        self.trains, self.routes = [], []  # ตารางชื่อ (index -> ชื่อ)
+        self._train_index, self._route_index = {}, {}
+        self._saved = (0, 0)  # จำนวนชื่อที่เขียนลงไฟล์แล้ว (trains, routes)
+        self.chunks = []  # chunk ที่เก็บในหน่วยความจำ (เฉพาะเมื่อไม่มีไฟล์)
+        self.rows = 0  # จำนวนแถวทั้งหมด
+        self._platforms = {}  # ขบวนที่อยู่ในสถานี -> ชานชาลา (เหตุการณ์ "cleared" มาหลังลบขบวนไปแล้ว)
+        self._new_chunk()
+        self._file = None
+        if path is not None:
+            self._file = open(path, "wb")
+            self._file.write(self.HEADER.pack(self.MAGIC, self.VERSION, started))
+
+    def _new_chunk(self):
+        self.columns = {name: array(code) for name, code in self.COLUMNS}
+
+    def attach(self, sim):
+        """รับเหตุการณ์จาก TrainSimulator (subscribe) แล้วบันทึกเป็นเหตุการณ์ตามชนิด"""
+        def on_event(event, data):
+            now = sim.now
+            if event == "state":
+                train, old, new = data["train_id"], data["old"], data["new"]
+                if train is None:
+                    if new == "emergency":
+                        self.append(now, "emergency")
+                    elif old == "emergency":
+                        self.append(now, "recover")
+                elif old is None:
+                    platform = self._platforms[train] = sim.trains[train].platform
+                    self.append(now, "arrival", train, platform, sim.trains[train].route)
+                elif new in ("in_station", "leaving"):
+                    spec = sim.trains[train]
+                    self.append(now, "stop" if new == "in_station" else "depart", train, spec.platform, spec.route)
+                elif new == "cleared":
+                    self.append(now, "clear", train, self._platforms.pop(train, 0))
+            elif event == "route" and data["locked"]:
+                route, platform = data["route"], data["platform"]
+                holder = sim.platform_trains.get(platform) if sim.interlocking.routes[route]["kind"] == "out" else None
+                self.append(now, "route_set", holder.id if holder else None, platform, route)
+            elif event == "platform":
+                self.append(now, "occupied" if data["occupied"] else "vacated", None, data["platform"])
+        sim.subscribe(on_event)
+        return on_event
+
+    def append(self, t, kind, train=None, platform=0, route=None):
+        """ต่อท้ายเหตุการณ์ 1 แถว (kind = ชื่อใน KINDS, train/route = ชื่อหรือ None)"""
+        columns = self.columns
+        train_index = -1 if train is None else self._intern(train, self.trains, self._train_index)
+        columns["t"].append(t)
+        columns["kind"].append(self.KIND_CODES[kind])
+        columns["train"].append(train_index)
+        columns["platform"].append(platform or 0)
+        columns["route"].append(-1 if route is None else self._intern(route, self.routes, self._route_index))
+        self.rows += 1
+        self.stats.observe(t, kind, train_index, platform)
+        if len(columns["t"]) >= self.chunk_rows:
+            self.flush()
+
+    @staticmethod
+    def _intern(name, names, index):
+        i = index.get(name)
+        if i is None:
+            i = index[name] = len(names)
+            names.append(name)
+        return i
+
+    def flush(self):
+        """ปิด chunk ปัจจุบัน: เขียนลงไฟล์ (หรือเก็บไว้ในหน่วยความจำ) แล้วเริ่ม chunk ใหม่"""
+        columns = self.columns
+        if not columns["t"]:
+            return
+        if self._file is None:
+            self.chunks.append(columns)
+        else:
+            trains, routes = self._saved
+            names = json.dumps({"trains": self.trains[trains:], "routes": self.routes[routes:]},
+                               ensure_ascii=False).encode("utf-8")
+            self._file.write(self.CHUNK.pack(len(columns["t"]), len(names)))
+            self._file.write(names)
+            for name, _ in self.COLUMNS:
+                columns[name].tofile(self._file)
+            self._file.flush()
+            self._saved = (len(self.trains), len(self.routes))
+        self._new_chunk()
+
+    def close(self):
+        """เขียน chunk ที่ค้างอยู่แล้วปิดไฟล์"""
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @classmethod
+    def load(cls, path):
+        """อ่านไฟล์ที่เขียนไว้ คืน TrainTimeline (เก็บในหน่วยความจำ) ที่มีทุก chunk และตัวชี้วัดที่คำนวณใหม่"""
+        with open(path, "rb") as f:
+            magic, version, started = cls.HEADER.unpack(f.read(cls.HEADER.size))
+            if magic != cls.MAGIC:
+                raise ValueError(f"{path}: not a train timeline")
+            if version != cls.VERSION:
+                raise ValueError(f"{path}: unsupported version {version}")
+            timeline = cls(started=started)
+            while True:
+                head = f.read(cls.CHUNK.size)
+                if len(head) < cls.CHUNK.size:
+                    break  # จบไฟล์ (หรือ chunk สุดท้ายเขียนไม่ครบตอนโปรแกรมล่ม)
+                rows, size = cls.CHUNK.unpack(head)
+                names = json.loads(f.read(size).decode("utf-8"))
+                columns = {name: array(code) for name, code in cls.COLUMNS}
+                try:
+                    for name, _ in cls.COLUMNS:
+                        columns[name].fromfile(f, rows)
+                except EOFError:
+                    break
+                for name in names["trains"]:
+                    cls._intern(name, timeline.trains, timeline._train_index)
+                for name in names["routes"]:
+                    cls._intern(name, timeline.routes, timeline._route_index)
+                timeline.chunks.append(columns)
+                timeline.rows += rows
+                observe, kinds = timeline.stats.observe, cls.KINDS
+                for t, kind, train, platform in zip(columns["t"], columns["kind"], columns["train"], columns["platform"]):
+                    observe(t, kinds[kind], train, platform)
+        return timeline
+
+    def __len__(self):
+        return self.rows
+
+    def __iter__(self):
+        """ทุกแถว (เวลา, ชนิด, ขบวน, ชานชาลา, เส้นทาง) เรียงตามเวลา เฉพาะที่อยู่ในหน่วยความจำ"""
+        kinds, trains, routes = self.KINDS, self.trains, self.routes
+        for columns in self.chunks + [self.columns]:
+            for t, kind, train, platform, route in zip(*(columns[name] for name, _ in self.COLUMNS)):
+                yield t, kinds[kind], trains[train] if train >= 0 else None, platform, routes[route] if route >= 0 else None
+
+
+# ตัวแทน (proxy) ของ tk.Canvas ที่นับจำนวนครั้งที่เรียกเมธอด (ใช้วัดจำนวนการเรียก canvas ต่อเฟรม)
+class CountingCanvas:
+
+    def __init__(self, canvas):
+        self._canvas = canvas
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._canvas, name)
+        if not callable(attr):
+            return attr
+
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return attr(*args, **kwargs)
+        setattr(self, name, counted)  # เก็บไว้ ครั้งต่อไปไม่ต้องผ่าน __getattr__
+        return counted
+
+
+# สถิติการทำงานบน thread ของ Tk: ฮิสโตแกรม latency ต่อ callback, tick jitter, event-loop lag ฯลฯ
+# ส่งออกเป็นข้อความแบบ Prometheus และเปิด/ปิด cProfile ได้ระหว่างโปรแกรมทำงาน
+class Instrumentation:
+
+    PREFIX = "parknam_"
+
+    def __init__(self):
+        # ชื่อ metric -> (ชนิด, คำอธิบาย, ตัวคูณตอนส่งออก, {label: Histogram หรือตัวเลข})
+        self.metrics = {}
+        self.profiler = None  # cProfile.Profile ขณะกำลังเก็บ profile
+
+    def histogram(self, name, doc, bounds=Histogram.LATENCY_MS, scale=0.001, label=""):
+        """
+        Histogram ของ metric name (สร้างใหม่ถ้ายังไม่มี)
+        - scale: ตัวคูณตอนส่งออก (ค่าเริ่มต้น ms -> วินาทีตามแบบ Prometheus)
+        - label: label ของ series เช่น 'callback="move_train"'
+        """
+        series = self.metrics.setdefault(name, ("histogram", doc, scale, {}))[3]
+        if label not in series:
+            series[label] = Histogram(bounds)
+        return series[label]
+
+    def inc(self, name, doc, amount=1, label=""):
+        """เพิ่มค่า counter"""
+        series = self.metrics.setdefault(name, ("counter", doc, 1, {}))[3]
+        series[label] = series.get(label, 0) + amount
+
+    def set(self, name, doc, value, label=""):
+        """ตั้งค่า gauge"""
+        self.metrics.setdefault(name, ("gauge", doc, 1, {}))[3][label] = value
+
+    def wrap(self, func, callback, sample=1):
+        """
+        ห่อฟังก์ชันให้จับเวลาลงฮิสโตแกรม callback_seconds{callback=...}
+        - sample: จับเวลา 1 ครั้งทุก sample ครั้ง (ใช้กับฟังก์ชันที่ถูกเรียกถี่มาก ให้ต้นทุนการวัดต่ำกว่าตัวฟังก์ชัน)
+        """
+        hist = self.histogram("callback_seconds", "Latency of callbacks on the Tk thread (some callbacks sampled).",
+                              label=f'callback="{callback}"')
+        observe, clock = hist.observe, time.perf_counter
+        calls = itertools.count(1)
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            if sample > 1 and next(calls) % sample:
+                return func(*args, **kwargs)
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe((clock() - start) * 1000)
+        return timed
+
+    def prometheus_text(self):
+        """ข้อความรูปแบบ Prometheus text exposition ของทุก metric"""
+        lines = []
+        for name, (kind, doc, scale, series) in self.metrics.items():
+            metric = self.PREFIX + name
+            lines.append(f"# HELP {metric} {doc}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for label, value in series.items():
+                if kind != "histogram":
+                    lines.append(f"{metric}{{{label}}} {value}" if label else f"{metric} {value}")
+                    continue
+                sep = "," if label else ""
+                cumulative = 0
+                for bound, n in zip(value.bounds, value.counts):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{{{label}{sep}le="{bound * scale:g}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{{label}{sep}le="+Inf"}} {value.count}')
+                suffix = f"{{{label}}}" if label else ""
+                lines.append(f"{metric}_sum{suffix} {value.sum * scale:g}")
+                lines.append(f"{metric}_count{suffix} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """เขียน prometheus_text() ลงไฟล์แบบ atomic (ผู้อ่านไม่เห็นไฟล์ที่เขียนไม่ครบ)"""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def start_profile(self):
+        """เริ่มเก็บ cProfile (ถ้ายังไม่ได้เริ่ม)"""
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop_profile(self, path):
+        """หยุดเก็บ cProfile แล้วเขียนผลลงไฟล์ (อ่านด้วย pstats หรือ snakeviz) คืนค่า path หรือ None"""
+        if self.profiler is None:
+            return None
+        self.profiler.disable()
+        self.profiler.dump_stats(path)
+        self.profiler = None
+        return path
+
+
+# คลาสหลักที่จัดการตรรกะการจำลองทั้งหมด (State, Train, Paths)
+class TrainSimulator:
+    
+    TICK_MS = 70  # ระยะเวลาต่อ 1 tick (ms) ของ tick loop (ความเร็ว 1.0 = 1 ไทล์ต่อ tick)
+    EMERGENCY_RESET_MS = 2000  # เวลาตั้งแต่หยุดฉุกเฉินจนขบวนเริ่มวิ่งต่อ (เวลาจำลอง)
+
+    # รูปแบบไบนารีของ checkpoint() (ไบต์ตามลำดับของเครื่อง ใช้กับเครื่องที่ byteorder เดียวกัน)
+    CHECKPOINT_MAGIC = b"PNSNAPSH"
+    CHECKPOINT_VERSION = 3
+    # header: magic, version, byteorder (0 = little), flag (ticking/emergency/use_top_station),
+    # now, last_tick_time, ticks, event_seq, train_id_counter, station_stop_index, last_platform,
+    # current_train (ลำดับขบวน, -1 = ไม่มี), จำนวนไทล์ของเลย์เอาต์ แล้วตามด้วยจำนวนสมาชิกของแต่ละส่วน
+    CHECKPOINT_HEADER = struct.Struct("=8sHBBddqqqqqiq13I")
+    # ชื่อเส้นทาง ("route:", "segment:" หรือ "graph:" + segment ที่ค้นจากกราฟ -1 = เก็บ tile id ไว้ต่อท้าย), จำนวน tile id
+    CHECKPOINT_PATH = struct.Struct("=iI")
+    # ขบวน: id, เส้นทาง, ช่องใน fleet, tail, head, length, platform, route (-1 = None),
+    # stop_index (-1 = None), halt_index (-1 = None), max_speed, accel (0 = None), state, blocked
+    CHECKPOINT_TRAIN = struct.Struct("=IIiqqqqiqqddIB")
+    
+    # ฟังก์ชันเริ่มต้น (Constructor) ของคลาส
+    def __init__(self, canvas=None, screen_width=1250, screen_height=800, logger_callback=None, layout=None):
+        """
+        ตั้งค่าเริ่มต้นทั้งหมดสำหรับ Simulator
+        - canvas: พื้นที่วาดรูปของ tkinter (ใส่ None เพื่อรันแบบ Headless ไม่ต้องมีหน้าจอ)
+        - screen_width, screen_height: ขนาดหน้าจอ
+        - logger_callback: ฟังก์ชันที่รับ LogRecord (บันทึกแบบมีโครงสร้าง) ไปแสดงใน Log ของ GUI
+        - layout: ไฟล์เลย์เอาต์สถานี หรือ StationLayout ที่โหลดไว้แล้ว (None = สถานีปากน้ำ layouts/parknam.json)
+        """
+        
+        self.canvas = canvas
+        # --- เลย์เอาต์ของสถานี (อ่านจากไฟล์ หรือจาก cache ที่ compile ไว้แล้ว) ---
+        if not isinstance(layout, StationLayout):
+            layout = StationLayout.load(layout, screen_width)
+        self.layout = layout
+        # 'ts' (Tile Size) คำนวณขนาดของไทล์แต่ละช่อง เทียบกับความกว้างหน้าจอ
+        self.ts = layout.ts
+        self.train_length = layout.train_length  # ความยาวของรถไฟ (จำนวนไทล์)
+        self.logger_callback = logger_callback  # ฟังก์ชันรับ LogRecord (None = ไม่บันทึก)
+        
+        # --- นาฬิกาจำลอง (Simulated Clock) ---
+        # Simulator ไม่พึ่ง canvas.after() อีกต่อไป แต่มีคิวเหตุการณ์และเวลาของตัวเอง
+        # ผู้ใช้เป็นคนเดินเวลาเองผ่าน step() / run_until(t)
+        self.now = 0.0  # เวลาจำลองปัจจุบัน (ms)
+        self._events = []  # คิวเหตุการณ์ (heap ของ [เวลาที่ถึงกำหนด, ลำดับ, ฟังก์ชัน])
+        self._event_seq = 0  # ตัวนับลำดับ (ให้เหตุการณ์ที่เวลาเท่ากันทำงานตามลำดับที่สั่ง)
+        self.ticks = 0  # จำนวน tick ที่ tick loop ทำไปแล้ว (ใช้ตรวจว่า replay เดินตรงกับต้นฉบับ)
+        self.last_tick_time = 0.0  # เวลาจำลองของ tick ล่าสุด (Renderer ใช้ประมาณตำแหน่งระหว่าง tick)
+        
+        # --- เส้นทางต่างๆ (TrackPath = ลำดับ tile id ใน self.geometry) ---
+        # ไทล์ที่อยู่ช่องเดียวกัน (เช่น จุดประแจที่ทางแยก) มี tile id เดียวกัน
+        # เพื่อให้ดัชนีการครอบครอง (occupancy) ตรวจการชนที่ทางแยกได้
+        # segment และเส้นทางเต็มของเลย์เอาต์เข้าถึงได้เป็น self.path_<ชื่อ> (เช่น path_main, path_top_outbound)
+        self.geometry = layout.geometry
+        for name, path in layout.segments.items():
+            setattr(self, f"path_{name}", path)
+        # เส้นทางเต็ม (เข้า-จอด-ออก): ตัวรถไฟเป็น window ใน path เดียว
+        # จึงต้องใช้ path ที่มีทั้งส่วนที่จอดอยู่และทางออก (ลงทะเบียนไว้ใช้หาตำแหน่งของไทล์ในเส้นทาง)
+        for name, path in layout.routes.items():
+            setattr(self, f"path_{name}", self.geometry.add_route(name, path))
+        
+        
+        # --- ตัวแปรสถานะ (State) ของ Simulator ---
+        self.trains = {}  # รถไฟทุกขบวนที่อยู่ในแผนที่ (train_id -> Train)
+        self.moving = {}  # เฉพาะขบวนที่กำลังเคลื่อนที่ (train_id -> Train) ใช้ใน tick loop
+        self.fleet = FleetKinematics()  # ค่าการเคลื่อนที่ของทุกขบวนแบบคอลัมน์ (คำนวณทีเดียวทุกขบวนต่อ tick)
+        self.occupancy = {}  # ดัชนีการครอบครองไทล์ (tile id -> Train) ตรวจการชนได้ใน O(1)
+        self.current_train = None  # ขบวนล่าสุดที่มีการเปลี่ยนแปลง (ใช้แสดงผลใน GUI)
+        self.route_trains = {}  # เส้นทางที่ล็อกอยู่ -> ขบวนที่ใช้เส้นทางนั้น (ไม่มี key = ยังไม่มีขบวนเข้าเส้นทาง)
+        self.platform_trains = dict.fromkeys(layout.platforms)  # ขบวนที่จอดหรือกำลังเข้าแต่ละชานชาลา
+        self._ticking = False  # tick loop กำลังทำงานอยู่หรือไม่
+        self.train_rects = [] 
+        
+        self.emergency_active = False  # อยู่ในสถานะหยุดฉุกเฉินหรือไม่
+        self.use_top_station = True  # เก็บว่าเส้นทางที่ตั้งไว้ใช้ชานชาลาบนหรือไม่
+        self.last_platform = 0  # เก็บหมายเลขชานชาลาล่าสุดที่ใช้งาน
+        
+        self.platform_occupied = dict.fromkeys(layout.platforms, False) # สถานะว่าชานชาลาว่างหรือไม่
+        # ตาราง interlocking (compile จากผังในไฟล์เลย์เอาต์) เส้นทางที่ไม่ขัดแย้งกันล็อกพร้อมกันได้
+        self.interlocking = Interlocking.from_tables(layout.interlocking)
+        routes = self.interlocking.routes
+        self.inbound_routes = {spec["platform"]: name for name, spec in routes.items() if spec["kind"] == "in"}
+        self.outbound_routes = {spec["platform"]: name for name, spec in routes.items() if spec["kind"] == "out"}
+        # กราฟราง: ค้นเส้นทางเข้า-ออกของชานชาลา (cache ไว้) และรู้ว่า segment ไหนถูกปิด / ประแจไหนเสีย
+        self.tracks = TrackGraph(layout)
+        
+        self.station_stop_index = 0 # ตำแหน่ง (index) ใน path ที่รถไฟต้องหยุด (คำนวณใน set_route_in)
+        
+        
+        self.train_id_counter = 100  # ตัวนับ ID รถไฟ
+        
+        # --- ผู้รับเหตุการณ์ (Subscribers) ---
+        # ฟังก์ชันที่จะถูกเรียกเมื่อสถานะเปลี่ยน: callback(event, data)
+        # event: "state", "route", "platform", "train", "exit" (ขบวนวิ่งพ้นแผนที่ ส่งต่อสถานีถัดไปได้)
+        self._subscribers = []
+        
+        self.log("SIM", "Simulator initialized.")
+
+        # --- Renderer (ไม่บังคับ) ---
+        # ถ้าส่ง canvas มา จะสร้าง CanvasRenderer ผูกไว้ให้อัตโนมัติ (เหมือนพฤติกรรมเดิม)
+        self.renderer = None
+        if canvas is not None:
+            self.attach_renderer(CanvasRenderer(canvas, self))
+
+    # --- API ของนาฬิกาจำลอง ---
+
+    def after(self, delay_ms, callback):
+        """ตั้งเวลาให้ callback ทำงานในอีก delay_ms (เวลาจำลอง) แทน canvas.after()"""
+        self._event_seq += 1
+        heapq.heappush(self._events, [self.now + delay_ms, self._event_seq, callback])
+
+    def step(self):
+        """
+        เดินเวลาไปยังเหตุการณ์ถัดไปในคิว แล้วทำงานเหตุการณ์นั้น 1 ครั้ง
+        คืนค่า False ถ้าไม่มีเหตุการณ์เหลือในคิว
+        """
+        if not self._events:
+            return False
+        due, _, callback = heapq.heappop(self._events)
+        if due > self.now:
+            self.now = due
+        callback()
+        return True
+
+    def run_until(self, t):
+        """ทำงานทุกเหตุการณ์ที่ถึงกำหนดภายในเวลา t (ms) แล้วตั้งนาฬิกาเป็น t"""
+        events = self._events
+        while events and events[0][0] <= t:
+            self.step()
+        if t > self.now:
+            self.now = float(t)  # นาฬิกาเป็น float เสมอ (checkpoint เก็บเวลาเป็น double)
+
+    def next_event_time(self):
+        """เวลาจำลอง (ms) ของเหตุการณ์ถัดไปในคิว หรือ None ถ้าคิวว่าง"""
+        return self._events[0][0] if self._events else None
+
+    def pending_events(self):
+        """จำนวนเหตุการณ์ที่ยังรออยู่ในคิว"""
+        return len(self._events)
+
+    def state_digest(self):
+        """ลายนิ้วมือ (hash สั้นๆ) ของสถานะการจำลองทั้งหมด ใช้เทียบว่า replay ได้ผลตรงกับต้นฉบับ"""
+        trains = [(t.id, t.state, t.platform, t.route, t.tail, t.head, t.progress)
+                  for t in self.trains.values()]
+        key = (self.now, self.ticks, self.route_locked, self.emergency_active,
+               sorted(self.platform_occupied.items()), trains, len(self.occupancy))
+        return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+
+    # --- จุดบันทึกสถานะ (Checkpoint) ---
+
+    def checkpoint(self, drop_foreign=False):
+        """
+        บันทึกสถานะการจำลองทั้งหมดเป็น bytes (ใช้ restore() กลับมาเดินต่อได้ตรงกับต้นฉบับทุก tick)
+        เส้นทางของขบวนเก็บเป็นชื่อเส้นทางในเลย์เอาต์ + index (tail, head) ไม่เก็บ Tile
+        คอลัมน์ของ fleet คัดลอกเป็นไบต์ทั้งก้อน และเหตุการณ์ในคิวเก็บเป็นชื่อเมธอดของ Simulator
+        - drop_foreign: เหตุการณ์ที่ตั้งโดยโค้ดภายนอก (เช่น lambda ของ ParknamBatch) บันทึกไม่ได้
+          False = แจ้ง ValueError, True = ข้ามไป (ต้องตั้งใหม่เองหลัง restore)
+        """
+        strings = {}
+        intern = lambda text: strings.setdefault(text, len(strings))
+        parts = []
+
+        # 0. segment ที่ปิดอยู่ และประแจที่เสีย
+        tracks = self.tracks
+        parts.append(array("I", [intern(name) for name in sorted(tracks.closed)] +
+                                [intern(name) for name in sorted(tracks.failed)]).tobytes())
+
+        # 1. เส้นทาง (ที่ขบวนใช้อยู่): อ้างชื่อในเลย์เอาต์ หรือ segment ของเส้นทางที่ค้นจากกราฟ
+        # ถ้าเป็นเส้นทางที่สร้างเองเก็บ tile id ไว้ด้วย
+        names = {id(route.path): "graph:" + ",".join(route.segments) for route in tracks.cache.values() if route is not None}
+        names.update((id(path), "route:" + name) for name, path in self.layout.routes.items())
+        names.update((id(path), "segment:" + name) for name, path in self.layout.segments.items())
+        paths = {}
+        for train in self.trains.values():
+            path = train.path
+            if id(path) in paths:
+                continue
+            paths[id(path)] = len(paths)
+            name = names.get(id(path))
+            if name is not None:
+                parts.append(self.CHECKPOINT_PATH.pack(intern(name), 0))
+            else:
+                parts.append(self.CHECKPOINT_PATH.pack(-1, len(path.ids)))
+                parts.append(array("q", path.ids).tobytes())
+
+        # 2. ขบวน (เรียงตาม self.trains) และคอลัมน์ของ fleet ทั้งก้อน
+        order = {}
+        pack = self.CHECKPOINT_TRAIN.pack
+        for train in self.trains.values():
+            order[train] = len(order)
+            parts.append(pack(intern(train.id), paths[id(train.path)], train.slot, train.tail, train.head,
+                              train.length, train.platform, -1 if train.route is None else intern(train.route),
+                              -1 if train.stop_index is None else train.stop_index,
+                              -1 if train.halt_index is None else train.halt_index, train.max_speed, train.accel or 0.0, intern(train.state), train.blocked))
+        fleet = self.fleet
+        parts.append(fleet.dump())
+        parts.append(array("q", fleet._free).tobytes())
+
+        # 3. ขบวนที่กำลังเคลื่อนที่, เส้นทางที่ขบวนใช้, ชานชาลา และดัชนีการครอบครอง
+        parts.append(array("I", [order[train] for train in self.moving.values()]).tobytes())
+        route_trains = array("I")
+        for route, train in self.route_trains.items():
+            route_trains.extend((intern(route), order[train]))
+        parts.append(route_trains.tobytes())
+        platforms = self.layout.platforms
+        parts.append(array("i", [-1 if self.platform_trains[p] is None else order[self.platform_trains[p]]
+                                 for p in platforms]).tobytes())
+        parts.append(bytes(bool(self.platform_occupied[p]) for p in platforms))
+        parts.append(array("q", self.occupancy).tobytes())
+        parts.append(array("I", map(order.__getitem__, self.occupancy.values())).tobytes())
+        locked = self.interlocking.locked
+        locked = locked.to_bytes((locked.bit_length() + 7) // 8, "little")
+        parts.append(locked)
+
+        # 4. คิวเหตุการณ์ (เก็บลำดับใน heap เดิม pop ได้ลำดับเดิมทุกประการ)
+        events = []
+        ticking = False
+        for due, seq, callback in self._events:
+            name = self._event_name(callback)
+            if name is None:
+                if drop_foreign:
+                    continue
+                raise ValueError(f"cannot checkpoint event {callback!r}: not a simulator method")
+            ticking |= name == "_move_train"
+            events.append((due, seq, intern(name)))
+        if len(events) != len(self._events):
+            heapq.heapify(events)
+        parts.append(array("d", [event[0] for event in events]).tobytes())
+        parts.append(array("q", [event[1] for event in events]).tobytes())
+        parts.append(array("I", [event[2] for event in events]).tobytes())
+
+        text = "\0".join(strings).encode("utf-8")
+        # ถ้า tick ถูกข้ามไป (drop_foreign) ต้องบันทึกว่าไม่ได้ tick อยู่ ไม่งั้น restore แล้ว _start_ticking() จะไม่ตั้ง tick ใหม่
+        flags = (self._ticking and ticking) | self.emergency_active << 1 | self.use_top_station << 2
+        header = self.CHECKPOINT_HEADER.pack(
+            self.CHECKPOINT_MAGIC, self.CHECKPOINT_VERSION, sys.byteorder != "little", flags,
+            self.now, self.last_tick_time, self.ticks, self._event_seq, self.train_id_counter,
+            self.station_stop_index, self.last_platform,
+            order[self.current_train] if self.current_train is not None else -1, len(self.geometry.xs),
+            len(text), len(paths), len(order), len(self.moving), len(self.route_trains), len(platforms),
+            len(self.occupancy), len(locked), len(events), fleet.size, len(fleet._free), len(tracks.closed), len(tracks.failed))
+        return b"".join([header, text] + parts)
+
+    def _event_name(self, callback):
+        """ชื่อเมธอดของ Simulator ที่เหตุการณ์จะเรียก (รวมเมธอดที่ถูกห่อด้วย functools.wraps กี่ชั้นก็ได้) หรือ None"""
+        func = callback
+        while hasattr(func, "__wrapped__"):
+            func = func.__wrapped__
+        if getattr(func, "__self__", None) is self:
+            return func.__name__
+        return None
+
+    def restore(self, data):
+        """
+        แทนที่สถานะทั้งหมดด้วย checkpoint() (ต้องเป็นเลย์เอาต์เดียวกัน) แล้วเดินต่อจากจุดนั้นได้ทันที
+        ผู้รับเหตุการณ์, Renderer และ logger ยังผูกอยู่เหมือนเดิม (Renderer วาดรถไฟใหม่ทั้งหมด)
+        """
+        view = memoryview(data)
+        header = self.CHECKPOINT_HEADER
+        if len(view) < header.size:
+            raise ValueError("not a simulator checkpoint")
+        (magic, version, big_endian, flags, now, last_tick_time, ticks, event_seq, train_id_counter,
+         station_stop_index, last_platform, current, tiles, n_text, n_paths, n_trains, n_moving,
+         n_route_trains, n_platforms, n_occupancy, n_locked, n_events, fleet_size, n_free,
+         n_closed, n_failed) = header.unpack_from(view)
+        if magic != self.CHECKPOINT_MAGIC:
+            raise ValueError("not a simulator checkpoint")
+        if version != self.CHECKPOINT_VERSION:
+            raise ValueError(f"unsupported checkpoint version {version}")
+        if big_endian != (sys.byteorder != "little"):
+            raise ValueError("checkpoint was written on a machine with a different byte order")
+        if tiles != len(self.geometry.xs) or n_platforms != len(self.layout.platforms):
+            raise ValueError(f"checkpoint does not match layout {self.layout.name!r}")
+
+        pos = header.size
+
+        def take(typecode, count):
+            nonlocal pos
+            values = array(typecode)
+            end = pos + count * values.itemsize
+            if end > len(view):
+                raise ValueError("checkpoint is truncated or corrupt")
+            values.frombytes(view[pos:end])
+            pos = end
+            return values
+
+        strings = bytes(view[pos:pos + n_text]).decode("utf-8").split("\0")
+        pos += n_text
+
+        # 0. กราฟรางใหม่ที่ปิดทาง / ประแจเสียตรงกับตอนบันทึก
+        tracks = self.tracks.blank()
+        closures = take("I", n_closed + n_failed)
+        try:
+            for i, name in enumerate(closures):
+                (tracks.close_segment if i < n_closed else tracks.fail_switch)(strings[name])
+        except KeyError as e:
+            raise ValueError(f"checkpoint does not match layout {self.layout.name!r}: {e}") from None
+
+        # 1. เส้นทาง
+        paths = []
+        for _ in range(n_paths):
+            name, count = self.CHECKPOINT_PATH.unpack_from(view, pos)
+            pos += self.CHECKPOINT_PATH.size
+            if name < 0:
+                paths.append(TrackPath(self.geometry, array("l", take("q", count))))
+                continue
+            kind, _, key = strings[name].partition(":")
+            if kind == "graph":
+                segments = key.split(",")
+                path = tracks.through(segments).path if all(seg in tracks.lengths for seg in segments) else None
+            else:
+                path = (self.layout.routes if kind == "route" else self.layout.segments).get(key)
+            if path is None:
+                raise ValueError(f"checkpoint does not match layout {self.layout.name!r}: no {strings[name]}")
+            paths.append(path)
+
+        # 2. ขบวน และคอลัมน์ของ fleet (ขบวนกลับเข้าช่องเดิม)
+        trains = []
+        slots = [None] * fleet_size
+        unpack = self.CHECKPOINT_TRAIN.unpack_from
+        for _ in range(n_trains):
+            (train_id, path, slot, tail, head, length, platform, route, stop_index, halt_index,
+             max_speed, accel, state, blocked) = unpack(view, pos)
+            pos += self.CHECKPOINT_TRAIN.size
+            train = Train(strings[train_id], paths[path], length, platform,
+                          None if route < 0 else strings[route], None if stop_index < 0 else stop_index,
+                          max_speed, accel or None)
+            train.tail, train.head = tail, head
+            train.state, train.blocked = strings[state], bool(blocked)
+            train.halt_index = None if halt_index < 0 else halt_index
+            trains.append(train)
+            slots[slot] = train
+        columns = view[pos:pos + len(FleetKinematics.FLOAT_COLUMNS + FleetKinematics.INT_COLUMNS) * fleet_size * 8]
+        pos += len(columns)
+        fleet = FleetKinematics(use_numpy=self.fleet.use_numpy)
+        fleet.load(columns, slots, take("q", n_free))
+
+        # 3. ขบวนที่กำลังเคลื่อนที่, เส้นทางที่ขบวนใช้, ชานชาลา และดัชนีการครอบครอง
+        moving = take("I", n_moving)
+        route_trains = take("I", 2 * n_route_trains)
+        platform_trains = take("i", n_platforms)
+        platform_occupied = bytes(view[pos:pos + n_platforms])
+        pos += n_platforms
+        occupancy = dict(zip(take("q", n_occupancy), map(trains.__getitem__, take("I", n_occupancy))))
+        locked = int.from_bytes(view[pos:pos + n_locked], "little")
+        pos += n_locked
+
+        # 4. คิวเหตุการณ์ (ผูกกับเมธอดของ Simulator ตัวนี้ รวมตัวที่ห่อไว้ เช่น timed_tick ของ TrainApp)
+        dues, seqs, names = take("d", n_events), take("q", n_events), take("I", n_events)
+        events = []
+        for due, seq, name in zip(dues, seqs, names):
+            callback = getattr(self, strings[name], None)
+            if not callable(callback):
+                raise ValueError(f"checkpoint event {strings[name]!r} is not a simulator method")
+            events.append([due, seq, callback])
+        if pos != len(view):
+            raise ValueError("checkpoint is truncated or corrupt")
+
+        # แทนที่สถานะทั้งหมดหลังอ่านครบแล้ว (checkpoint เสียจะไม่ทำให้สถานะเดิมพังครึ่งๆ กลางๆ)
+        old_state = self.state
+        self.tracks = tracks
+        self.fleet = fleet
+        self.trains = {train.id: train for train in trains}
+        self.moving = {trains[i].id: trains[i] for i in moving}
+        self.route_trains = {strings[route_trains[i]]: trains[route_trains[i + 1]] for i in range(0, len(route_trains), 2)}
+        self.platform_trains = {p: None if i < 0 else trains[i] for p, i in zip(self.layout.platforms, platform_trains)}
+        self.platform_occupied = {p: bool(flag) for p, flag in zip(self.layout.platforms, platform_occupied)}
+        self.occupancy = occupancy
+        self.interlocking.locked = locked
+        self.current_train = None if current < 0 else trains[current]
+        self._events = events
+        self.now, self.last_tick_time, self.ticks, self._event_seq = now, last_tick_time, ticks, event_seq
+        self.train_id_counter, self.station_stop_index, self.last_platform = train_id_counter, station_stop_index, last_platform
+        self._ticking, self.emergency_active, self.use_top_station = bool(flags & 1), bool(flags & 2), bool(flags & 4)
+        self._start_ticking()  # tick ที่ถูกข้ามตอน checkpoint(drop_foreign=True): ตั้งใหม่ถ้ายังมีขบวนวิ่งอยู่
+
+        if self.renderer:
+            self.renderer.clear_train()
+            for platform in self.platform_trains:
+                self.renderer.reset_platform_track(platform)
+            self.draw_train()
+        self.log("SIM", f"Restored checkpoint at {now / 1000:.3f}s ({len(trains)} trains).", trains=len(trains))
+        self._emit("state", train_id=None, old=old_state, new=self.state)
+    # --- เหตุการณ์การเปลี่ยนสถานะ (Publish / Subscribe) ---
+
+    def subscribe(self, callback):
+        """ลงทะเบียนรับเหตุการณ์ callback(event, data) เมื่อสถานะของ Simulator เปลี่ยน"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """ยกเลิกการรับเหตุการณ์"""
+        self._subscribers.remove(callback)
+
+    def _emit(self, event, **data):
+        """ส่งเหตุการณ์ให้ผู้รับทุกราย"""
+        for callback in self._subscribers:
+            callback(event, data)
+
+    def log(self, category, message, **data):
+        """ส่งบันทึกแบบมีโครงสร้าง (LogRecord) ให้ logger_callback พร้อมเวลาจำลอง"""
+        if self.logger_callback is not None:
+            self.logger_callback(LogRecord(category, message, self.now, data))
+
+    def _set_train_state(self, train, state):
+        """เปลี่ยน state ของรถไฟ 1 ขบวน และแจ้งเหตุการณ์ "state" (เฉพาะเมื่อค่าเปลี่ยนจริง)"""
+        if state != train.state:
+            old, train.state = train.state, state
+            self._emit("state", train_id=train.id, old=old, new=state)
+
+    def _lock_route(self, route):
+        """ล็อกเส้นทางใน interlocking และแจ้งเหตุการณ์ "route" คืนค่า False ถ้าขัดแย้งกับเส้นทางที่ล็อกอยู่"""
+        if not self.interlocking.lock(route):
+            return False
+        self._emit("route", route=route, locked=True, platform=self.interlocking.routes[route]["platform"])
+        return True
+
+    def _release_route(self, route):
+        """ปลดล็อกเส้นทาง (ถ้าล็อกอยู่) และแจ้งเหตุการณ์ "route" """
+        self.route_trains.pop(route, None)
+        if self.interlocking.release(route):
+            self._emit("route", route=route, locked=False, platform=self.interlocking.routes[route]["platform"])
+
+    def _set_platform(self, platform, occupied):
+        """เปลี่ยนสถานะชานชาลา และแจ้งเหตุการณ์ "platform" (เฉพาะเมื่อค่าเปลี่ยนจริง)"""
+        if self.platform_occupied[platform] != occupied:
+            self.platform_occupied[platform] = occupied
+            self._emit("platform", platform=platform, occupied=occupied)
+
+    def _set_current_train(self, train):
+        """เปลี่ยนรถไฟขบวนปัจจุบัน (ที่ GUI แสดง) และแจ้งเหตุการณ์ "train" """
+        if train is not self.current_train:
+            self.current_train = train
+            self._emit("train", train_id=train.id if train else None)
+
+    # --- สถานะรวมของสถานี (เข้ากันได้กับโค้ดเดิมที่มีรถไฟขบวนเดียว) ---
+
+    @property
+    def state(self):
+        """สถานะรวม: emergency, หรือสถานะของขบวนปัจจุบัน, หรือ ready ถ้าไม่มีรถไฟ"""
+        if self.emergency_active:
+            return "emergency"
+        return self.current_train.state if self.current_train else "ready"
+
+    @property
+    def current_train_id(self):
+        """ID ของรถไฟขบวนปัจจุบัน"""
+        return self.current_train.id if self.current_train else None
+
+    @property
+    def train_path(self):
+        """เส้นทางของรถไฟขบวนปัจจุบัน"""
+        return self.current_train.path if self.current_train else []
+
+    @property
+    def train_index(self):
+        """ตำแหน่ง (index) หัวรถไฟขบวนปัจจุบันใน train_path"""
+        return self.current_train.index if self.current_train else 0
+
+    @property
+    def train_positions(self):
+        """รายการพิกัด (Tile) ที่รถไฟขบวนปัจจุบันครอบครอง"""
+        return self.current_train.positions if self.current_train else []
+
+    def signal_states(self):
+        """สีไฟสัญญาณทุกดวง (ชื่อ -> "green"/"red"): เขียวเมื่อมีเส้นทางที่ใช้สัญญาณนั้นล็อกอยู่ (ฉุกเฉิน = แดงทุกดวง)"""
+        if self.emergency_active:
+            return dict.fromkeys(self.layout.signals, "red")
+        clear = self.interlocking.signal_clear
+        return {name: "green" if clear(name) else "red" for name in self.layout.signals}
+
+    def platform_train(self, platform):
+        """ขบวนที่จอดอยู่ (หรือกำลังเข้า) ชานชาลาที่ระบุ หรือ None"""
+        return self.platform_trains.get(platform)
+
+    @property
+    def route_locked(self):
+        """เส้นทางที่ล็อกอยู่เป็นข้อความ (เช่น "P1_IN", "P1_IN+P2_OUT", "EMERGENCY") หรือ None"""
+        if self.emergency_active:
+            return "EMERGENCY"
+        return "+".join(self.interlocking.locked_routes()) or None
+
+    def route_available(self, route):
+        """ตั้งเส้นทางนี้ได้ตอนนี้หรือไม่ (ไม่ฉุกเฉิน ไม่ขัดแย้งกับเส้นทางที่ล็อกอยู่ และรางไม่ถูกปิด)"""
+        if self.emergency_active or not self.interlocking.available(route):
+            return False
+        spec = self.interlocking.routes[route]
+        return self.platform_route(spec["platform"], outbound=spec["kind"] == "out") is not None
+
+    def platform_route(self, platform, outbound=False):
+        """
+        เส้นทางราง (TrackRoute) ของชานชาลา: ใช้เส้นทางที่ตั้งชื่อไว้ (inbound/outbound ในเลย์เอาต์) ถ้ามี
+        ไม่งั้นค้นจากกราฟ entry -> ชานชาลา -> exit (เส้นเดียวใช้ทั้งขาเข้าและขาออก)
+        คืนค่า None ถ้าไม่มีทาง (segment ถูกปิด หรือประแจเสีย)
+        """
+        spec = self.layout.platforms[platform]
+        name = spec.get("outbound" if outbound else "inbound")
+        if name is not None:
+            return self.tracks.named(name)
+        return self.tracks.find(spec.get("entry", self.layout.entry), spec.get("exit", self.layout.exit), spec["segment"])
+
+    def pending_inbound_route(self):
+        """เส้นทางขาเข้าที่ล็อกไว้แล้วแต่ยังไม่มีขบวนเข้า (call_train จะใช้เส้นทางนี้) หรือ None"""
+        for route in self.interlocking.locked_routes(self.interlocking.kinds["in"]):
+            if route not in self.route_trains:
+                return route
+        return None
+
+    @property
+    def route_train(self):
+        """ขบวนล่าสุดที่เข้าใช้เส้นทางที่ล็อกอยู่ หรือ None"""
+        return next(reversed(self.route_trains.values()), None)
+
+
+    # --- การวาด (ส่งต่อให้ Renderer ถ้ามี) ---
+
+    def attach_renderer(self, renderer):
+        """ผูก Renderer (เช่น CanvasRenderer) เข้ากับ Simulator"""
+        self.renderer = renderer
+        self.canvas = getattr(renderer, "canvas", None)
+
+    def draw_base_tracks(self):
+        """วาดเส้นทางรถไฟพื้นฐาน (ถ้าไม่มี Renderer จะไม่ทำอะไร)"""
+        if self.renderer:
+            self.renderer.draw_base_tracks()
+
+    def draw_train(self, train=None):
+        """วาดตัวรถไฟ (ระบุขบวน หรือ None = ทุกขบวน) ถ้าไม่มี Renderer จะไม่ทำอะไร"""
+        if self.renderer:
+            self.renderer.draw_train(train)
+
+
+    def _stop_index(self, platform, length, route=None):
+        """
+        คำนวณจุดหยุดรถไฟใน path ขาเข้าของชานชาลาที่ระบุ (route = TrackRoute ขาเข้า None = หาเอง)
+        จุดหยุด = กึ่งกลางของชานชาลาในเส้นทาง (คำนวณไว้ตอนสร้าง TrackRoute) + ครึ่งหนึ่งของความยาวรถไฟ
+        """
+        route = route or self.platform_route(platform)
+        return route.stops[self.layout.platforms[platform]["segment"]] + length // 2
+
+    def _no_track(self, platform, action):
+        """log ว่าไม่มีทางรางไปยังชานชาลา (segment ถูกปิด หรือประแจเสีย) คืนค่า False"""
+        self.log("ERROR", f"{action}: No track route to Platform {platform} (closed: {', '.join(sorted(self.tracks.closed)) or '-'}, "
+                          f"failed switches: {', '.join(sorted(self.tracks.failed)) or '-'}).", platform=platform)
+        return False
+
+    def set_route_in(self, platform):
+        """ตั้งค่าเส้นทางสำหรับรถไฟขาเข้า (INBOUND)"""
+        route = self.inbound_routes[platform]
+        
+        # ตรวจสอบว่าเส้นทางขัดแย้งกับเส้นทางที่ล็อกอยู่หรือไม่
+        if not self._check_route(route):
+            return False
+        # ตรวจสอบว่าชานชาลาว่างหรือไม่ (ไม่มีขบวนจอด และไม่มีขบวนกำลังเข้า)
+        if self.platform_occupied[platform] or self.platform_trains[platform]:
+            self.log("ERROR", f"Cannot set route: Platform {platform} is occupied.", platform=platform)
+            return False
+        track = self.platform_route(platform)
+        if track is None:
+            return self._no_track(platform, "Cannot set route")
+
+        # ตั้งค่าตัวแปรสำหรับเส้นทางนี้
+        self.use_top_station = (platform == 1)
+        self.last_platform = platform
+        self._lock_route(route)  # ล็อกเส้นทางขาเข้า
+        
+        # คำนวณจุดหยุดรถไฟ (สำหรับขบวนความยาวมาตรฐาน)
+        self.station_stop_index = self._stop_index(platform, self.train_length, track)
+        
+        self.log("SYS", f"Route set: INBOUND to Platform {platform}. Route {route} locked.", route=route, platform=platform)
+        return True
+
+    def _check_route(self, route):
+        """ตรวจว่าตั้งเส้นทางได้ (ถ้าไม่ได้ให้ log สาเหตุ) คืนค่า True/False"""
+        if self.emergency_active:
+            self.log("ERROR", "Cannot set route: System is locked (EMERGENCY).")
+            return False
+        if not self.interlocking.available(route):
+            locked = "+".join(self.interlocking.conflicting(route))
+            self.log("ERROR", f"Cannot set route {route}: conflicts with locked route ({locked}).", route=route, locked=locked)
+            return False
+        return True
+        
+
+    def set_route_out(self, platform):
+        """ตั้งค่าเส้นทางสำหรับรถไฟขาออก (OUTBOUND)"""
+        
+        route = self.outbound_routes[platform]
+        
+        # ตรวจสอบเงื่อนไขต่างๆ
+        if not self._check_route(route):
+            return False
+        train = self.platform_trains[platform]
+        if not self.platform_occupied[platform] or train is None:
+            self.log("ERROR", f"Cannot depart: Platform {platform} is empty.", platform=platform)
+            return False
+        if train.state != "in_station":
+            self.log("ERROR", f"Cannot depart: Train not in station.", platform=platform)
+            return False
+        
+        # ล็อกเส้นทาง
+        self.last_platform = platform
+        self._lock_route(route)
+        self.route_trains[route] = train
+        self.log("SYS", f"Route set: OUTBOUND from Platform {platform}. Route {route} locked.", route=route, platform=platform)
+        
+        # สั่งให้รถไฟเริ่มเคลื่อนที่ (ถ้าออกไม่ได้ให้ปลดล็อกเส้นทางคืน)
+        if not self.release_train(platform):
+            self._release_route(route)
+            return False
+        return True
+
+    def call_train(self, length=None, speed=1.0, through=False, accel=None):
+        """
+        'เรียก' รถไฟขบวนใหม่เข้ามาในระบบ (เริ่มจำลองการเคลื่อนที่ขาเข้า)
+        - length: ความยาวขบวน (ไทล์) ค่าเริ่มต้นคือ self.train_length
+        - speed: ความเร็วสูงสุด (ไทล์ต่อ tick)
+        - accel: อัตราเร่ง/หน่วง (ไทล์ต่อ tick²) None = วิ่งด้วยความเร็วคงที่
+        - through: True = วิ่งผ่านสถานีไปทางออกเลยโดยไม่จอด
+        """
+        if self.emergency_active: return False  # ห้ามเรียกรถไฟระหว่างฉุกเฉิน
+        # ต้องมีเส้นทางขาเข้า (IN) ตั้งค่าไว้แล้ว และยังไม่มีขบวนใช้ (เส้นทางหนึ่งเส้นรับรถไฟได้ครั้งละ 1 ขบวน)
+        route = self.pending_inbound_route()
+        if route is None:
+            inbound = self.interlocking.locked_routes(self.interlocking.kinds["in"])
+            if inbound:
+                self.log("ERROR", f"Cannot arrive: Route {inbound[0]} already has {self.route_trains[inbound[0]].id}.")
+            else:
+                self.log("ERROR", f"Cannot arrive: No inbound route set.")
+            return False
+
+        length = length or self.train_length
+        platform = self.interlocking.routes[route]["platform"]
+        
+        # เลือกเส้นทาง (path) ของชานชาลาที่ตั้งค่าไว้ (ค้นจากกราฟราง ได้จาก cache ถ้าไม่มีการปิดทาง)
+        track = self.platform_route(platform, outbound=through)
+        if track is None:
+            return self._no_track(platform, "Cannot arrive")
+        path = track.path
+        if through:
+            stop_index = None
+        elif length == self.train_length and platform == self.last_platform:
+            stop_index = self.station_stop_index
+        else:
+            stop_index = self._stop_index(platform, length, track)
+        
+        # สร้างรถไฟขบวนใหม่ แล้วจองเส้นทางและชานชาลาให้
+        self.log("TRAIN", f"ขบวนที่ {self.train_id_counter} arriving on route {route}.", train_id=f"ขบวนที่ {self.train_id_counter}", route=route)
+        train = self.spawn_train(path, length, speed, stop_index, platform, route, start=False, accel=accel)
+        self.route_trains[route] = train
+        if not through:
+            self.platform_trains[platform] = train
+        
+        # เริ่มการเคลื่อนที่ครั้งแรก (ขบวนนี้เลื่อนทันที 1 ไทล์ แล้วเข้าร่วม tick loop)
+        self._advance(train)
+        self.fleet.sync(train)
+        self._start_ticking()
+        return True
+
+    def spawn_train(self, path, length=None, speed=1.0, stop_index=None, platform=0, route=None, start=True, accel=None):
+        """
+        วางรถไฟขบวนใหม่ลงบน path ใดก็ได้โดยไม่ผ่านระบบล็อกเส้นทาง
+        (ใช้จำลองลานสับเปลี่ยน/ทางวิ่งผ่าน) ขบวนจะหลบกันเองด้วยดัชนีการครอบครองไทล์
+        - start: True = เลื่อนไทล์แรกทันทีและเริ่ม tick loop
+        - accel: อัตราเร่ง/หน่วง (None = ความเร็วคงที่) ขบวนเข้ามาด้วยความเร็วสูงสุดแล้วค่อยเบรกก่อนจุดหยุด
+        คืนค่า Train ที่สร้างขึ้น
+        """
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        if accel is not None and accel <= 0:
+            raise ValueError("accel must be positive")
+        train = Train(f"ขบวนที่ {self.train_id_counter}", path, length or self.train_length,
+                      platform, route, stop_index, speed, accel)
+        self.train_id_counter += 1
+        self.trains[train.id] = train
+        self.moving[train.id] = train
+        self.fleet.add(train)
+        self._set_current_train(train)
+        self._emit("state", train_id=train.id, old=None, new="running")
+        if start:
+            self._advance(train)
+            self.fleet.sync(train)
+            self._start_ticking()
+        return train
+
+    def release_train(self, platform=None):
+        """
+        เตรียมการและเริ่มการเคลื่อนที่ขาออก
+        - platform: ชานชาลาของขบวนที่จะออก (None = ใช้ชานชาลาของเส้นทางขาออกที่ล็อกอยู่)
+        """
+        if platform is None:
+            outbound = self.interlocking.locked_routes(self.interlocking.kinds["out"])
+            if outbound:
+                platform = self.interlocking.routes[outbound[0]]["platform"]
+        route = self.outbound_routes.get(platform)
+        train = self.platform_trains.get(platform)
+        
+        # ตรวจสอบว่าอยู่ในสถานะจอด และตั้งเส้นทางขาออก (OUT) ของชานชาลานี้แล้ว
+        if train is None or train.state != "in_station" or not self.interlocking.is_locked(route):
+             self.log("ERROR", f"Release train failed. State: {self.state}, Route: {self.route_locked}")
+             return False
+        
+        # --- คำนวณเส้นทางที่เหลือ (สำคัญ) ---
+        
+        # 1. หา tile id ของหัวรถไฟปัจจุบัน
+        head_id = train.path.ids[train.head - 1]
+        
+        # 2. หาตำแหน่งหัวรถไฟบน path ขาออกเต็มเส้นจากดัชนีย้อนกลับ (O(1) ไม่ต้องเทียบพิกัดทีละไทล์)
+        track = self.platform_route(platform, outbound=True)
+        if track is None:
+            return self._no_track(platform, "Release train failed")
+        outbound_path = track.path
+        offset = outbound_path.offset_of(head_id)
+        if offset is None:
+            # หัวรถไฟไม่อยู่บนเส้นทางขาออก: ไม่ย้ายรถไฟ (เดิมจะกระโดดไปที่ path_end)
+            self.log("ERROR", f"Release train failed: {train.id} is not on the outbound route of Platform {platform}.", train_id=train.id, platform=platform)
+            return False
+        
+        self.log("TRAIN", f"{train.id} departing from Platform {platform}.", train_id=train.id, platform=platform)
+        
+        # 3. ย้ายหน้าต่างตัวรถไฟไปอยู่บน path ขาออกเต็มเส้น (หัวอยู่ตำแหน่งเดิม)
+        head = offset + 1
+        train.path = outbound_path
+        train.head, train.tail = head, max(0, head - (train.head - train.tail))
+            
+        # 5. ตั้งสถานะ "กำลังออก"
+        train.progress = 0.0
+        if train.accel:
+            train.speed = 0.0  # ออกตัวจากหยุดนิ่ง แล้วค่อยเร่งขึ้น
+        train.route = route
+        self._set_train_state(train, "leaving")
+        self._set_current_train(train)
+        self.moving[train.id] = train
+        self.fleet.activate(train)  # ขาออกไม่มีจุดหยุด
+        
+        # เริ่มการเคลื่อนที่
+        self._advance(train)
+        self.fleet.sync(train)
+        self._start_ticking()
+        return True
+
+    # --- การปิดทาง / ประแจเสีย (ลบเฉพาะเส้นทางใน cache ที่ได้รับผลกระทบ) ---
+
+    def close_segment(self, name):
+        """ปิด segment: ตั้งเส้นทางใหม่ที่ผ่าน segment นี้ไม่ได้ (ขบวนที่วิ่งอยู่แล้วไม่ถูกย้าย)"""
+        dropped = self.tracks.close_segment(name)
+        self.log("TRACK", f"Segment {name} closed ({dropped} cached routes dropped).", segment=name, dropped=dropped)
+        return dropped
+
+    def open_segment(self, name):
+        """เปิด segment ที่ปิดไว้"""
+        dropped = self.tracks.open_segment(name)
+        self.log("TRACK", f"Segment {name} reopened ({dropped} cached routes dropped).", segment=name, dropped=dropped)
+        return dropped
+
+    def fail_switch(self, name):
+        """ประแจเสีย: ทุกทางที่ผ่านประแจนี้ใช้ไม่ได้จนกว่าจะซ่อม"""
+        dropped = self.tracks.fail_switch(name)
+        self.log("TRACK", f"Switch {name} failed ({dropped} cached routes dropped).", switch=name, dropped=dropped)
+        return dropped
+
+    def repair_switch(self, name):
+        """ซ่อมประแจที่เสีย"""
+        dropped = self.tracks.repair_switch(name)
+        self.log("TRACK", f"Switch {name} repaired ({dropped} cached routes dropped).", switch=name, dropped=dropped)
+        return dropped
+
+    def emergency_stop(self):
+        """
+        หยุดฉุกเฉิน: ไฟสัญญาณแดงทุกดวง ขบวนที่วิ่งอยู่เบรกหยุดภายในระยะเบรก (ขบวนที่ไม่มี accel หยุดทันที)
+        ขบวน ดัชนีการครอบครอง ชานชาลา และเส้นทางที่มีขบวนใช้อยู่คงเดิม ปลดเฉพาะเส้นทางที่ยังไม่มีขบวนใช้
+        แล้วกลับมาทำงานใน EMERGENCY_RESET_MS (reset_from_emergency) โดยทุกขบวนวิ่งต่อจากจุดที่หยุด
+        """
+        if self.emergency_active:
+            self.log("SYS", "Emergency stop already in progress.")
+            return
+        self.log("!!EMERGENCY!!", "All signals RED. Trains braking to a halt.")
+        
+        old_state = self.state
+        self.emergency_active = True  # ห้ามตั้งเส้นทาง/เรียกรถไฟจนกว่าจะรีเซ็ต
+        self._emit("state", train_id=None, old=old_state, new="emergency")
+        # ปลดเฉพาะเส้นทางที่ยังไม่มีขบวนใช้ (เส้นทางที่มีขบวนอยู่ ขบวนต้องใช้วิ่งต่อหลังรีเซ็ต)
+        for route in self.interlocking.locked_routes():
+            if route not in self.route_trains:
+                self._release_route(route)
+        
+        # ทุกขบวนที่เคลื่อนที่อยู่: หาจุดหยุดจากระยะเบรกที่ความเร็วปัจจุบัน (v² / 2a) แล้วให้ fleet เบรกหยุดตรงนั้น
+        for train in list(self.moving.values()):
+            if train.head >= len(train.path):
+                continue  # หัวพ้นแผนที่ไปแล้ว: ปล่อยให้วิ่งออกไปจนหมดขบวน
+            distance = train.progress + train.speed * train.speed / (2.0 * train.accel) if train.accel else 0.0
+            if distance <= 0.0 or train.blocked:
+                train.halt_index = train.head - 1
+                self._halt(train)
+                continue
+            train.halt_index = train.head - 1 + math.ceil(distance)  # หยุดเมื่อหัวเลยไทล์นี้
+            target = train.halt_index
+            if train.state == "running" and train.stop_index is not None:
+                target = min(target, train.stop_index)  # ถึงจุดจอดที่ชานชาลาก่อนก็จอดตามปกติ
+            self.fleet.activate(train, target)
+        
+        # หน่วงเวลา 2 วินาที (เวลาจำลอง) แล้วค่อยเรียกฟังก์ชันรีเซ็ต
+        self.after(self.EMERGENCY_RESET_MS, self.reset_from_emergency)
+
+    def _halt(self, train):
+        """ขบวนหยุดนิ่งเพราะหยุดฉุกเฉิน: ไม่คำนวณการเคลื่อนที่ต่อ แต่ยังครอบครองรางและเส้นทางเดิม"""
+        del self.moving[train.id]
+        self.fleet.deactivate(train)
+        train.progress = 0.0
+        if train.accel:
+            train.speed = 0.0  # ออกตัวใหม่จากหยุดนิ่งตอนรีเซ็ต
+        self.log("TRAIN", f"{train.id} halted by emergency stop.", train_id=train.id)
+        
+    def reset_from_emergency(self):
+        """รีเซ็ตสถานะกลับเป็น 'พร้อม' หลังหยุดฉุกเฉิน: ขบวนที่ถูกสั่งหยุดวิ่งต่อจากจุดเดิม (ไม่ต้องเรียกเข้ามาใหม่)"""
+        self.log("SYS", "System resetting from emergency.")
+        self.emergency_active = False
+        resumed = 0
+        for train in self.trains.values():
+            if train.halt_index is None:
+                continue
+            train.halt_index = None
+            # กลับไปเบรกหาจุดจอดเดิม (ขาเข้า) หรือไม่มีจุดหยุด (ขาออก/วิ่งผ่าน)
+            self.fleet.activate(train, train.stop_index if train.state == "running" else None)
+            self.moving[train.id] = train
+            resumed += 1
+        if resumed:
+            self.log("TRAIN", f"{resumed} trains resuming.", trains=resumed)
+        self._emit("state", train_id=None, old="emergency", new=self.state)
+        self._start_ticking()
+
+    def _start_ticking(self):
+        """เริ่ม tick loop (ถ้ายังไม่ได้เริ่ม)"""
+        if not self._ticking and self.moving:
+            self._ticking = True
+            self.after(self.TICK_MS, self._move_train)
+
+    def _move_train(self):
+        """
+        ฟังก์ชันหลักที่ขับเคลื่อนรถไฟ (Loop)
+        เลื่อนรถไฟทุกขบวนที่กำลังเคลื่อนที่ใน tick เดียวกัน
+        จะเรียกตัวเองซ้ำๆ ผ่าน self.after() (นาฬิกาจำลอง) ทุก TICK_MS
+        """
+        
+        self.ticks += 1
+        self.last_tick_time = self.now
+        
+        # คำนวณความเร็ว/ระยะของทุกขบวนในครั้งเดียว แล้วเลื่อนไทล์เฉพาะขบวนที่สะสมระยะครบ 1 ไทล์
+        # (ต้นทุนต่อ tick ขึ้นกับจำนวนขบวนที่วิ่ง ไม่ใช่ความยาวรวม)
+        fleet, moving = self.fleet, self.moving
+        trains = fleet.trains
+        for slot, steps in fleet.update():
+            train = trains[slot]
+            for _ in range(steps):
+                if train.id not in moving or not self._advance(train):
+                    break
+            if train.fleet is not None:
+                fleet.sync(train)
+        
+        if self.moving:
+            self.after(self.TICK_MS, self._move_train)
+        else:
+            self._ticking = False
+
+    def _advance(self, train):
+        """
+        เลื่อนรถไฟ 1 ขบวนไปข้างหน้า 1 ไทล์
+        คืนค่า True ถ้าเลื่อนได้และยังวิ่งต่อได้ในรอบนี้
+        """
+        ids = train.path.ids
+        
+        # --- ส่วนที่ 1: รถไฟยังมีเส้นทางเหลือให้วิ่ง (เพิ่มหัว) ---
+        if train.head < len(ids):
+            # 1. เอาไทล์ถัดไป (หัวรถไฟ) และตรวจว่ามีขบวนอื่นครอบครองอยู่หรือไม่ (O(1))
+            head = ids[train.head]
+            holder = self.occupancy.get(head)
+            if holder is not None and holder is not train:
+                if not train.blocked:
+                    train.blocked = True
+                    self.log("TRAIN", f"{train.id} held: track ahead occupied by {holder.id}.", train_id=train.id, holder=holder.id)
+                train.progress = 0.0  # รอจนกว่าทางข้างหน้าจะว่าง
+                if train.accel:
+                    train.speed = 0.0
+                return False
+            train.blocked = False
+            train.head += 1
+            self.occupancy[head] = train
+            
+            # 2. ถ้าขบวนยาวเกิน ให้เลื่อนหาง (O(1) ไม่ต้อง pop(0))
+            if train.head - train.tail > train.length: 
+                self._vacate(train, ids[train.tail])
+                train.tail += 1
+            
+            # 3. วาดรถไฟ
+            self.draw_train(train)
+            
+            # 4. ตรวจสอบว่าถึงจุดหยุด (สำหรับขาเข้า) หรือยัง
+            if train.state == "running" and train.stop_index is not None and train.head > train.stop_index:
+                self._arrive(train)
+                return False  # หยุด (รอคำสั่งใหม่)
+            # 5. หยุดฉุกเฉิน: เบรกจนถึงจุดหยุดแล้ว
+            if train.halt_index is not None and train.head > train.halt_index:
+                self._halt(train)
+                return False
+            return True
+            
+        # --- ส่วนที่ 2: รถไฟวิ่งเลยเส้นทางแล้ว (ลบหาง) ---
+        elif train.tail < train.head:
+            # 1. รถไฟวิ่งพ้น path แล้ว แต่ตัวขบวนยังค้างอยู่
+            # 2. เลื่อนหางจนกว่าขบวนจะหายไปหมด
+            self._vacate(train, ids[train.tail])
+            train.tail += 1
+            self.draw_train(train)
+            return True
+            
+        # --- ส่วนที่ 3: รถไฟออกจากแผนที่ไปหมดแล้ว ---
+        else:
+            self._clear_train(train)
+            return False
+
+    def _vacate(self, train, tile_id):
+        """ลบไทล์ออกจากดัชนีการครอบครอง (เฉพาะถ้าขบวนนี้เป็นเจ้าของ)"""
+        if self.occupancy.get(tile_id) is train:
+            del self.occupancy[tile_id]
+
+
+    def _arrive(self, train):
+        """รถไฟถึงจุดหยุดที่ชานชาลา"""
+        del self.moving[train.id]
+        self.fleet.deactivate(train)
+        train.halt_index = None  # จอดที่ชานชาลาระหว่างเบรกฉุกเฉิน: ไม่ต้องวิ่งต่อตอนรีเซ็ต
+        self._set_train_state(train, "in_station")  # เปลี่ยนสถานะเป็น "จอดในสถานี"
+        self._set_current_train(train)
+        if self.route_trains.get(train.route) is train:
+            self._release_route(train.route)   # ปลดล็อกเส้นทาง
+        self._set_platform(train.platform, True) # ตั้งค่าว่าชานชาลาไม่ว่าง
+        
+        # เปลี่ยนสี Track ชานชาลา (ในโค้ดนี้คือเปลี่ยนกลับเป็นสีเทา)
+        if self.renderer:
+            self.renderer.reset_platform_track(train.platform) # (อาจเปลี่ยนเป็นสีแดง/ส้ม เพื่อโชว์ว่า occupied)
+        
+        self.log("TRAIN", f"{train.id} at Platform {train.platform}. Route unlocked.", train_id=train.id, platform=train.platform)
+        self.draw_train(train)  # วาดซ้ำ (เปลี่ยนสี)
+
+    def _clear_train(self, train):
+        """รถไฟออกจากแผนที่ไปหมดแล้ว: ปลดล็อกเส้นทางและคืนชานชาลา"""
+        if train.stop_index is None and train.state == "running":
+            self.log("TRAIN", f"{train.id} passed through. Map clear.", train_id=train.id)
+        else:
+            self.log("TRAIN", f"{train.id} has left Platform {train.platform}. Map clear.", train_id=train.id, platform=train.platform)
+        # ขบวนวิ่งพ้นปลายเส้นทาง (ไม่ใช่ถูกล้างตอนฉุกเฉิน): ผู้รับส่งต่อให้สถานีถัดไปได้ (ดู ParknamLine.py)
+        self._emit("exit", train_id=train.id, length=train.length, speed=train.max_speed, accel=train.accel)
+        self.moving.pop(train.id, None)
+        self.fleet.remove(train)
+        del self.trains[train.id]
+        self._emit("state", train_id=train.id, old=train.state, new="cleared")
+        
+        if self.route_trains.get(train.route) is train:
+            self._release_route(train.route)  # ปลดล็อก
+        if self.platform_trains.get(train.platform) is train:
+            self.platform_trains[train.platform] = None
+            self._set_platform(train.platform, False) # ชานชาลาว่าง
+            if self.renderer:
+                self.renderer.reset_platform_track(train.platform)
+        
+        # ลบภาพรถไฟ และเลือกขบวนปัจจุบันใหม่ (ขบวนล่าสุดที่ยังอยู่)
+        if self.renderer:
+            self.renderer.remove_train(train.id)
+        if self.current_train is train:
+            self._set_current_train(next(reversed(self.trains.values()), None))
+
+
+# ผู้ควบคุมสถานีอัตโนมัติ (ใช้ร่วมกันโดย ParknamBatch.py และ ParknamLine.py): จอดครบ dwell_ms แล้วปล่อยออก
+# ตัดสินใจเป็นเหตุการณ์บนนาฬิกาจำลองเมื่อมีอะไรเปลี่ยน คลาสลูกกำหนดเองว่าจะรับขบวนไหนเข้าชานชาลาไหน (_admit)
+class StationController:
+
+    def __init__(self, sim, dwell_ms):
+        self.sim = sim
+        self.dwell_ms = dwell_ms
+        self.docked = {}  # ชานชาลา -> เวลาที่ขบวนจอดเสร็จ (เริ่มนับ dwell)
+        self._wake_pending = False
+        sim.subscribe(self._on_event)
+
+    def _command(self, command, *args, **kwargs):
+        """เรียกคำสั่งของ Simulator (คลาสลูกใช้นับคำสั่งที่ถูกปฏิเสธได้)"""
+        return command(*args, **kwargs)
+
+    def _wake(self):
+        """นัดให้ตัดสินใจใหม่เป็นเหตุการณ์ถัดไปของนาฬิกาจำลอง (ไม่สั่งการซ้อนใน callback ของ Simulator)"""
+        if not self._wake_pending:
+            self._wake_pending = True
+            self.sim.after(0, self._act)
+
+    def _act(self):
+        self._wake_pending = False
+        sim, now = self.sim, self.sim.now
+        if sim.emergency_active:
+            return
+        # สั่งเฉพาะเส้นทางที่ interlocking ยอมตอนนี้ (ขาเข้าชานชาลาหนึ่งกับขาออกอีกชานชาลาตั้งพร้อมกันได้)
+        # 1. ปล่อยขบวนที่จอดครบเวลาแล้วก่อน (ให้ชานชาลาว่างเร็วที่สุด)
+        for platform, since in sorted(self.docked.items(), key=lambda item: item[1]):
+            if now - since >= self.dwell_ms and sim.route_available(sim.outbound_routes[platform]):
+                if self._command(sim.set_route_out, platform):
+                    del self.docked[platform]
+                    self._departed(platform, now - since)
+                break
+        # 2. รับขบวนที่รออยู่เข้าชานชาลา
+        self._admit(now)
+
+    def _departed(self, platform, docked_ms):
+        """ตั้งเส้นทางออกให้ขบวนที่จอดอยู่ที่ platform มาแล้ว docked_ms"""
+
+    def _admit(self, now):
+        """รับขบวนที่รออยู่เข้าชานชาลา (ถ้ามีและเส้นทางว่าง)"""
+
+    def _on_event(self, event, data):
+        if event == "state" and data["new"] == "in_station":
+            train = self.sim.trains.get(data["train_id"])
+            if train is not None:
+                self.docked[train.platform] = self.sim.now
+                self.sim.after(self.dwell_ms, self._wake)
+        self._wake()
+
+
+# ดัชนีเชิงพื้นที่แบบกริดสม่ำเสมอ: แบ่งพื้นที่เป็นช่องสี่เหลี่ยมขนาด cell แล้วเก็บ key ของสิ่งที่อยู่ในแต่ละช่อง
+# หาสิ่งที่อยู่ในกรอบสี่เหลี่ยมได้โดยดูเฉพาะช่องที่ทับกรอบ (ไม่ต้องวนทุกสิ่งในแผนที่)
+class SpatialGrid:
+
+    def __init__(self, cell):
+        """- cell: ขนาดช่อง (หน่วยเดียวกับพิกัดที่ใส่ เช่น พิกเซลที่ zoom 1)"""
+        self.cell = cell
+        self.cells = {}  # (cx, cy) -> set ของ key
+
+    def cell_of(self, x, y):
+        """ช่องที่จุด (x, y) อยู่"""
+        return (math.floor(x / self.cell), math.floor(y / self.cell))
+
+    def add(self, cell, key):
+        self.cells.setdefault(cell, set()).add(key)
+
+    def discard(self, cell, key):
+        keys = self.cells.get(cell)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.cells[cell]
+
+    def cell_range(self, x0, y0, x1, y1):
+        """ช่วงช่อง (cx0, cy0, cx1, cy1) ที่ทับกรอบ (x0, y0)-(x1, y1) รวมขอบ"""
+        return self.cell_of(x0, y0) + self.cell_of(x1, y1)
+
+    def query(self, x0, y0, x1, y1):
+        """key ทั้งหมดในช่องที่ทับกรอบ (วนเฉพาะช่องในกรอบ หรือเฉพาะช่องที่มีของ ถ้าน้อยกว่า)"""
+        cx0, cy0, cx1, cy1 = self.cell_range(x0, y0, x1, y1)
+        found = set()
+        cells = self.cells
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(cells):
+            for (cx, cy), keys in cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    found |= keys
+        else:
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    keys = cells.get((cx, cy))
+                    if keys:
+                        found |= keys
+        return found
+
+
+# มุมมอง (zoom/pan) ของแผนที่บน canvas: พิกัดจอ = (พิกัดโลก - มุมซ้ายบนของมุมมอง) × zoom
+# พิกัดโลก = พิกเซลของแผนที่ที่ zoom 1 (มุมมองเริ่มต้นจึงวาดเหมือนเดิมทุกประการ)
+class Viewport:
+
+    MIN_ZOOM = 1 / 256
+    MAX_ZOOM = 16.0
+
+    def __init__(self, width, height):
+        """- width, height: ขนาดพื้นที่แสดงแผนที่บน canvas (พิกเซล)"""
+        self.width = width
+        self.height = height
+        self.zoom = 1.0
+        self.x = 0.0  # พิกัดโลกของมุมซ้ายบนของจอ
+        self.y = 0.0
+
+    @property
+    def identity(self):
+        """มุมมองเริ่มต้น (พิกัดจอ = พิกัดโลก ไม่ต้องแปลง)"""
+        return self.zoom == 1.0 and self.x == 0.0 and self.y == 0.0
+
+    def visible(self, margin=0.0):
+        """กรอบพิกัดโลก (x0, y0, x1, y1) ที่เห็นบนจอ (ขยายออกด้านละ margin พิกเซลจอ)"""
+        m = margin / self.zoom
+        return (self.x - m, self.y - m,
+                self.x + self.width / self.zoom + m, self.y + self.height / self.zoom + m)
+
+    def to_screen(self, coords):
+        """แปลงพิกัดโลก (x, y, x, y, ...) เป็นพิกัดจอ"""
+        z, ox, oy = self.zoom, self.x, self.y
+        out = [(v - ox) * z for v in coords]
+        out[1::2] = [(v - oy) * z for v in coords[1::2]]
+        return out
+
+    def to_world(self, sx, sy):
+        """แปลงพิกัดจอเป็นพิกัดโลก"""
+        return self.x + sx / self.zoom, self.y + sy / self.zoom
+
+    def zoom_at(self, factor, sx, sy):
+        """ซูมรอบจุด (sx, sy) บนจอ (จุดนั้นยังอยู่ที่เดิม)"""
+        wx, wy = self.to_world(sx, sy)
+        self.zoom = min(self.MAX_ZOOM, max(self.MIN_ZOOM, self.zoom * factor))
+        self.x, self.y = wx - sx / self.zoom, wy - sy / self.zoom
+
+    def pan(self, dx, dy):
+        """เลื่อนแผนที่ตามระยะบนจอ (ลากไปทางขวา = dx บวก)"""
+        self.x -= dx / self.zoom
+        self.y -= dy / self.zoom
+
+    def fit(self, x0, y0, x1, y1, margin=20.0):
+        """ซูมและเลื่อนให้กรอบพิกัดโลกนี้อยู่เต็มจอ"""
+        self.zoom = min(self.MAX_ZOOM, max(self.MIN_ZOOM, min((self.width - 2 * margin) / max(x1 - x0, 1e-9),
+                                                               (self.height - 2 * margin) / max(y1 - y0, 1e-9))))
+        self.x = (x0 + x1) / 2 - self.width / 2 / self.zoom
+        self.y = (y0 + y1) / 2 - self.height / 2 / self.zoom
+
+    @staticmethod
+    def simplify(coords):
+        """ตัดจุดกลางที่อยู่บนเส้นตรงเดียวกับจุดก่อนและหลังออก (รางเป็นเส้นตรง/เฉียง 45 องศา จึงเหลือแค่จุดหักมุม)"""
+        if len(coords) <= 4:
+            return list(coords)
+        out = [coords[0], coords[1]]
+        for i in range(2, len(coords) - 2, 2):
+            x, y = coords[i], coords[i + 1]
+            if abs((x - out[-2]) * (coords[i + 3] - y) - (y - out[-1]) * (coords[i + 2] - x)) > 1e-6:
+                out += (x, y)
+        out += (coords[-2], coords[-1])
+        return out
+
+
+# คลาสสำหรับวาด Simulator ลงบน tk.Canvas (แยกออกจากตรรกะการจำลอง)
+class CanvasRenderer:
+    def __init__(self, canvas, sim):
+        """
+        สร้างเส้น Track ชานชาลาบน canvas
+        - canvas: พื้นที่วาดรูปของ tkinter
+        - sim: TrainSimulator ที่ต้องการวาด
+        """
+        self.canvas = canvas
+        self.sim = sim
+        self.sprites = {}  # ภาพรถไฟแต่ละขบวน (train_id -> TrainSprite)
+        # โหมดวาดทีละเฟรม: Simulator แค่บอกว่าขบวนไหนเปลี่ยน แล้ว GUI เรียก render_frame() ตามรอบจอ
+        self.interpolate = False
+        self._dirty = set()  # ขบวนที่เปลี่ยนตั้งแต่เฟรมก่อน (ใช้ในโหมด interpolate)
+        self._base_paths = None  # เส้นทางพื้นฐานที่รวมไว้แล้ว (สร้างตอนวาดครั้งแรก)
+        ts = sim.ts
+        
+        # --- วาดส่วน Track ที่แสดงสถานะ Occupancy (ทับเส้นทางพื้นฐาน) ---
+        self.track_width = max(2, ts / 2.5) # ความหนาของเส้น Track
+        
+        # สร้างเส้นของแต่ละชานชาลาจากพิกัดกึ่งกลางที่คำนวณไว้แล้ว
+        # (ส่วนของรางที่เลย์เอาต์กำหนด เช่น ชานชาลา 2 วาดเฉพาะส่วนที่ตรงกับชานชาลาบน เพื่อความสวยงาม)
+        self.platform_track_ids = {
+            platform: self.canvas.create_line(path.centres().tolist(), fill="gray", width=self.track_width, tags="track_platform")
+            for platform, path in sim.layout.platform_tracks.items()
+        }
+        self.signal_colors = {}  # ชื่อสัญญาณ -> สีไฟ (ไม่มี = แดง)
+        self.view = None  # Viewport (None = วาดทั้งแผนที่ตามพิกัดเดิม ไม่ตัดส่วนที่อยู่นอกจอ)
+        sim.log("SIM", "Platform occupancy segments created.")
+
+    def draw_base_tracks(self):
+        """วาดเส้นทางรถไฟพื้นฐาน (สีเทา) ทั้งหมด (โหมดมุมมอง: สร้างชิ้นส่วนที่อยู่ในจอใหม่)"""
+        sim = self.sim
+        if self.view is not None:
+            self.canvas.delete("static")
+            self._items.clear()
+            self._level = None
+            self.refresh_view()
+            return
+        self.canvas.delete("track_base")  # ลบของเก่า
+        track_color = "gray"
+        
+        # เส้นทางพื้นฐานรวมไว้ครั้งเดียว แล้วใช้พิกัดกึ่งกลางที่ cache ไว้ทุกครั้งที่วาดใหม่
+        # (1 เส้นต่อ 1 กลุ่ม segment ใน "draw" ของเลย์เอาต์ เช่น เส้นทางหลักด้านล่าง และเส้นทางเบี่ยง)
+        if self._base_paths is None:
+            self._base_paths = [functools.reduce(operator.add, segments) for segments in sim.layout.draw]
+        
+        # 1. วาดเส้นทางพื้นฐาน
+        for path in self._base_paths:
+            self.canvas.create_line(path.centres().tolist(), fill=track_color, width=self.track_width, tags="track_base")
+        
+        # 2. ย้ายเส้นชานชาลามาไว้ข้างหน้าสุด
+        for item in self.platform_track_ids.values():
+            self.canvas.tag_raise(item)
+
+    def draw_train(self, train=None):
+        """
+        วาดตัวรถไฟ (ระบุขบวน หรือ None = วาดทุกขบวนใน sim.trains)
+        ใช้ canvas item เดิมของแต่ละขบวนซ้ำ แทนการ delete/create ทุกครั้ง
+        """
+        if train is None:
+            # ลบภาพของขบวนที่ไม่อยู่ในแผนที่แล้ว แล้ววาดทุกขบวนที่เหลือ
+            for train_id in [tid for tid in self.sprites if tid not in self.sim.trains]:
+                self.remove_train(train_id)
+            for train in self.sim.trains.values():
+                self.draw_train(train)
+            return
+        if self.interpolate:
+            self._dirty.add(train.id)  # วาดจริงตอน render_frame()
+            return
+        self._sync(train)
+
+    def render_frame(self):
+        """
+        วาด 1 เฟรม (โหมด interpolate): ขบวนที่กำลังวิ่งถูกวาดเลื่อนไปตามเศษส่วนของไทล์
+        ที่คาดว่าวิ่งไปแล้วนับจาก tick ล่าสุด ภาพจึงลื่นที่ทุก time scale
+        """
+        sim = self.sim
+        alpha = min(1.0, max(0.0, (sim.now - sim.last_tick_time) / sim.TICK_MS))
+        for train in sim.trains.values():
+            moving = train.id in sim.moving and not train.blocked
+            if moving or train.id in self._dirty:
+                frac = min(0.999, train.progress + train.speed * alpha) if moving else 0.0
+                self._sync(train, frac)
+        self._dirty.clear()
+
+    @staticmethod
+    def train_color(train):
+        """สีรถไฟตามสถานะ: แดง = กำลังวิ่ง (เข้า/ออก), เขียว = จอด"""
+        if train.state == "running" or train.state == "leaving":
+            return "#f87171"
+        return "#4ade80"
+
+    def _sync(self, train, frac=0.0):
+        train_color = self.train_color(train)
+
+        sprite = self.sprites.get(train.id)
+        if self.view is not None and not self._track(train):
+            # ขบวนอยู่นอกจอ: ไม่วาด (บัฟเฟอร์พิกัดของ sprite ต่อจากเดิมได้เมื่อกลับเข้าจอ)
+            if sprite is not None:
+                sprite.hide()
+            self._shown.discard(train.id)
+            return
+        if sprite is None:
+            if self.view is None:
+                sprite = self.sprites[train.id] = TrainSprite(self.canvas, self.sim.ts)
+            else:
+                sprite = self.sprites[train.id] = TrainSprite(self.canvas, max(1.0, self.sim.ts * self.view.zoom),
+                                                              tags=("train", "world"), view=self.view)
+        if self.view is not None:
+            self._shown.add(train.id)
+        head_frac = tail_frac = 0.0
+        if frac:
+            on_path = train.head < len(train.path)
+            head_frac = frac if on_path else 0.0
+            # หางเลื่อนเมื่อขบวนยาวครบแล้ว หรือหัววิ่งพ้นเส้นทางไปแล้ว
+            tail_frac = frac if train.head - train.tail >= train.length or not on_path else 0.0
+        sprite.sync(train.path, train.tail, train.head, train_color, head_frac, tail_frac)
+
+    def remove_train(self, train_id):
+        """ลบภาพรถไฟ 1 ขบวนออกจาก canvas"""
+        sprite = self.sprites.pop(train_id, None)
+        if sprite:
+            sprite.delete()
+        if self.view is not None:
+            self._untrack(train_id)
+
+    def clear_train(self):
+        """ลบภาพรถไฟทุกขบวนออกจาก canvas"""
+        for sprite in self.sprites.values():
+            sprite.delete()
+        self.sprites.clear()
+        self.canvas.delete("train")
+        if self.view is not None:
+            for train_id in list(self._train_windows):
+                self._untrack(train_id)
+
+    def reset_platform_track(self, platform):
+        """รีเซ็ตสี Track ของชานชาลาที่ระบุกลับเป็นสีเทา"""
+        if self.view is not None:
+            self.canvas.itemconfig(f"platform:{platform}", fill="gray")  # ทุกชิ้นของชานชาลาที่อยู่ในจอ
+            return
+        self.canvas.itemconfig(self.platform_track_ids[platform], fill="gray")
+
+    def set_signal(self, name, color):
+        """ตั้งสีไฟสัญญาณ (ไฟที่อยู่นอกจอได้สีนี้ตอนถูกสร้าง) คืนค่า True ถ้าสั่ง canvas จริง"""
+        if self.signal_colors.get(name, "red") == color:
+            return False
+        self.signal_colors[name] = color
+        self.canvas.itemconfig(f"signal:{name}", fill=color)
+        return True
+
+    # --- มุมมอง (zoom/pan) และการวาดเฉพาะส่วนที่อยู่ในจอ ---
+
+    CELL_PX = 160  # ขนาดช่องกริด (พิกเซลที่ zoom 1) ของ LOD ระดับ 0 ซูมออกทีละครึ่งใช้ระดับถัดไปที่ช่องใหญ่ขึ้นเท่าตัว
+    # (ช่องบนจอจึงใหญ่ราว 80-160 พิกเซลเสมอ จำนวน item บนจอไม่ขึ้นกับขนาดเลย์เอาต์)
+    MAX_LEVEL = 12
+    MARGIN = 32  # สร้าง item เผื่อรอบจอ (พิกเซลจอ) เลื่อนเล็กน้อยจึงไม่ต้องสร้างใหม่
+    LABEL_ZOOM = 0.6  # ซูมออกต่ำกว่านี้ไม่วาดป้ายข้อความ
+    SIGNAL_ZOOM = 0.2  # ซูมออกต่ำกว่านี้ไม่วาดไฟสัญญาณ
+
+    def enable_viewport(self, width, height):
+        """
+        เปิดโหมดมุมมอง (zoom_at() / pan() / fit()): ราง ไฟสัญญาณ ป้าย และรถไฟอยู่ในดัชนีกริด
+        แล้วมีบน canvas เฉพาะชิ้นที่อยู่ในจอ ซูมออกแล้วใช้ชิ้นส่วนที่ใหญ่ขึ้นและตัดรายละเอียดเล็กๆ (LOD)
+        - width, height: ขนาดพื้นที่แสดงแผนที่บน canvas (พิกเซล)
+        """
+        self.clear_train()
+        self.canvas.delete("track_base")
+        for item in self.platform_track_ids.values():
+            self.canvas.delete(item)
+        self.platform_track_ids = {}
+        self.view = Viewport(width, height)
+        self.train_grid = SpatialGrid(self.CELL_PX)  # ช่อง -> ขบวนที่มีไทล์อยู่ในช่อง
+        self._train_cells = {}  # train_id -> {ช่อง: จำนวนไทล์ของขบวนในช่องนั้น}
+        self._train_windows = {}  # train_id -> (path, tail, head) ที่นับลงกริดแล้ว
+        self._visible_cells = None  # ช่วงช่องของกริดรถไฟที่อยู่ในจอ (cx0, cy0, cx1, cy1)
+        self._shown = set()  # ขบวนที่วาดอยู่บนจอ
+        self._levels = {}  # ระดับ LOD -> (SpatialGrid, ชิ้นส่วน) สร้างเมื่อใช้ครั้งแรก
+        self._level = None
+        self._items = {}  # ชิ้นส่วนที่มีบน canvas: key -> canvas item
+        self._drawn = (1.0, 0.0, 0.0)  # (zoom, x, y) ของมุมมองที่ item บน canvas วาดไว้
+        self.refresh_view()
+        for train in self.sim.trains.values():
+            self.draw_train(train)
+
+    def zoom_at(self, factor, sx, sy):
+        """ซูมรอบจุด (sx, sy) บนจอ"""
+        self.view.zoom_at(factor, sx, sy)
+        self.refresh_view()
+
+    def pan(self, dx, dy):
+        """เลื่อนแผนที่ตามระยะบนจอ"""
+        self.view.pan(dx, dy)
+        self.refresh_view()
+
+    def fit(self, bounds=None):
+        """ซูมให้เห็นกรอบพิกัดโลก (x0, y0, x1, y1) ทั้งหมด (None = ทั้งเลย์เอาต์)"""
+        if bounds is None:
+            xs, ys = self.sim.geometry.centres[0::2], self.sim.geometry.centres[1::2]
+            bounds = (min(xs), min(ys), max(xs), max(ys))
+        self.view.fit(*bounds)
+        self.refresh_view()
+
+    def reset_view(self):
+        """กลับสู่มุมมองเริ่มต้น (zoom 1 มุมซ้ายบนที่ 0, 0)"""
+        self.view.zoom, self.view.x, self.view.y = 1.0, 0.0, 0.0
+        self.refresh_view()
+
+    def refresh_view(self):
+        """
+        ปรับ canvas ให้ตรงกับมุมมอง: ย้าย/ย่อขยาย item ที่มีอยู่ทีเดียวทั้งหมด (canvas.move/scale)
+        แล้วสร้าง/ลบเฉพาะชิ้นส่วนและขบวนที่เข้า/ออกจากจอ
+        """
+        view, canvas = self.view, self.canvas
+        z0, x0, y0 = self._drawn
+        if (z0, x0, y0) != (view.zoom, view.x, view.y):
+            factor = view.zoom / z0
+            if factor != 1.0:
+                canvas.scale("world", 0, 0, factor, factor)
+                canvas.itemconfig("track_base", width=max(1.0, self.track_width * view.zoom))
+                canvas.itemconfig("track_platform", width=max(1.0, self.track_width * view.zoom))
+                width = max(1.0, self.sim.ts * view.zoom)
+                canvas.itemconfig("train", width=width)
+                for sprite in self.sprites.values():
+                    sprite.width = width
+            dx, dy = (x0 - view.x) * view.zoom, (y0 - view.y) * view.zoom
+            if dx or dy:
+                canvas.move("world", dx, dy)
+            self._drawn = (view.zoom, view.x, view.y)
+
+        # 1. ชิ้นส่วนคงที่ (ราง ไฟสัญญาณ ป้าย) ของระดับ LOD ปัจจุบัน
+        level = 0 if view.zoom >= 1.0 else min(self.MAX_LEVEL, int(-math.log2(view.zoom)))
+        if level != self._level:
+            canvas.delete("static")
+            self._items.clear()
+            self._level = level
+        grid, pieces = self._pieces(level)
+        bounds = view.visible(self.MARGIN)
+        wanted = {key for key in grid.query(*bounds) if self._wanted(pieces[key][0])}
+        items = self._items
+        for key in [key for key in items if key not in wanted]:
+            canvas.delete(items.pop(key))
+        created = False
+        for key in wanted:
+            if key not in items:
+                items[key] = self._create(pieces[key])
+                created = True
+        if created:
+            # รางอยู่ล่างสุด (ชานชาลาทับรางพื้นฐาน) รถไฟ ไฟสัญญาณ และป้ายอยู่ด้านบน
+            canvas.tag_lower("track_platform")
+            canvas.tag_lower("track_base")
+
+        # 2. รถไฟ: แสดงเฉพาะขบวนที่มีไทล์อยู่ในช่องที่เห็น
+        self._visible_cells = self.train_grid.cell_range(*bounds)
+        shown = self.train_grid.query(*bounds)
+        for train_id in self._shown - shown:
+            self.sprites[train_id].hide()
+        self._shown &= shown
+        trains = self.sim.trains
+        for train_id in shown - self._shown:
+            if train_id in trains:
+                self._sync(trains[train_id])
+
+    def _wanted(self, kind):
+        """ชิ้นส่วนชนิดนี้วาดที่ระดับซูมปัจจุบันหรือไม่ (LOD)"""
+        if kind == "label":
+            return self.view.zoom >= self.LABEL_ZOOM
+        if kind == "signal":
+            return self.view.zoom >= self.SIGNAL_ZOOM
+        return True
+
+    def _pieces(self, level):
+        """
+        ชิ้นส่วนคงที่ของระดับ LOD: รางตัดเป็นท่อนตามช่องกริด (ลดจุดที่อยู่บนเส้นตรงเดียวกันออก)
+        ไฟสัญญาณและป้ายเป็นจุดเดียว คืนค่า (SpatialGrid, รายการ (ชนิด, พิกัดโลก, ข้อมูล))
+        """
+        if level in self._levels:
+            return self._levels[level]
+        sim, ts = self.sim, self.sim.ts
+        grid = SpatialGrid(self.CELL_PX * 2 ** level)
+        pieces = []
+
+        def add(kind, coords, data=None):
+            grid.add(grid.cell_of(coords[0], coords[1]), len(pieces))
+            pieces.append((kind, coords, data))
+
+        if self._base_paths is None:
+            self._base_paths = [functools.reduce(operator.add, segments) for segments in sim.layout.draw]
+        for path in self._base_paths:
+            for coords in self._split(path, grid):
+                add("track_base", coords)
+        for platform, path in sim.layout.platform_tracks.items():
+            for coords in self._split(path, grid):
+                add("track_platform", coords, platform)
+        for name, signal in sim.layout.signals.items():
+            add("signal", [ts * v for v in signal["at"]], name)
+            label_at = signal.get("label_at", (signal["at"][0], signal["at"][1] + 1.5))
+            add("label", [ts * v for v in label_at], (signal.get("label", name), 9))
+        for platform, spec in sim.layout.platforms.items():
+            if "label_at" in spec:
+                add("label", [ts * v for v in spec["label_at"]], (spec.get("label", f"ชานชาลา {platform}"), 11))
+        self._levels[level] = grid, pieces
+        return grid, pieces
+
+    @staticmethod
+    def _split(path, grid):
+        """ตัดเส้นทางเป็นท่อนตามช่องกริด (แต่ละท่อนต่อถึงจุดแรกของท่อนถัดไป เส้นจึงไม่ขาด)"""
+        centres = path.centres()
+        runs, coords, current = [], [], None
+        for i in range(0, len(centres), 2):
+            x, y = centres[i], centres[i + 1]
+            cell = grid.cell_of(x, y)
+            if cell != current:
+                if coords:
+                    coords += (x, y)
+                    runs.append(coords)
+                coords, current = [x, y], cell
+            else:
+                coords += (x, y)
+        if len(coords) >= 4:
+            runs.append(coords)
+        return [Viewport.simplify(coords) for coords in runs]
+
+    def _create(self, piece):
+        """สร้าง canvas item ของชิ้นส่วนคงที่ 1 ชิ้นตามมุมมองปัจจุบัน"""
+        kind, coords, data = piece
+        canvas, zoom = self.canvas, self.view.zoom
+        points = self.view.to_screen(coords)
+        if kind == "track_base":
+            return canvas.create_line(points, fill="gray", width=max(1.0, self.track_width * zoom),
+                                      tags=("track_base", "static", "world"))
+        if kind == "track_platform":
+            return canvas.create_line(points, fill="gray", width=max(1.0, self.track_width * zoom),
+                                      tags=("track_platform", f"platform:{data}", "static", "world"))
+        x, y = points
+        if kind == "signal":
+            r = self.sim.ts * 0.5 * zoom
+            return canvas.create_oval(x - r, y - r, x + r, y + r, fill=self.signal_colors.get(data, "red"), outline="",
+                                      tags=("signal", f"signal:{data}", "static", "world"))
+        text, size = data
+        return canvas.create_text(x, y, text=text, fill="white", font=("Arial", size), tags=("label", "static", "world"))
+
+    def _track(self, train):
+        """
+        นับไทล์ของขบวนลงช่องกริด (เฉพาะไทล์ที่หัวเพิ่งเข้า/หางเพิ่งออก) และคืนค่า True ถ้าขบวนอยู่ในจอ
+        """
+        counts = self._train_cells.setdefault(train.id, {})
+        path, tail, head = train.path, train.tail, train.head
+        old = self._train_windows.get(train.id)
+        if old is not None and old[0] is path and old[1] <= tail <= old[2] <= head:
+            enter, leave = range(old[2], head), range(old[1], tail)
+        else:
+            if old is not None:
+                for i in range(old[1], old[2]):
+                    self._count(train.id, counts, old[0].ids[i], -1)
+            enter, leave = range(tail, head), ()
+        ids = path.ids
+        for i in enter:
+            self._count(train.id, counts, ids[i], 1)
+        for i in leave:
+            self._count(train.id, counts, ids[i], -1)
+        self._train_windows[train.id] = (path, tail, head)
+        cx0, cy0, cx1, cy1 = self._visible_cells
+        return any(cx0 <= cx <= cx1 and cy0 <= cy <= cy1 for cx, cy in counts)
+
+    def _count(self, train_id, counts, tile_id, delta):
+        centres = self.sim.geometry.centres
+        cell = self.train_grid.cell_of(centres[2 * tile_id], centres[2 * tile_id + 1])
+        n = counts.get(cell, 0) + delta
+        if n:
+            counts[cell] = n
+            if n == 1 and delta > 0:
+                self.train_grid.add(cell, train_id)
+        else:
+            del counts[cell]
+            self.train_grid.discard(cell, train_id)
+
+    def _untrack(self, train_id):
+        """ลบขบวนออกจากกริด"""
+        for cell in self._train_cells.pop(train_id, ()):
+            self.train_grid.discard(cell, train_id)
+        self._train_windows.pop(train_id, None)
+        self._shown.discard(train_id)
+
+
+# คลาสสำหรับภาพรถไฟ 1 ขบวนบน canvas (ใช้ canvas item เดียวตลอดอายุของขบวน)
+class TrainSprite:
+    def __init__(self, canvas, ts, tags="train", view=None):
+        """
+        - canvas: พื้นที่วาดรูปของ tkinter
+        - ts: ขนาดไทล์ (ใช้เป็นความหนาของเส้นรถไฟ)
+        - view: Viewport ที่ใช้แปลงพิกัด (None = วาดตามพิกัดเดิม)
+        """
+        self.canvas = canvas
+        self.width = ts
+        self.tags = tags
+        self.view = view
+        self.item = None     # id ของ canvas item (สร้างครั้งแรกตอนวาด)
+        self.color = None    # สีที่วาดอยู่ตอนนี้ (เปลี่ยนเฉพาะเมื่อสีต่างจากเดิม)
+        self.hidden = False
+        # บัฟเฟอร์พิกัดแบบเพิ่มทีละส่วน: เติมหัวใหม่ด้านขวา ตัดหางทิ้งด้านซ้าย
+        self.coords = collections.deque()  # พิกัดกึ่งกลาง x, y เรียงต่อกัน
+        self.path = None  # หน้าต่าง path[tail:head] ที่วาดอยู่ตอนนี้
+        self.tail = 0
+        self.head = 0
+
+    def _rebuild(self, path, tail, head):
+        """สร้างบัฟเฟอร์ใหม่ทั้งหมด (ใช้เมื่อเปลี่ยน path หรือหน้าต่างกระโดด)"""
+        self.coords = collections.deque(path.centres()[2 * tail:2 * head])
+
+    def sync(self, path, tail, head, color, head_frac=0.0, tail_frac=0.0):
+        """
+        อัปเดตภาพให้ตรงกับตัวรถไฟ path[tail:head] (TrackPath + หน้าต่างหาง/หัว)
+        - head_frac, tail_frac: เลื่อนปลายหัว/หางไปทางไทล์ถัดไปตามเศษส่วนนี้ (ใช้วาดระหว่าง tick)
+        """
+        coords = self.coords
+        
+        if path is self.path and self.tail <= tail <= self.head <= head:
+            # 1. เพิ่มหัวใหม่ (เฉพาะไทล์ที่เพิ่งวิ่งเข้า)
+            if head > self.head:
+                coords.extend(path.centres()[2 * self.head:2 * head])
+            # 2. ตัดหางที่พ้นไปแล้ว
+            for _ in range(2 * (tail - self.tail)):
+                coords.popleft()
+        else:
+            # 3. ขบวนใหม่หรือเปลี่ยน path: สร้างใหม่ทั้งหมด
+            self._rebuild(path, tail, head)
+        self.path, self.tail, self.head = path, tail, head
+        
+        # 4. วาดเป็นเส้นหนาเฉพาะเมื่อยาวมากกว่า 1 ไทล์
+        if head - tail < 2:
+            self.hide()
+            return
+        points = self.coords
+        if head_frac or tail_frac:
+            points = self._interpolated(path, tail, head, head_frac, tail_frac)
+        view = self.view
+        if view is not None and not view.identity:
+            points = view.to_screen(list(points))
+            if view.zoom < 1.0:
+                points = Viewport.simplify(points)  # ซูมออก: เหลือแค่จุดหักมุม
+        if self.item is None:
+            self.item = self.canvas.create_line(
+                list(points), fill=color, width=self.width,
+                capstyle=tk.ROUND, joinstyle=tk.ROUND, tags=self.tags
+            )
+            self.color, self.hidden = color, False
+            return
+        
+        self.canvas.coords(self.item, list(points))
+        # เปลี่ยน option เฉพาะที่ต่างจากเดิม (รวมเป็นการเรียกครั้งเดียว)
+        changes = {}
+        if color != self.color:
+            changes["fill"] = self.color = color
+        if self.hidden:
+            changes["state"] = "normal"
+            self.hidden = False
+        if changes:
+            self.canvas.itemconfig(self.item, **changes)
+
+    def _interpolated(self, path, tail, head, head_frac, tail_frac):
+        """พิกัดของตัวรถไฟที่ปลายหางและหัวเลื่อนไปทางไทล์ถัดไปบางส่วน"""
+        centres = path.centres()
+        points = list(self.coords)
+        if tail_frac:
+            i = 2 * tail
+            points[0] += (centres[i + 2] - centres[i]) * tail_frac
+            points[1] += (centres[i + 3] - centres[i + 1]) * tail_frac
+        if head_frac:
+            i = 2 * head
+            points.append(centres[i - 2] + (centres[i] - centres[i - 2]) * head_frac)
+            points.append(centres[i - 1] + (centres[i + 1] - centres[i - 1]) * head_frac)
+        return points
+
+    def hide(self):
+        """ซ่อนรถไฟ (เก็บ item ไว้ใช้ต่อ)"""
+        if self.item is not None and not self.hidden:
+            self.canvas.itemconfig(self.item, state="hidden")
+        self.hidden = True
+
+    def delete(self):
+        """ลบ item ออกจาก canvas"""
+        if self.item is not None:
+            self.canvas.delete(self.item)
+        self.item = None
+        self.path = None
+        self.coords.clear()
+
+
+# คลาสที่จัดการหน้าจอ GUI (ปุ่ม, หน้าต่าง, Log)
+class TrainApp:
+    
+    LOG_MAX_LINES = 500  # จำนวนบรรทัดสูงสุดในกล่อง Log (บรรทัดเก่าถูกตัดทิ้ง)
+    LOG_FLUSH_MS = 16  # แสดง log ใหม่ลงกล่อง Log อย่างมากเฟรมละครั้ง (~60 fps)
+    FRAME_MS = 16  # รอบการวาดขณะมีรถไฟวิ่ง (~60 fps ตามรอบจอ ไม่ขึ้นกับ TICK_MS ของ Simulator)
+    SIM_BUDGET_MS = 8  # เวลาจริงสูงสุดต่อเฟรมที่ให้ Simulator ใช้ (ที่เหลือให้ Tk จัดการเหตุการณ์)
+    TIME_SCALE_MIN = 0.1  # ช้าสุด (slow motion)
+    TIME_SCALE_MAX = 1000.0  # เร็วสุด (fast-forward)
+    LOOP_PROBE_MS = 100  # รอบของตัววัด event-loop lag (after() ที่ควรถูกเรียกทุก 100 ms)
+    OVERLAY_MS = 500  # รอบการอัปเดต overlay สถิติ (F3)
+    METRICS_EXPORT_MS = 5000  # รอบการเขียนไฟล์ metrics แบบ Prometheus
+    DRAW_SAMPLE = 16  # จับเวลา draw_train 1 ครั้งทุก 16 ครั้ง
+    ZOOM_STEP = 1.25  # อัตราซูมต่อ 1 คลิกล้อเมาส์ / ปุ่ม +/-
+    
+    def __init__(self, root, log_path=None, record_path=None, metrics_path=None, layout=None, timeline_path=None):
+        """
+        ตั้งค่าหน้าต่างโปรแกรม (GUI) ทั้งหมด
+        - root: หน้าต่างหลักของ tkinter
+        - log_path: ไฟล์ JSONL สำหรับบันทึก log (None = ไม่เขียนไฟล์)
+        - record_path: ไฟล์บันทึกคำสั่งสำหรับเล่นซ้ำ (None = ไม่บันทึก)
+        - timeline_path: ไฟล์เส้นเวลาของขบวน (TrainTimeline) (None = ไม่บันทึก)
+        - metrics_path: ไฟล์ metrics แบบ Prometheus ที่เขียนทุก METRICS_EXPORT_MS (None = ไม่เขียน)
+        - layout: ไฟล์เลย์เอาต์สถานี (None = สถานีปากน้ำ)
+        """
+        self.root = root
+        
+        # --- Instrumentation: จับเวลา callback บน thread ของ Tk (overlay = F3, cProfile = F4) ---
+        self.stats = Instrumentation()
+        self.metrics_path = metrics_path
+        self.log_message = self.stats.wrap(self.log_message, "log_message")
+        self._flush_log = self.stats.wrap(self._flush_log, "flush_log")
+        
+        # --- Log: บัฟเฟอร์วงแหวนในหน่วยความจำ + ไฟล์ JSONL (เขียนจาก thread เบื้องหลัง) ---
+        self.log_buffer = LogBuffer(self.LOG_MAX_LINES)
+        self.log_sink = JsonlFileSink(log_path) if log_path else None
+        self._log_flush_id = None  # id ของ after() ที่รอแสดง log รอบถัดไป
+        self._log_lines = 0  # จำนวนบรรทัดที่อยู่ในกล่อง Log ตอนนี้
+        self.root.title("🚉 ระบบควบคุมสถานีรถไฟ (Interlocking)")
+        self.root.attributes('-fullscreen', True)  # เต็มจอ
+        self.screen_width = self.root.winfo_screenwidth()
+        self.screen_height = self.root.winfo_screenheight()
+
+        # --- สร้าง Frame หลัก ---
+        self.main_frame = tk.Frame(root, bg="black")
+        self.main_frame.pack(fill="both", expand=True)
+
+        # 1. Canvas (ส่วนวาดรูป)
+        self.canvas = tk.Canvas(self.main_frame, width=self.screen_width, height=self.screen_height * 0.85, bg="black", borderwidth=0, highlightthickness=0)
+        self.canvas.pack(side="top", fill="x")
+
+        # 2. Log Frame (ส่วนแสดงข้อความ)
+        log_frame_height = self.screen_height * 0.15
+        self.log_frame = tk.Frame(self.main_frame, height=log_frame_height, bg="#111")
+        self.log_frame.pack(side="bottom", fill="x")
+        self.log_frame.pack_propagate(False)  # กัน Frame หดตัว
+
+        # สร้าง Text widget และ Scrollbar สำหรับ Log
+        log_scroll = tk.Scrollbar(self.log_frame, orient="vertical")
+        self.log_text = tk.Text(self.log_frame, bg="#111", fg="white", font=("Arial", 10),
+                                  wrap="word", yscrollcommand=log_scroll.set, state="disabled",
+                                  borderwidth=0, highlightthickness=0)
+        log_scroll.config(command=self.log_text.yview)
+        
+        log_scroll.pack(side="right", fill="y")
+        self.log_text.pack(side="left", fill="both", expand=True, padx=10, pady=5)
+        
+        self.log("APP", "Application started. Welcome, controller.")
+        
+        # --- สร้าง Simulator ---
+        # ส่ง canvas (ผ่านตัวนับจำนวนการเรียก) และฟังก์ชัน log_message ไปให้ Simulator ใช้งาน
+        self.canvas_counter = CountingCanvas(self.canvas)
+        self.sim = TrainSimulator(self.canvas_counter, self.screen_width, self.screen_height, self.log_message, layout)
+        self.recorder = SessionRecorder(record_path, self.sim) if record_path else None
+        self.timeline = None
+        if timeline_path:
+            self.timeline = TrainTimeline(timeline_path, started=self.sim.now)
+            self.timeline.attach(self.sim)
+        
+        # ผูกปุ่ม Escape เพื่อออกจากโหมดเต็มจอ
+        self.root.bind("<Escape>", self.close_fullscreen)
+        self.root.bind("<F3>", self.toggle_overlay)
+        self.root.bind("<F4>", self.toggle_profile)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        
+        # --- แผนที่ (ราง ไฟสัญญาณ ป้าย รถไฟ) ซูม/เลื่อนได้ วาดเฉพาะส่วนที่อยู่ในจอ ---
+        # ล้อเมาส์ = ซูมรอบเมาส์, ลากเมาส์ซ้าย = เลื่อน, +/- = ซูมกลางจอ, 0 = มุมมองเริ่มต้น, Home = ทั้งเลย์เอาต์
+        layout = self.sim.layout
+        self.sim.renderer.enable_viewport(self.screen_width, self.screen_height * 0.85)
+        self._drag = None
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", self._on_wheel)
+        self.canvas.bind("<Button-5>", self._on_wheel)
+        self.canvas.bind("<ButtonPress-1>", self._on_drag_start)
+        self.canvas.bind("<B1-Motion>", self._on_drag)
+        for key, factor in (("<plus>", self.ZOOM_STEP), ("<equal>", self.ZOOM_STEP), ("<minus>", 1 / self.ZOOM_STEP)):
+            self.root.bind(key, lambda event, f=factor: self._zoom(f))
+        self.root.bind("<Key-0>", lambda event: self._view(self.sim.renderer.reset_view))
+        self.root.bind("<Home>", lambda event: self._view(self.sim.renderer.fit))
+        
+        # --- ป้ายชื่อและสถานะ ---
+        self.status_label = tk.Label(self.canvas, text="สถานะ: พร้อม",bg="black", font=("Arial", 12, "bold"), fg="green")
+        self.canvas.create_window(self.screen_width / 2, self.screen_height * 0.73, window=self.status_label)
+        
+        self.station_name_label = tk.Label(self.canvas, text=layout.name,bg="black", font=("Arial", 36, "bold"), fg="cyan")
+        self.canvas.create_window(self.screen_width / 2, self.screen_height * 0.1, window=self.station_name_label)
+        
+        self.clock_label = tk.Label(self.canvas, text="", bg="black", font=("Arial", 18, "bold"), fg="white")
+        self.canvas.create_window(self.screen_width / 2, self.screen_height * 0.1 + 50, window=self.clock_label)
+        
+        
+        # --- สร้างปุ่มควบคุม ---
+        btn_y_pos = self.screen_height * 0.78 # ตำแหน่ง Y ของปุ่ม
+        btn_font = ("Arial", 10, "bold")
+        
+        # ปุ่มตั้งเส้นทางเข้า (Inbound) และปุ่มตั้งเส้นทางออก (Outbound) แถวละ 1 ชานชาลา
+        self.btn_route = {}
+        self.btn_depart = {}
+        for platform, spec in layout.platforms.items():
+            button = spec.get("button", f"P{platform}")
+            self.btn_route[platform] = tk.Button(self.canvas, text=f"เส้นทางเข้า {button}", width=20, command=lambda p=platform: self.handle_route_in(p), font=btn_font, relief="raised", bg="#c7d2fe", fg="black")
+            self.btn_depart[platform] = tk.Button(self.canvas, text=f"ออกเส้นทาง P{platform}", width=20, command=lambda p=platform: self.handle_route_out(p), font=btn_font, relief="raised", bg="#bbf7d0", fg="black", state="disabled")
+        
+        # ปุ่มเรียกรถไฟ (Arrive)
+        self.btn_arrive = tk.Button(self.canvas, text="รถไฟเข้า", width=20, command=self.handle_arrive, font=btn_font, relief="raised", bg="#fef08a", fg="black", state="disabled")
+        
+        # ปุ่มหยุดฉุกเฉิน
+        self.btn_emergency = tk.Button(self.canvas, text="!! หยุดฉุกเฉิน !!", width=20, command=self.handle_emergency, font=btn_font, relief="raised", bg="#dc2626", fg="white")
+
+        # --- จัดวางปุ่มลงบน Canvas ---
+        for row, platform in enumerate(layout.platforms):
+            self.canvas.create_window(self.screen_width * 0.35, btn_y_pos + 40 * row, window=self.btn_route[platform])
+            self.canvas.create_window(self.screen_width * 0.65, btn_y_pos + 40 * row, window=self.btn_depart[platform])
+        
+        self.canvas.create_window(self.screen_width * 0.5, btn_y_pos, window=self.btn_arrive)
+        self.canvas.create_window(self.screen_width * 0.5, btn_y_pos + 40, window=self.btn_emergency)
+        
+        # ป้ายแสดงจำนวนการเรียก Tk ต่อวินาที (ใช้ดูว่า UI ว่างจริงหรือไม่)
+        self.tk_calls = 0  # จำนวนการเรียก Tk ในวินาทีปัจจุบัน
+        self.tk_calls_per_sec = 0  # จำนวนการเรียก Tk ของวินาทีที่แล้ว
+        self.ui_stats_label = tk.Label(self.canvas, text="", bg="black", font=("Arial", 8), fg="#555")
+        self.canvas.create_window(self.screen_width - 10, self.screen_height * 0.83, window=self.ui_stats_label, anchor="e")
+        
+        # ตัวปรับความเร็วเวลาจำลอง (สเกล log10: -1 = x0.1, 0 = x1, 3 = x1000)
+        self.time_scale = 1.0
+        self.time_scale_label = tk.Label(self.canvas, text="x1", bg="black", font=("Arial", 10, "bold"), fg="white", width=6)
+        self.time_scale_slider = tk.Scale(self.canvas, from_=-1, to=3, resolution=0.1, orient="horizontal",
+                                          showvalue=False, length=160, bg="black", highlightthickness=0,
+                                          command=lambda value: self.set_time_scale(10 ** float(value)))
+        self.time_scale_slider.set(0)
+        self.canvas.create_window(self.screen_width * 0.85, btn_y_pos, window=self.time_scale_slider)
+        self.canvas.create_window(self.screen_width * 0.85 + 120, btn_y_pos, window=self.time_scale_label)
+        
+        # ค่าที่ตั้งให้ widget ไว้ล่าสุด (ใช้เทียบเพื่อสั่ง Tk เฉพาะส่วนที่เปลี่ยน)
+        self._widget_cache = {}
+        self._ui_pending = False  # มีการอัปเดต UI รออยู่ใน after_idle แล้วหรือยัง
+        
+        # --- เริ่มการทำงาน ---
+        self.sim.draw_base_tracks() # วาด Track ครั้งแรก
+        self.sim.subscribe(self._on_sim_event)  # อัปเดต UI เมื่อ Simulator แจ้งว่าสถานะเปลี่ยน
+        # นาฬิกาจำลอง = _sim_base + (เวลาจริงที่ผ่านไปนับจาก _wall_base) × time_scale
+        self._sim_base = self.sim.now
+        self._wall_base = time.monotonic()
+        self._sim_after_id = None   # id ของ after() ที่รอเดินนาฬิกาจำลองรอบถัดไป
+        if self.sim.renderer:
+            self.sim.renderer.interpolate = True  # วาดตามรอบจอใน _run_sim แทนการวาดทุก tick
+        self._instrument()
+        self._update_time()         # เริ่ม Loop นาฬิกา
+        self._update_ui()           # ตั้งค่า UI ครั้งแรก
+
+    def log(self, category, message, **data):
+        """บันทึก log ของฝั่ง GUI (เช่น APP, CONTROL)"""
+        self.log_message(LogRecord(category, message, data=data))
+
+    def log_message(self, record):
+        """
+        รับ log 1 รายการ (LogRecord หรือข้อความธรรมดา) เข้าบัฟเฟอร์
+        ไม่แตะ Text widget ตรงนี้ แต่รวบรวมไว้แสดงทีเดียวใน _flush_log (อย่างมากเฟรมละครั้ง)
+        """
+        if not isinstance(record, LogRecord):
+            record = LogRecord("", str(record))
+        self.log_buffer.append(record)
+        if self.log_sink is not None:
+            self.log_sink.emit(record)
+        if self._log_flush_id is None:
+            self._log_flush_id = self.root.after(self.LOG_FLUSH_MS, self._flush_log)
+
+    def _flush_log(self):
+        """แสดง log ที่ค้างอยู่ลงกล่อง Log ด้วยการ insert ครั้งเดียว แล้วตัดบรรทัดเก่าที่เกินออก"""
+        self._log_flush_id = None
+        records = self.log_buffer.drain()
+        if not records:
+            return
+        try:
+            text = "".join(
+                f"[{datetime.datetime.fromtimestamp(r.wall).strftime('%H:%M:%S')}] {r.text}\n"
+                for r in records
+            )
+            self.log_text.config(state="normal")  # เปิดให้แก้ไข
+            self.log_text.insert(tk.END, text)  # เพิ่มข้อความทั้งหมดในครั้งเดียว
+            self._log_lines += len(records)
+            excess = self._log_lines - self.LOG_MAX_LINES
+            if excess > 0:
+                self.log_text.delete("1.0", f"{excess + 1}.0")  # ตัดบรรทัดเก่าสุดทิ้ง
+                self._log_lines -= excess
+            self.log_text.see(tk.END)  # เลื่อนไปล่างสุด
+            self.log_text.config(state="disabled") # ปิดการแก้ไข
+            self.tk_calls += 4 + (excess > 0)
+        except Exception as e:
+            print(f"Log Error: {e}")  # พิมพ์ error ถ้า GUI พัง
+
+    def close(self):
+        """ปิดโปรแกรม: เขียน log และบันทึกคำสั่งที่ค้างลงไฟล์ให้หมดก่อนปิดหน้าต่าง"""
+        if self.recorder is not None:
+            self._catch_up()
+            self.recorder.close()
+        if self.stats.profiler is not None:
+            self.toggle_profile()
+        if self.metrics_path:
+            self._export_metrics(reschedule=False)
+        if self.timeline is not None:
+            self.timeline.close()
+        if self.log_sink is not None:
+            self.log_sink.close()
+        self.root.destroy()
+
+    def close_fullscreen(self, event=None):
+        """ออกจากโหมดเต็มจอ (เมื่อกด Escape)"""
+        self.log("APP", "Closing fullscreen.")
+        self.root.attributes('-fullscreen', False)
+
+    
+    def _sim_time_now(self):
+        """เวลาจำลองที่ตรงกับเวลาจริงตอนนี้ (ms) ตาม time scale"""
+        return self._sim_base + (time.monotonic() - self._wall_base) * 1000 * self.time_scale
+
+    def set_time_scale(self, scale):
+        """ตั้งความเร็วเวลาจำลองเทียบกับเวลาจริง (0.1x - 1000x) โดยไม่ให้นาฬิกากระโดด"""
+        scale = min(self.TIME_SCALE_MAX, max(self.TIME_SCALE_MIN, scale))
+        self._sim_base, self._wall_base = self._sim_time_now(), time.monotonic()
+        self.time_scale = scale
+        self._apply("time_scale", self.time_scale_label, text=f"x{scale:.3g}")
+        self._schedule_sim()
+
+    def _catch_up(self):
+        """
+        เดินนาฬิกาจำลองให้ทันเวลาจริง (คูณ time scale) โดยใช้เวลาจริงไม่เกิน SIM_BUDGET_MS
+        ถ้าทำไม่ทัน (เช่น x1000 กับรถไฟหลายขบวน) จะเลื่อนจุดอ้างอิงของนาฬิกามาที่เวลาที่ทำถึง
+        คือยอมให้เวลาจำลองเดินช้ากว่าที่ตั้งไว้ แทนการแย่งเวลาของ Tk จนหน้าจอค้าง
+        """
+        sim = self.sim
+        target = self._sim_time_now()
+        deadline = time.perf_counter() + self.SIM_BUDGET_MS / 1000
+        while True:
+            next_time = sim.next_event_time()
+            if next_time is None or next_time > target:
+                break
+            sim.step()
+            if time.perf_counter() > deadline:
+                self._sim_base, self._wall_base = sim.now, time.monotonic()
+                return
+        sim.run_until(target)
+
+    def _run_sim(self):
+        """
+        เดินนาฬิกาจำลองให้ทันเวลาจริง วาดเฟรม แล้วตั้งเวลาปลุกตัวเองรอบถัดไป
+        (ถ้าไม่มีรถไฟวิ่งและคิวว่างจะไม่ปลุก ทำให้ CPU ว่างจริง)
+        """
+        self._sim_after_id = None
+        self._catch_up()
+        if self.sim.renderer:
+            self.sim.renderer.render_frame()
+        calls = self.canvas_counter.calls
+        self.canvas_calls.observe(calls - self._canvas_calls_mark)
+        self._canvas_calls_mark = calls
+        self._schedule_sim()
+
+    def _schedule_sim(self):
+        """
+        ตั้ง after() ให้ _run_sim ทำงานรอบถัดไป:
+        มีรถไฟวิ่งอยู่ = ทุก FRAME_MS (วาดตามรอบจอ), ไม่มี = ตอนเหตุการณ์ถัดไปของ Simulator
+        """
+        if self._sim_after_id is not None:
+            self.root.after_cancel(self._sim_after_id)
+            self._sim_after_id = None
+        if self.sim.moving:
+            self._sim_after_id = self.root.after(self.FRAME_MS, self._run_sim)
+            return
+        next_time = self.sim.next_event_time()
+        if next_time is not None:
+            delay = max(1, int((next_time - self._sim_time_now()) / self.time_scale))
+            self._sim_after_id = self.root.after(delay, self._run_sim)
+
+    def _sim_command(self, command, *args):
+        """เดินนาฬิกาจำลองให้ทันเวลาจริง สั่งคำสั่ง วาด แล้วตั้งเวลาปลุกรอบถัดไปใหม่ คืนค่าผลของคำสั่ง"""
+        self._catch_up()
+        if self.recorder is not None:
+            self.recorder.record(command.__name__, args)
+        result = command(*args)
+        if self.sim.renderer:
+            self.sim.renderer.render_frame()
+        self._schedule_sim()
+        return result
+
+    def _update_time(self):
+        """อัปเดตนาฬิกา (เรียกตัวเองทุก 1 วินาที)"""
+        time_str = datetime.datetime.now().strftime("%H:%M:%S")
+        now = f"เวลาปัจจุบัน: {time_str}"
+        self._apply("clock", self.clock_label, text=now)
+        
+        # สรุปจำนวนการเรียก Tk ของวินาทีที่ผ่านมา
+        self.tk_calls_per_sec, self.tk_calls = self.tk_calls, 0
+        self._apply("ui_stats", self.ui_stats_label, text=f"UI: {self.tk_calls_per_sec} Tk calls/s")
+        self.root.after(1000, self._update_time)  # เรียกใหม่ในอีก 1000ms
+    
+    # --- Instrumentation (overlay, metrics, cProfile) ---
+
+    def _instrument(self):
+        """ห่อ callback หลักบน thread ของ Tk ให้จับเวลา และเตรียมฮิสโตแกรม jitter / lag / การเรียก canvas"""
+        stats, sim = self.stats, self.sim
+        move_train = stats.wrap(sim._move_train, "move_train")
+
+        @functools.wraps(move_train)  # __wrapped__ ชี้กลับไปที่ sim._move_train ให้ checkpoint() รู้จักเหตุการณ์ tick
+        def timed_tick():
+            self._observe_tick()
+            move_train()
+        sim._move_train = timed_tick  # tick loop เรียกผ่าน self._move_train จึงใช้ตัวที่ห่อไว้
+        if sim.renderer:
+            # draw_train ถูกเรียกทุกครั้งที่รถไฟเลื่อน 1 ไทล์ จึงจับเวลาแค่ 1 ใน DRAW_SAMPLE ครั้ง
+            sim.renderer.draw_train = stats.wrap(sim.renderer.draw_train, "draw_train", sample=self.DRAW_SAMPLE)
+            sim.renderer.render_frame = stats.wrap(sim.renderer.render_frame, "render_frame")
+        self._update_ui = stats.wrap(self._update_ui, "update_ui")
+        self._run_sim = stats.wrap(self._run_sim, "run_sim")
+
+        self.tick_jitter = stats.histogram(
+            "tick_jitter_seconds", f"Deviation of wall time between ticks from TICK_MS ({sim.TICK_MS} ms) / time scale.")
+        self.loop_lag = stats.histogram(
+            "loop_lag_seconds", f"Delay of a {self.LOOP_PROBE_MS} ms after() probe beyond its due time.")
+        self.canvas_calls = stats.histogram(
+            "canvas_calls_per_frame", "Canvas calls made by the renderer per frame.", Histogram.COUNTS, scale=1)
+        self._canvas_calls_mark = 0
+        self._last_tick = None  # (เวลาจำลอง, เวลาจริง) ของ tick ก่อนหน้า
+        self._probe_id = None
+        self._probe_due = None
+        self.overlay_visible = False
+        self._overlay_id = None
+        self.overlay_item = self.canvas.create_text(10, 10, anchor="nw", text="", fill="#4ade80",
+                                                    font=("Courier", 9), state="hidden", tags="overlay")
+        if self.metrics_path:
+            self.root.after(self.METRICS_EXPORT_MS, self._export_metrics)
+        self._update_probe()
+
+    def _observe_tick(self):
+        """tick jitter: ระยะเวลาจริงระหว่าง tick ที่ติดกัน เทียบกับ TICK_MS หารด้วย time scale"""
+        sim, wall = self.sim, time.perf_counter()
+        last = self._last_tick
+        if last is not None and abs(sim.now - last[0] - sim.TICK_MS) < 1e-6:
+            self.tick_jitter.observe(abs((wall - last[1]) * 1000 - sim.TICK_MS / self.time_scale))
+        self._last_tick = (sim.now, wall)
+
+    def _update_probe(self):
+        """วัด event-loop lag เฉพาะตอน overlay เปิด (probe ปลุก Tk ทุก LOOP_PROBE_MS จึงไม่ให้ทำงานตลอดเวลา)"""
+        active = self.overlay_visible
+        if active and self._probe_id is None:
+            self._probe_due = None
+            self._probe_loop()
+        elif not active and self._probe_id is not None:
+            self.root.after_cancel(self._probe_id)
+            self._probe_id = None
+
+    def _probe_loop(self):
+        """event-loop lag: after() ที่ตั้งไว้ LOOP_PROBE_MS ถูกเรียกช้ากว่ากำหนดเท่าไร"""
+        now = time.perf_counter()
+        if self._probe_due is not None:
+            self.loop_lag.observe(max(0.0, (now - self._probe_due) * 1000))
+        self._probe_due = now + self.LOOP_PROBE_MS / 1000
+        self._probe_id = self.root.after(self.LOOP_PROBE_MS, self._probe_loop)
+
+    def toggle_overlay(self, event=None):
+        """เปิด/ปิด overlay สถิติบน canvas (F3)"""
+        self.overlay_visible = not self.overlay_visible
+        if self.overlay_visible:
+            self._refresh_overlay()
+        else:
+            if self._overlay_id is not None:
+                self.root.after_cancel(self._overlay_id)
+                self._overlay_id = None
+            self.canvas.itemconfig(self.overlay_item, state="hidden")
+        self._update_probe()
+
+    def _refresh_overlay(self):
+        self.canvas.itemconfig(self.overlay_item, text=self._overlay_text(), state="normal")
+        self.canvas.tag_raise(self.overlay_item)
+        self.tk_calls += 2
+        self._overlay_id = self.root.after(self.OVERLAY_MS, self._refresh_overlay)
+
+    def _overlay_text(self):
+        """ข้อความของ overlay: ตาราง p50 / p99 / max ของทุกฮิสโตแกรม"""
+        def row(name, hist, unit_scale=1.0, digits=2):
+            cells = [hist.quantile(0.5), hist.quantile(0.99), hist.max if hist.count else None]
+            text = "".join("      -" if v is None else f"{v * unit_scale:7.{digits}f}" for v in cells)
+            return f"{name:<22}{hist.count:>8}{text}"
+
+        lines = [f"{'callback (ms)':<22}{'n':>8}{'p50':>7}{'p99':>7}{'max':>7}"]
+        for label, hist in self.stats.metrics["callback_seconds"][3].items():
+            lines.append(row(label.split('"')[1], hist))
+        lines.append(row(f"tick jitter ({self.sim.TICK_MS} ms)", self.tick_jitter))
+        lines.append(row(f"loop lag ({self.LOOP_PROBE_MS} ms)", self.loop_lag))
+        lines.append(row("canvas calls/frame", self.canvas_calls, digits=0))
+        profile = "ON" if self.stats.profiler is not None else "off"
+        lines.append(f"x{self.time_scale:.3g}  trains {len(self.sim.trains)}  Tk calls/s {self.tk_calls_per_sec}"
+                     f"  cProfile {profile} (F4)")
+        return "\n".join(lines)
+
+    def _export_metrics(self, reschedule=True):
+        """เขียน metrics ทั้งหมดลงไฟล์แบบ Prometheus text (ให้ node_exporter textfile collector อ่าน)"""
+        stats, sim = self.stats, self.sim
+        stats.set("sim_ticks", "Simulator ticks since start.", sim.ticks)
+        stats.set("trains", "Trains on the map.", len(sim.trains))
+        stats.set("time_scale", "Simulated time per wall time.", self.time_scale)
+        stats.set("tk_calls_per_second", "Tk widget/canvas configuration calls in the last second.", self.tk_calls_per_sec)
+        stats.set("log_dropped", "Log records dropped before they were shown.", self.log_buffer.dropped)
+        if self.timeline is not None:
+            # ตัวชี้วัดที่สะสมไว้แล้ว (ไม่ต้องสแกนเหตุการณ์ย้อนหลัง)
+            timeline = self.timeline.stats
+            _, headway = timeline.headway()
+            stats.set("headway_seconds", "Rolling mean time between arriving trains.", (headway or 0.0) / 1000)
+            for q in (0.5, 0.95):
+                stats.set("dwell_seconds", "Platform dwell time quantile.", timeline.dwell_quantile(q) or 0.0,
+                          label=f'quantile="{q}"')
+            for platform in sim.layout.platforms:
+                stats.set("platform_occupancy", "Fraction of time the platform was occupied.",
+                          timeline.occupancy(platform, sim.now), label=f'platform="{platform}"')
+        try:
+            stats.write_prometheus(self.metrics_path)
+        except OSError as e:
+            self.log("ERROR", f"Cannot write metrics to {self.metrics_path}: {e}")
+            return
+        if reschedule:
+            self.root.after(self.METRICS_EXPORT_MS, self._export_metrics)
+
+    def toggle_profile(self, event=None):
+        """เริ่ม/หยุดเก็บ cProfile ของ thread GUI (F4) ตอนหยุดจะเขียนไฟล์ parknam-YYYYmmdd-HHMMSS.prof"""
+        if self.stats.profiler is None:
+            self.stats.start_profile()
+            self.log("APP", "cProfile started. Press F4 again to stop and save.")
+        else:
+            path = self.stats.stop_profile(f"parknam-{datetime.datetime.now():%Y%m%d-%H%M%S}.prof")
+            self.log("APP", f"cProfile written to {path}.", path=path)
+
+    # --- ฟังก์ชัน 'Handle' (ตัวกลางเชื่อมปุ่มกับ Simulator) ---
+
+    def handle_route_in(self, platform):
+        """ถูกเรียกเมื่อกดปุ่ม 'เส้นทางเข้า P1/P2'"""
+        self.log("CONTROL", f"Requesting INBOUND route to P{platform}...")
+        return self._sim_command(self.sim.set_route_in, platform) # เรียกฟังก์ชันของ Sim
+
+    def handle_route_out(self, platform):
+        """ถูกเรียกเมื่อกดปุ่ม 'ออกเส้นทาง P1/P2'"""
+        self.log("CONTROL", f"Requesting OUTBOUND route from P{platform}...")
+        return self._sim_command(self.sim.set_route_out, platform) # เรียกฟังก์ชันของ Sim
+        
+    def handle_arrive(self):
+        """ถูกเรียกเมื่อกดปุ่ม 'รถไฟเข้า'"""
+        self.log("CONTROL", f"Simulating train arrival...")
+        return self._sim_command(self.sim.call_train) # เรียกฟังก์ชันของ Sim
+        
+    def handle_emergency(self):
+        """ถูกเรียกเมื่อกดปุ่ม 'หยุดฉุกเฉิน'"""
+        self.log("CONTROL", "!! EMERGENCY STOP PRESSED !!")
+        return self._sim_command(self.sim.emergency_stop) # เรียกฟังก์ชันของ Sim
+
+    
+    def _on_sim_event(self, event, data):
+        """
+        รับเหตุการณ์จาก Simulator (แทนการวน _monitor ทุก 100ms)
+        รวมหลายเหตุการณ์ที่เกิดติดกันให้อัปเดต UI ครั้งเดียวผ่าน after_idle
+        """
+        if not self._ui_pending:
+            self._ui_pending = True
+            self.root.after_idle(self._update_ui)
+
+    def _apply(self, key, widget, **options):
+        """สั่ง widget.config() เฉพาะ option ที่ค่าต่างจากที่ตั้งไว้ครั้งก่อน"""
+        cache = self._widget_cache.setdefault(key, {})
+        changes = {k: v for k, v in options.items() if cache.get(k) != v}
+        if changes:
+            widget.config(**changes)
+            cache.update(changes)
+            self.tk_calls += 1
+
+    def _view(self, change, *args):
+        """เปลี่ยนมุมมองของแผนที่ (ขบวนที่เพิ่งเข้าจอวาดตามเฟรมปัจจุบัน)"""
+        change(*args)
+        self.sim.renderer.render_frame()
+
+    def _zoom(self, factor):
+        self._view(self.sim.renderer.zoom_at, factor, self.screen_width / 2, self.screen_height * 0.85 / 2)
+
+    def _on_wheel(self, event):
+        """ล้อเมาส์: ซูมเข้า/ออกรอบตำแหน่งเมาส์ (Windows/macOS ใช้ delta, X11 ใช้ปุ่ม 4/5)"""
+        zoom_in = event.num == 4 or getattr(event, "delta", 0) > 0
+        self._view(self.sim.renderer.zoom_at, self.ZOOM_STEP if zoom_in else 1 / self.ZOOM_STEP, event.x, event.y)
+
+    def _on_drag_start(self, event):
+        self._drag = (event.x, event.y)
+
+    def _on_drag(self, event):
+        """ลากเมาส์: เลื่อนแผนที่ตามระยะที่ลาก"""
+        if self._drag is None:
+            return
+        x, y = self._drag
+        self._drag = (event.x, event.y)
+        self._view(self.sim.renderer.pan, event.x - x, event.y - y)
+        
+    def _update_ui(self):
+        """
+        ฟังก์ชันสำคัญ: อัปเดตสถานะของ GUI (ปุ่ม, ไฟ, ข้อความ)
+        ตามสถานะ (state) จาก Simulator โดยสั่ง Tk เฉพาะส่วนที่เปลี่ยนจริง
+        """
+        self._ui_pending = False
+        
+        # 1. ดึงสถานะปัจจุบันจาก Simulator
+        state = self.sim.state
+        route = self.sim.route_locked
+        train_id = self.sim.current_train_id
+        
+        # 2. อัปเดตสถานะปุ่ม (เปิด/ปิด) แยกตามชานชาลา (มีรถไฟได้หลายขบวนพร้อมกัน)
+        # เส้นทางที่ไม่ขัดแย้งกับเส้นทางที่ล็อกอยู่ตั้งได้เลย (ตามตาราง interlocking)
+        sim = self.sim
+        for platform, occupied in sim.platform_occupied.items():
+            train = sim.platform_train(platform)
+            docked = occupied and train is not None and train.state == "in_station"
+            # ปุ่มตั้งทางเข้า: เส้นทางเข้า 'ไม่ขัดแย้ง' กับเส้นทางที่ล็อกอยู่ และ ชานชาลา 'ว่าง' (ไม่มีขบวนจอดหรือกำลังเข้า)
+            self._apply(f"btn_route_p{platform}", self.btn_route[platform], state="normal" if sim.route_available(sim.inbound_routes[platform]) and not occupied and train is None else "disabled")
+            # ปุ่มตั้งทางออก: เส้นทางออก 'ไม่ขัดแย้ง' กับเส้นทางที่ล็อกอยู่ และ ชานชาลา 'มีรถจอดอยู่'
+            self._apply(f"btn_depart_p{platform}", self.btn_depart[platform], state="normal" if sim.route_available(sim.outbound_routes[platform]) and docked else "disabled")
+        
+        # ปุ่มรถไฟเข้า: ต้องมี 'เส้นทางเข้า (IN)' ตั้งไว้ และ ยังไม่มีขบวนใช้เส้นทางนั้น
+        self._apply("btn_arrive", self.btn_arrive, state="normal" if sim.pending_inbound_route() else "disabled")
+
+        # ปุ่มฉุกเฉิน: ปิดการใช้งานถ้ากำลังฉุกเฉินอยู่ (รอรีเซ็ต)
+        self._apply("btn_emergency", self.btn_emergency, state="disabled" if state == "emergency" else "normal")
+
+        # 3. อัปเดตไฟสัญญาณ: เขียวเมื่อมีเส้นทางที่ใช้สัญญาณนั้นล็อกอยู่ (ตาราง signals ของ interlocking)
+        # คำนวณสีสุดท้ายของไฟแต่ละดวงครั้งเดียว (ไม่ทาแดงแล้วค่อยทาเขียว ซึ่งทำให้ไฟกะพริบ)
+        # (ไฟที่อยู่นอกจอแค่จำสีไว้ ได้สีนี้ตอนเลื่อนเข้าจอ)
+        for name, color in sim.signal_states().items():
+            if sim.renderer.set_signal(name, color):
+                self.tk_calls += 1
+        
+        # 4. อัปเดตข้อความสถานะ (Status Label)
+        train_id_text = train_id if train_id else "รถไฟ"
+        status = None
+        if state == "ready" and not route:
+            status = ("สถานะ: พร้อม (Ready)", "green")
+        elif state == "in_station":
+            status = (f"สถานะ: {train_id_text} จอดที่ P{self.sim.current_train.platform}", "cyan")
+        elif state == "running":
+            status = (f"สถานะ: {train_id_text} กำลังเข้า (Running)", "yellow")
+        elif state == "leaving":
+            status = (f"สถานะ: {train_id_text} กำลังออก (Leaving)", "yellow")
+        elif state == "emergency":
+            status = ("สถานะ: หยุดฉุกเฉิน (EMERGENCY)", "red")
+        elif route:
+            status = (f"สถานะ: ตั้งเส้นทางแล้ว ({route})", "orange")
+        if status:
+            self._apply("status", self.status_label, text=status[0], fg=status[1])
+        
+
+# --- จุดเริ่มต้นของโปรแกรม ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parknam station train control GUI.")
+    parser.add_argument("--record", action="store_true",
+                        help="record operator commands to session-YYYYmmdd-HHMMSS.jsonl (replay with ParknamReplay.py)")
+    parser.add_argument("--timeline", action="store_true",
+                        help="record the train timeline to timeline-YYYYmmdd-HHMMSS.bin (read with ParknamTimeline.py)")
+    parser.add_argument("--metrics", nargs="?", const="parknam_metrics.prom", default=None, metavar="PATH",
+                        help="write Prometheus metrics every 5 s (default file: parknam_metrics.prom)")
+    args = parser.parse_args(argv)
+
+    root = tk.Tk()  # สร้างหน้าต่างหลัก
+    stamp = f"{datetime.datetime.now():%Y%m%d-%H%M%S}"
+    # log เขียนลงไฟล์ JSONL แบบหมุนไฟล์เสมอ ส่วนการบันทึกคำสั่ง เส้นเวลา และ metrics เปิดเมื่อขอเท่านั้น
+    TrainApp(root, log_path="parknam_ops.jsonl",
+             record_path=f"session-{stamp}.jsonl" if args.record else None,
+             metrics_path=args.metrics,
+             timeline_path=f"timeline-{stamp}.bin" if args.timeline else None)
+    root.mainloop()  # เริ่มการทำงานของ GUI
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
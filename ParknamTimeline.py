@@ -0,0 +1,68 @@
+"""
+อ่านไฟล์เส้นเวลาของขบวน (TrainTimeline) ที่ TrainApp หรือ ParknamBatch.py --timeline เขียนไว้
+พิมพ์ตัวชี้วัดสะสม (headway, เวลาจอด, สัดส่วนเวลาที่ชานชาลาไม่ว่าง) และตารางเวลาของแต่ละขบวน
+
+ใช้งาน:
+    python ParknamTimeline.py timeline-20250101-080000.bin
+    python ParknamTimeline.py tl/peak-0.timeline --trains      # เวลาเข้า/จอด/ออก/พ้นสถานีของทุกขบวน
+    python ParknamTimeline.py tl/peak-0.timeline --json        # ตัวชี้วัดเป็น JSON
+"""
+import argparse
+import json
+import sys
+
+from ParknamStation import TrainTimeline
+
+# ชนิดเหตุการณ์ที่เป็นคอลัมน์ของตารางรายขบวน
+TRAIN_EVENTS = ("arrival", "stop", "depart", "clear")
+
+
+def train_table(timeline):
+    """ขบวน -> {ชานชาลา, arrival, stop, depart, clear (เวลา ms หรือ None)} เรียงตามลำดับที่เข้ามา"""
+    table = {}
+    for t, kind, train, platform, _ in timeline:
+        if train is None or kind not in TRAIN_EVENTS:
+            continue
+        row = table.setdefault(train, dict(dict.fromkeys(TRAIN_EVENTS), platform=platform))
+        if row[kind] is None:
+            row[kind] = t
+    return table
+
+
+def format_report(report):
+    def seconds(value, scale=1000):
+        return "-" if value is None else f"{value / scale:.1f} s"
+    lines = [f"Events: {report['events']}, trains: {report['trains']}, emergencies: {report['emergencies']}",
+             f"Headway  last {seconds(report['headway_last_ms'])}  rolling mean {seconds(report['headway_mean_ms'])}",
+             f"Dwell    p50 {seconds(report['dwell_p50_s'], 1)}  p95 {seconds(report['dwell_p95_s'], 1)}"
+             f"  ({report['dwell_count']} departures)"]
+    lines += [f"Platform {key[len('occupancy_p'):]} occupied {value:.1%}"
+              for key, value in report.items() if key.startswith("occupancy_p")]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise a Parknam train timeline file.")
+    parser.add_argument("timeline", help="timeline file written by TrainApp or ParknamBatch.py --timeline")
+    parser.add_argument("--trains", action="store_true", help="also print the times of every train")
+    parser.add_argument("--json", action="store_true", help="print the aggregates as JSON")
+    args = parser.parse_args(argv)
+
+    timeline = TrainTimeline.load(args.timeline)
+    platforms = sorted({platform for _, _, _, platform, _ in timeline if platform})
+    report = timeline.stats.snapshot(platforms)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(report))
+    if args.trains:
+        print(f"\n{'train':<14}{'platform':>9}" + "".join(f"{kind:>10}" for kind in TRAIN_EVENTS) + f"{'dwell':>9}")
+        for train, row in train_table(timeline).items():
+            times = "".join("         -" if row[k] is None else f"{row[k] / 1000:10.1f}" for k in TRAIN_EVENTS)
+            dwell = "-" if row["stop"] is None or row["depart"] is None else f"{(row['depart'] - row['stop']) / 1000:.1f}"
+            print(f"{train:<14}{row['platform']:>9}{times}{dwell:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
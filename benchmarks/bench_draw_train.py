@@ -0,0 +1,131 @@
+"""
+Benchmark เวลาต่อเฟรมของการวาดรถไฟ
+
+เปรียบเทียบ 2 วิธี:
+- legacy: canvas.delete() + create_line() ใหม่ทุกเฟรม และสร้างพิกัดใหม่ทั้งขบวน (แบบเดิม)
+- sprite: TrainSprite ใช้ canvas item เดิมซ้ำ อัปเดตด้วย coords() และบัฟเฟอร์พิกัดแบบเพิ่มทีละไทล์
+  (อ่านพิกัดกึ่งกลางจาก TrackGeometry ที่คำนวณไว้แล้ว)
+
+ถ้ามีหน้าจอ (X server) จะใช้ tk.Canvas จริง ถ้าไม่มีจะใช้ canvas จำลองที่ไม่ทำอะไร
+(ผลของ canvas จำลองจะวัดได้เฉพาะฝั่ง Python ไม่รวมต้นทุนของ Tcl/Tk)
+
+วิธีรัน:
+    python benchmarks/bench_draw_train.py
+"""
+import os
+import sys
+import time
+import tkinter as tk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ParknamStation import TrackGeometry, TrainSprite  # noqa: E402
+
+TS = 10.0  # ขนาดไทล์ (พิกเซล)
+FRAMES = 200  # จำนวนเฟรมที่วัดต่อการทดสอบ
+TRAIN_LENGTHS = [17, 100, 400]
+TRAIN_COUNTS = [1, 10, 50]
+
+
+class NullCanvas:
+    """canvas จำลองสำหรับเครื่องที่ไม่มีหน้าจอ (คืน id ใหม่ทุกครั้งที่ create)"""
+    def __init__(self):
+        self._next_id = 0
+
+    def create_line(self, *args, **kwargs):
+        self._next_id += 1
+        return self._next_id
+
+    def coords(self, *args):
+        pass
+
+    def itemconfig(self, *args, **kwargs):
+        pass
+
+    def delete(self, *args):
+        pass
+
+    def update_idletasks(self):
+        pass
+
+
+def make_canvas():
+    """สร้าง tk.Canvas จริงถ้าทำได้ ไม่เช่นนั้นคืน NullCanvas"""
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return NullCanvas(), None
+    canvas = tk.Canvas(root, width=1600, height=900)
+    canvas.pack()
+    return canvas, root
+
+
+def make_paths(count, length):
+    """
+    สร้างเส้นทางตรงแยกกัน 1 เส้นต่อขบวน (ยาวพอให้วิ่งได้ FRAMES เฟรม)
+    คืนค่า (TrackPath สำหรับ sprite, list ของ Tile สำหรับวิธีเดิม)
+    """
+    geometry = TrackGeometry(TS)
+    paths, tile_lists = [], []
+    for row in range(count):
+        path = geometry.path((i, row) for i in range(length + FRAMES + 1))
+        paths.append(path)
+        tile_lists.append(list(path))
+    return paths, tile_lists
+
+
+def draw_legacy(canvas, tag, positions, color):
+    """วิธีเดิม: ลบทิ้งแล้วสร้างเส้นใหม่ทั้งขบวนทุกเฟรม"""
+    canvas.delete(tag)
+    train_coords = []
+    for pos in positions:
+        train_coords.extend([pos.x + TS / 2, pos.y + TS / 2])
+    if len(positions) > 1:
+        canvas.create_line(train_coords, fill=color, width=TS,
+                           capstyle=tk.ROUND, joinstyle=tk.ROUND, tags=tag)
+
+
+def run(canvas, count, length, mode):
+    """คืนค่าเวลาต่อเฟรม (ms) ของแต่ละเฟรม"""
+    paths, tile_lists = make_paths(count, length)
+    tags = [f"bench_train_{i}" for i in range(count)]
+    sprites = [TrainSprite(canvas, TS, tags=tag) for tag in tags]
+    frame_times = []
+    
+    for frame in range(FRAMES):
+        # เลื่อนรถไฟทุกขบวนไปข้างหน้า 1 ไทล์
+        tail, head = frame + 1, frame + 1 + length
+        
+        start = time.perf_counter()
+        for i in range(count):
+            if mode == "legacy":
+                draw_legacy(canvas, tags[i], tile_lists[i][tail:head], "#f87171")
+            else:
+                sprites[i].sync(paths[i], tail, head, "#f87171")
+        canvas.update_idletasks()  # ให้ Tk วาดจริง (เฉพาะ canvas จริง)
+        frame_times.append((time.perf_counter() - start) * 1000)
+    
+    for tag in tags:
+        canvas.delete(tag)
+    return frame_times
+
+
+def main():
+    canvas, root = make_canvas()
+    backend = "tk.Canvas" if root else "NullCanvas (no display)"
+    print(f"draw_train frame-time benchmark ({backend}, {FRAMES} frames)")
+    print(f"{'trains':>6} {'length':>6} {'legacy ms':>10} {'sprite ms':>10} {'speedup':>8}")
+    
+    for count in TRAIN_COUNTS:
+        for length in TRAIN_LENGTHS:
+            legacy = sorted(run(canvas, count, length, "legacy"))
+            sprite = sorted(run(canvas, count, length, "sprite"))
+            legacy_mean = sum(legacy) / len(legacy)
+            sprite_mean = sum(sprite) / len(sprite)
+            print(f"{count:>6} {length:>6} {legacy_mean:>10.3f} {sprite_mean:>10.3f} {legacy_mean / sprite_mean:>7.2f}x")
+    
+    if root:
+        root.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark เวลาต่อ tick ของ TrainSimulator เมื่อมีรถไฟวิ่งพร้อมกันจำนวนมาก
+
+วัด 2 ส่วน:
+- kinematics: FleetKinematics.update() (ความเร็ว/เบรก/ระยะสะสมของทุกขบวน) แบบ NumPy และแบบ pure Python
+  (บังคับทั้งสองแบบ ใช้เลือกค่า FleetKinematics.NUMPY_MIN_TRAINS)
+- tick: _move_train ทั้งหมด (kinematics + เลื่อนไทล์/ดัชนีการครอบครองของขบวนที่ข้ามไทล์)
+
+ถ้าไม่ได้ติดตั้ง NumPy จะวัดเฉพาะแบบ pure Python
+
+วิธีรัน:
+    python benchmarks/bench_fleet.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ParknamStation  # noqa: E402
+from ParknamStation import FleetKinematics, TrainSimulator  # noqa: E402
+
+TRAIN_COUNTS = [100, 1000, 5000]
+TRACK_TILES = 400  # ความยาวรางของแต่ละขบวน (แต่ละขบวนมีรางของตัวเอง ไม่ขวางกัน)
+TICKS = 20  # จำนวน tick ต่อรอบการวัด
+REPEATS = 5  # ใช้ค่าที่ดีที่สุดจากหลายรอบ (ลดผลของ noise)
+
+
+def build(count, use_numpy):
+    """Simulator ที่มีรถไฟ count ขบวนหลายความเร็ว ครึ่งหนึ่งมีอัตราเร่ง หนึ่งในสามมีจุดหยุด"""
+    sim = TrainSimulator()
+    sim.fleet = FleetKinematics(use_numpy=use_numpy)
+    for i in range(count):
+        path = sim.geometry.path((x, 1000 + i) for x in range(TRACK_TILES))
+        sim.spawn_train(path, length=20, speed=0.5 + (i % 7) * 0.25,
+                        accel=0.01 if i % 2 else None,
+                        stop_index=TRACK_TILES - 100 if i % 3 == 0 else None)
+    return sim
+
+
+def bench(count, use_numpy):
+    sim = build(count, use_numpy)
+    tick = kinematics = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for _ in range(TICKS):
+            sim.run_until(sim.now + sim.TICK_MS)
+        tick = min(tick, (time.perf_counter() - start) / TICKS)
+    for _ in range(REPEATS * TICKS):
+        start = time.perf_counter()
+        sim.fleet.update()
+        kinematics = min(kinematics, time.perf_counter() - start)
+    return tick * 1000, kinematics * 1000
+
+
+def main():
+    modes = [False] + ([True] if ParknamStation.np is not None else [])
+    print(f"{'trains':>8}  {'mode':<7}{'tick (ms)':>12}{'kinematics (ms)':>18}")
+    for count in TRAIN_COUNTS:
+        for use_numpy in modes:
+            tick, kinematics = bench(count, use_numpy)
+            mode = "numpy" if use_numpy else "python"
+            print(f"{count:>8}  {mode:<7}{tick:>12.2f}{kinematics:>18.3f}")
+    if ParknamStation.np is None:
+        print("(NumPy not installed: vectorised mode skipped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark การค้นเส้นทางของ TrackGraph บนสายที่มีหลายสถานีต่อกัน (แต่ละสถานีมีผังแบบปากน้ำ: 2 ชานชาลา 2 ประแจ)
+
+วัด:
+- search: ค้นเส้นทาง entry -> ชานชาลา -> exit ครั้งแรก (A*) ตอน cache ว่าง
+- hit: ขอเส้นทางเดิมซ้ำ (ได้จาก LRU cache)
+- close: ปิด segment ของชานชาลาหนึ่งแห่งตอนที่ cache มีเส้นทางของทุกชานชาลา (ลบเฉพาะเส้นทางที่ผ่าน)
+  แล้วค้นเส้นทางทั้งหมดใหม่ (ค้นจริงเฉพาะตัวที่ถูกลบ)
+
+วิธีรัน:
+    python benchmarks/bench_routes.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ParknamStation import StationLayout, TrackGraph  # noqa: E402
+
+STATION_COUNTS = [10, 100, 300]
+PITCH = 87  # ระยะห่างระหว่างสถานี (ไทล์) เท่ากับผังปากน้ำ
+REPEATS = 5  # ใช้ค่าที่ดีที่สุดจากหลายรอบ (ลดผลของ noise)
+
+
+def line_spec(count):
+    """เลย์เอาต์ของสาย count สถานี: main_k -> (up_k, top_k, down_k | mid_k) -> main_(k+1) ... -> end"""
+    nodes, segments, platforms, switches = {}, {}, {}, {}
+    for k in range(count):
+        x = k * PITCH
+        nodes.update({f"a{k}": [x, 40], f"h{k}": [x + 40, 40], f"w1_{k}": [x + 41, 40], f"pw{k}": [x + 51, 30],
+                      f"pe{k}": [x + 75, 30], f"px{k}": [x + 76, 30], f"w2_{k}": [x + 86, 40]})
+        segments.update({f"main{k}": [f"a{k}", f"h{k}"], f"up{k}": [f"w1_{k}", f"pw{k}"],
+                         f"top{k}": [f"pw{k}", f"pe{k}"], f"down{k}": [f"px{k}", f"w2_{k}"],
+                         f"mid{k}": [f"w1_{k}", f"w2_{k}"]})
+        platforms[str(2 * k + 1)] = {"segment": f"top{k}"}
+        platforms[str(2 * k + 2)] = {"segment": f"mid{k}"}
+        switches.update({f"W1_{k}": f"w1_{k}", f"W2_{k}": f"w2_{k}"})
+    nodes.update(exit=[count * PITCH, 40], east_end=[count * PITCH + 54, 40])
+    segments["end"] = ["exit", "east_end"]
+    return {"name": f"line-{count}", "width": count * PITCH + 55, "train_length": 17, "nodes": nodes,
+            "segments": segments, "entry": "main0", "exit": "end", "switches": switches, "platforms": platforms}
+
+
+def best(func, repeats=REPEATS):
+    """เวลาที่ดีที่สุด (วินาที) ของ func() และผลลัพธ์ของรอบสุดท้าย"""
+    elapsed = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    return elapsed, result
+
+
+def bench(count):
+    tables, arrays = StationLayout.compile(line_spec(count), 1.0)
+    layout = StationLayout(None, 1.0, tables, arrays)
+    graph = TrackGraph(layout)
+    middle = f"top{count // 2}"
+
+    def search():
+        graph.cache.clear()
+        return graph.find("main0", "end", middle)
+    search_time, route = best(search)
+    assert route is not None and middle in route.segments
+    graph.find("main0", "end", middle)
+    hit_time, _ = best(lambda: graph.find("main0", "end", middle), REPEATS * 100)
+
+    # cache มีเส้นทางของทุกชานชาลา แล้วปิด segment ของชานชาลากลางสาย
+    vias = [spec["segment"] for spec in layout.platforms.values()]
+
+    def close():
+        graph.open_segment(middle)
+        for via in vias:
+            graph.find("main0", "end", via)
+        misses = graph.misses
+        start = time.perf_counter()
+        dropped = graph.close_segment(middle)
+        for via in vias:
+            graph.find("main0", "end", via)
+        return time.perf_counter() - start, dropped, graph.misses - misses
+    close_time, dropped, searched = min(close() for _ in range(REPEATS))
+    return len(layout.geometry.xs), search_time * 1e6, hit_time * 1e6, close_time * 1e3, dropped, searched, len(vias)
+
+
+def main():
+    print(f"{'stations':>9}{'tiles':>9}{'search (us)':>13}{'hit (us)':>10}{'close+refill (ms)':>19}{'dropped':>9}{'searched':>10}")
+    for count in STATION_COUNTS:
+        tiles, search, hit, close, dropped, searched, routes = bench(count)
+        print(f"{count:>9}{tiles:>9}{search:>13.1f}{hit:>10.2f}{close:>19.3f}{dropped:>9}{searched:>7}/{routes}")
+
+
+if __name__ == "__main__":
+    main()
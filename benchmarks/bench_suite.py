@@ -0,0 +1,347 @@
+"""
+ชุด benchmark ของ TrainSimulator สำหรับ CI (ไม่ต้องมีหน้าจอ / X server)
+
+ขับ TrainSimulator ผ่าน RecordingCanvas (canvas จำลองที่นับการเรียกทุกเมธอด) แล้ววัด:
+- ops/sec (รอบที่เร็วที่สุด) และ score: ops/sec ของแต่ละรอบหารด้วยความเร็วของเครื่องที่วัดจากงานอ้างอิงคงที่
+  ก่อนและหลังรอบนั้นทันที แล้วใช้ค่ากลางของทุกรอบ จึงใช้ baseline เดียวกันบนเครื่อง CI ที่ต่างกันได้
+  (ค่าแกว่งระหว่างการรันได้ถึงราว 25% = tolerance กรณีที่หลุด tolerance จะถูกวัดซ้ำก่อนนับเป็น regression)
+- peak KiB: หน่วยความจำชั่วคราวสูงสุดที่จองระหว่างวัด (tracemalloc)
+- blocks/op: จำนวน memory block ที่เพิ่มขึ้นค้างไว้ต่อ 1 op (ใช้จับหน่วยความจำรั่ว)
+- canvas calls/op: จำนวนการเรียก canvas ต่อ 1 op (deterministic ไม่ขึ้นกับเครื่อง)
+
+กรณีที่วัด:
+- cycle: รอบเต็ม ตั้งทางเข้า -> รถไฟเข้า -> จอด (dwell) -> ตั้งทางออก -> ออกพ้นแผนที่
+- draw_base_tracks: วาดเส้นทางพื้นฐานใหม่ทั้งหมด
+- draw_train[N]: วาดรถไฟยาว N ไทล์ที่เลื่อนไป 1 ไทล์ต่อ op
+- release_train: ตั้งทางออกและปล่อยขบวนที่จอดอยู่ (ค้นตำแหน่งหัวรถไฟบนเส้นทางขาออก)
+- tick[N]: 1 tick ของ Simulator ที่มีรถไฟวิ่ง N ขบวน
+
+ผลจะถูกเทียบกับ baseline JSON ถ้าช้าลง/ใช้หน่วยความจำหรือเรียก canvas มากขึ้นเกินเกณฑ์ จะพิมพ์ REGRESSION
+และจบด้วย exit status 1
+
+วิธีรัน:
+    python benchmarks/bench_suite.py                          # เทียบกับ benchmarks/baseline.json
+    python benchmarks/bench_suite.py --save-baseline          # บันทึกผลเป็น baseline ใหม่
+    python benchmarks/bench_suite.py --quick --json out.json  # รอบสั้น + เก็บผลไว้ติดตามย้อนหลัง
+    python benchmarks/bench_suite.py --only cycle --tolerance 0.4
+"""
+import argparse
+import collections
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ParknamStation import TrainSimulator  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+FORMAT = "parknam-bench"
+VERSION = 1
+REPEATS = 9  # จำนวนรอบการจับเวลาต่อกรณี (score ใช้ค่ากลาง, ops/sec ใช้รอบที่เร็วที่สุด)
+TOLERANCE = 0.25  # ยอมให้ ops/sec ต่ำกว่า / peak สูงกว่า baseline ได้ไม่เกิน 25%
+PEAK_SLACK_KIB = 16.0  # ความคลาดเคลื่อนของ peak ที่ไม่นับเป็น regression (KiB)
+BLOCKS_SLACK = 1.0  # blocks/op ที่เพิ่มได้ (นอกเหนือจาก tolerance) โดยไม่นับเป็น regression
+CONFIRM_RUNS = 2  # กรณีที่ช้ากว่า tolerance จะถูกวัดซ้ำอีกไม่เกินเท่านี้ (ช้าจริงจะช้าทุกครั้ง, noise จะไม่ซ้ำ)
+
+
+class RecordingCanvas:
+    """
+    canvas จำลองที่บันทึกการเรียกทุกเมธอด (ไม่ต้องมี Tk)
+    - calls: จำนวนครั้งที่เรียกแต่ละเมธอด
+    - log: รายการ (เมธอด, args, kwargs) ถ้าสร้างด้วย record=True
+    """
+
+    def __init__(self, record=False):
+        self.calls = collections.Counter()
+        self.log = [] if record else None
+        self._next_id = 0
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls[name] += 1
+            if self.log is not None:
+                self.log.append((name, args, kwargs))
+            if name.startswith("create_"):
+                self._next_id += 1
+                return self._next_id
+            return None
+        setattr(self, name, method)  # ครั้งต่อไปไม่ต้องผ่าน __getattr__
+        return method
+
+    @property
+    def total(self):
+        return sum(self.calls.values())
+
+
+class Meter:
+    """
+    จับเวลา (และหน่วยความจำถ้า trace=True) เฉพาะส่วนที่อยู่ใน `with meter:` (เข้าได้หลายครั้ง ค่าสะสม)
+    ส่วนเตรียมข้อมูลที่อยู่นอก with ไม่ถูกนับ
+    """
+
+    def __init__(self, canvas, trace=False):
+        self.canvas = canvas
+        self.trace = trace
+        self.elapsed = 0.0
+        self.canvas_calls = 0
+        self.peak = 0  # byte
+        self.blocks = 0
+
+    def __enter__(self):
+        if self.trace:
+            gc.collect()  # นับเฉพาะ block ที่ค้างจริง ไม่ขึ้นกับว่า GC ของ cycle จะทำงานตอนไหน
+            tracemalloc.reset_peak()
+            self._traced = tracemalloc.get_traced_memory()[0]
+            self._blocks = sys.getallocatedblocks()
+        self._calls = self.canvas.total
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed += time.perf_counter() - self._start
+        self.canvas_calls += self.canvas.total - self._calls
+        if self.trace:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1] - self._traced)
+            gc.collect()
+            self.blocks += sys.getallocatedblocks() - self._blocks
+        return False
+
+
+# --- กรณีที่วัด: แต่ละฟังก์ชันรับ (จำนวน op, meter) และวัดเฉพาะ op ภายใน `with meter` ---
+
+def _new_sim():
+    canvas = RecordingCanvas()
+    return TrainSimulator(canvas, screen_width=1250), canvas
+
+
+def _run_until_state(sim, train, state):
+    while train.state != state and sim.step():
+        pass
+
+
+def _dock(sim, platform):
+    """ตั้งทางเข้า เรียกรถไฟ แล้วเดินเวลาจนรถไฟจอดที่ชานชาลา"""
+    sim.set_route_in(platform)
+    sim.call_train()
+    train = sim.platform_train(platform)
+    _run_until_state(sim, train, "in_station")
+    return train
+
+
+def case_cycle(n, make_meter):
+    sim, canvas = _new_sim()
+    meter = make_meter(canvas)
+    with meter:
+        for i in range(n):
+            platform = 1 + i % 2
+            train = _dock(sim, platform)
+            sim.run_until(sim.now + 30000)  # dwell
+            sim.set_route_out(platform)
+            while train.id in sim.trains and sim.step():
+                pass
+    return meter
+
+
+def case_draw_base_tracks(n, make_meter):
+    sim, canvas = _new_sim()
+    meter = make_meter(canvas)
+    with meter:
+        for _ in range(n):
+            sim.draw_base_tracks()
+    return meter
+
+
+def case_draw_train(length):
+    def case(n, make_meter):
+        sim, canvas = _new_sim()
+        path = sim.geometry.path((x, 500) for x in range(length + n + 1))
+        train = sim.spawn_train(path, length, start=False)
+        train.head, train.tail = length, 0
+        sim.draw_train(train)  # ครั้งแรกสร้าง canvas item และคำนวณพิกัดของเส้นทาง (ไม่นับ)
+        meter = make_meter(canvas)
+        with meter:
+            for _ in range(n):
+                train.head += 1
+                train.tail += 1
+                sim.draw_train(train)
+        return meter
+    return case
+
+
+def case_release_train(n, make_meter):
+    sim, canvas = _new_sim()
+    meter = make_meter(canvas)
+    for i in range(n):
+        platform = 1 + i % 2
+        train = _dock(sim, platform)
+        with meter:
+            sim.set_route_out(platform)
+        while train.id in sim.trains and sim.step():
+            pass
+    return meter
+
+
+def case_tick(count):
+    def case(n, make_meter):
+        sim, canvas = _new_sim()
+        for i in range(count):
+            path = sim.geometry.path((x, 1000 + i) for x in range(2000))
+            sim.spawn_train(path, length=20, speed=0.5 + (i % 4) * 0.25)
+        meter = make_meter(canvas)
+        with meter:
+            for _ in range(n):
+                sim.run_until(sim.now + sim.TICK_MS)
+        return meter
+    return case
+
+
+# ชื่อกรณี -> (ฟังก์ชัน, จำนวน op ต่อรอบ)
+CASES = {
+    "cycle": (case_cycle, 50),
+    "draw_base_tracks": (case_draw_base_tracks, 2000),
+    "draw_train[17]": (case_draw_train(17), 20000),
+    "draw_train[100]": (case_draw_train(100), 20000),
+    "draw_train[400]": (case_draw_train(400), 20000),
+    "release_train": (case_release_train, 200),
+    "tick[100]": (case_tick(100), 200),
+}
+
+
+def calibrate(repeats):
+    """
+    ความเร็วของเครื่องตอนนี้: จำนวนรอบต่อวินาทีของงาน Python คงที่ (dict/list/float แบบเดียวกับ Simulator)
+    ใช้หารผลของแต่ละกรณี ทำให้เทียบกับ baseline ได้แม้เครื่องหรือภาระของเครื่องต่างกัน
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        table, total = {}, 0.0
+        for i in range(20000):
+            table[i & 1023] = i
+            total += table.get(i >> 1, 0) * 0.5
+        best = min(best, time.perf_counter() - start)
+    return 1.0 / best
+
+
+def measure(case, n, repeats, trace_n=None):
+    """
+    วัด 1 กรณี: อุ่นเครื่อง 1 รอบ จับเวลา repeats รอบ (ops/sec ใช้รอบที่เร็วสุด, score ใช้ค่ากลาง) แล้ววัดหน่วยความจำอีก 1 รอบด้วย tracemalloc
+    - trace_n: จำนวน op ของรอบวัดหน่วยความจำ (ค่าเริ่มต้น = n) ต้องเท่ากับตอนทำ baseline
+      เพราะ blocks/op รวมการจองครั้งแรกที่ถูกเฉลี่ยด้วยจำนวน op
+    """
+    trace_n = trace_n or n
+    case(n, lambda canvas: Meter(canvas))  # อุ่นเครื่อง (ไม่นับ)
+    best, scores = None, []
+    before = calibrate(3)
+    for _ in range(repeats):
+        meter = case(n, lambda canvas: Meter(canvas))
+        after = calibrate(3)
+        # เทียบกับงานอ้างอิงที่วัดก่อนและหลังรอบนี้ทันที (ภาระของเครื่องช่วงเดียวกัน) แล้วใช้ค่ากลางของทุกรอบ
+        scores.append(n / meter.elapsed / ((before + after) / 2))
+        before = after
+        if best is None or meter.elapsed < best.elapsed:
+            best = meter
+    tracemalloc.start()
+    try:
+        traced = case(trace_n, lambda canvas: Meter(canvas, trace=True))
+    finally:
+        tracemalloc.stop()
+    return {
+        "ops_per_sec": n / best.elapsed,
+        "score": statistics.median(scores),  # ops ต่อ 1 รอบของงานอ้างอิง (เทียบข้ามเครื่องได้)
+        "peak_kib": traced.peak / 1024,
+        "blocks_per_op": traced.blocks / trace_n,
+        "canvas_calls_per_op": best.canvas_calls / n,
+    }
+
+
+def compare(name, result, base, tolerance):
+    """เทียบผลกับ baseline คืนค่ารายการข้อความ regression (ว่าง = ผ่าน)"""
+    problems = []
+    if result["score"] < base["score"] * (1 - tolerance):
+        problems.append(f"{name}: {result['ops_per_sec']:.1f} ops/s is {1 - result['score'] / base['score']:.0%} "
+                        f"slower than baseline ({base['ops_per_sec']:.1f} ops/s, machine-normalised)")
+    if result["peak_kib"] > base["peak_kib"] * (1 + tolerance) + PEAK_SLACK_KIB:
+        problems.append(f"{name}: peak {result['peak_kib']:.1f} KiB > baseline {base['peak_kib']:.1f}")
+    if result["blocks_per_op"] > base["blocks_per_op"] * (1 + tolerance) + BLOCKS_SLACK:
+        problems.append(f"{name}: {result['blocks_per_op']:.2f} blocks/op > baseline {base['blocks_per_op']:.2f}")
+    if result["canvas_calls_per_op"] > base["canvas_calls_per_op"] * 1.01 + 0.01:
+        problems.append(f"{name}: {result['canvas_calls_per_op']:.2f} canvas calls/op > baseline {base['canvas_calls_per_op']:.2f}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless TrainSimulator benchmark suite with baseline comparison.")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON (default: benchmarks/baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--json", default=None, help="also write the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed relative slowdown (default 0.25)")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="timing repeats per case (median score is kept)")
+    parser.add_argument("--quick", action="store_true", help="quarter-size timing runs (noisier)")
+    parser.add_argument("--only", action="append", default=None, help="run only this case (repeatable)")
+    args = parser.parse_args(argv)
+
+    names = args.only or list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}; choose from {', '.join(CASES)}")
+
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    results, problems = {}, []
+    print(f"{'case':<18}{'ops/s':>12}{'baseline':>12}{'change':>9}{'peak KiB':>10}{'blocks/op':>11}{'canvas/op':>11}")
+    for name in names:
+        case, n = CASES[name]
+        timed_n = max(1, n // 4) if args.quick else n
+        result = measure(case, timed_n, args.repeats, trace_n=n)
+        base = baseline.get(name)
+        for _ in range(CONFIRM_RUNS if base else 0):
+            if result["score"] >= base["score"] * (1 - args.tolerance):
+                break
+            retry = measure(case, timed_n, args.repeats, trace_n=n)
+            if retry["score"] > result["score"]:
+                result = retry
+        results[name] = result
+        if base:
+            change = f"{(result['score'] / base['score'] - 1) * 100:+.1f}%"
+            problems += compare(name, result, base, args.tolerance)
+        else:
+            change = "new"
+        print(f"{name:<18}{result['ops_per_sec']:>12.1f}{base['ops_per_sec'] if base else float('nan'):>12.1f}"
+              f"{change:>9}{result['peak_kib']:>10.1f}{result['blocks_per_op']:>11.2f}{result['canvas_calls_per_op']:>11.2f}")
+
+    if baseline:
+        print("(change = machine-normalised ops/s relative to the baseline)")
+
+    report = {"format": FORMAT, "version": VERSION, "python": platform.python_version(),
+              "machine": platform.machine(), "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not baseline:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+    if problems:
+        print(f"\nREGRESSION ({len(problems)}):")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""checkpoint() / restore() ของ TrainSimulator เมื่อ tick loop ถูกห่อด้วยโค้ดภายนอก"""
+import functools
+
+from ParknamStation import Instrumentation, TrainSimulator
+
+
+def moving_train():
+    sim = TrainSimulator()
+    sim.set_route_in(1)
+    sim.call_train()
+    sim.run_until(1000)
+    train = next(iter(sim.moving.values()))
+    return sim, train.id
+
+
+def test_restore_rearms_tick_dropped_as_foreign():
+    sim, train_id = moving_train()
+    move_train = sim._move_train
+    sim._move_train = lambda: move_train()  # ห่อแบบไม่มี __wrapped__: เป็นเหตุการณ์ภายนอก
+    sim.run_until(sim.next_event_time())
+    data = sim.checkpoint(drop_foreign=True)
+
+    restored = TrainSimulator()
+    restored.restore(data)
+    head = restored.trains[train_id].head
+    restored.run_until(restored.now + 5000)
+    assert restored.trains[train_id].head > head
+
+
+def test_checkpoint_accepts_instrumented_tick():
+    # ห่อแบบเดียวกับ TrainApp._instrument (Instrumentation.wrap + timed_tick)
+    sim, train_id = moving_train()
+    move_train = Instrumentation().wrap(sim._move_train, "move_train")
+
+    @functools.wraps(move_train)
+    def timed_tick():
+        move_train()
+    sim._move_train = timed_tick
+    sim.run_until(sim.next_event_time())
+
+    restored = TrainSimulator()
+    restored.restore(sim.checkpoint())
+    sim.run_until(sim.now + 5000)
+    restored.run_until(restored.now + 5000)
+    assert restored.state_digest() == sim.state_digest()
@@ -0,0 +1,105 @@
+"""หยุดฉุกเฉินกลางเส้นทาง (เบรกหยุด ล็อกเส้นทางที่มีขบวนไว้ แล้ววิ่งต่อหลังรีเซ็ต) และไฟล์บันทึกรุ่นเก่า"""
+import json
+import math
+
+import pytest
+
+import ParknamReplay
+from ParknamReplay import load_session, replay
+from ParknamStation import SessionRecorder, TrainSimulator
+
+
+def departing_train():
+    """ขบวนที่ออกจากชานชาลา 2 (P2_OUT) ขณะที่ตั้งทางเข้าชานชาลา 1 ไว้แต่ยังไม่เรียกรถไฟ"""
+    sim = TrainSimulator()
+    sim.set_route_in(2)
+    sim.call_train()
+    sim.run_until(60000)
+    train = sim.platform_train(2)
+    assert sim.set_route_out(2) and sim.set_route_in(1)
+    sim.run_until(sim.now + 1500)
+    assert train.state == "leaving" and sim.route_locked == "P1_IN+P2_OUT"
+    return sim, train
+
+
+def test_emergency_halts_train_and_keeps_only_its_route():
+    sim, train = departing_train()
+    head = train.head
+    sim.emergency_stop()
+    assert sim.state == "emergency" and sim.route_locked == "EMERGENCY"
+    assert sim.interlocking.locked_routes() == ["P2_OUT"]  # P1_IN ไม่มีขบวนใช้: ปลดทันที
+    assert set(sim.signal_states().values()) == {"red"}
+    assert not sim.set_route_in(1) and not sim.call_train()
+
+    sim.run_until(sim.now + sim.EMERGENCY_RESET_MS - 1)
+    assert train.head == head and train.id not in sim.moving  # ความเร็วคงที่: หยุดทันทีที่ไทล์เดิม
+    assert sim.platform_train(2) is train and sim.platform_occupied[2]
+
+
+def test_normal_operation_resumes_after_reset():
+    sim, train = departing_train()
+    head = train.head
+    sim.emergency_stop()
+    sim.run_until(sim.now + sim.EMERGENCY_RESET_MS)
+    assert not sim.emergency_active and train.id in sim.moving
+    assert sim.route_locked == "P2_OUT" and sim.signal_states()["S-P2"] == "green"
+
+    sim.run_until(sim.now + 20000)
+    assert train.id not in sim.trains and train.head > head  # วิ่งต่อจากจุดที่หยุดจนพ้นแผนที่
+    assert sim.route_locked is None and not sim.platform_occupied[2]
+    assert sim.set_route_in(1) and sim.call_train()
+
+
+def test_braking_train_stops_within_braking_distance():
+    sim = TrainSimulator()
+    sim.EMERGENCY_RESET_MS = 20000  # ให้เบรกจนหยุดก่อนรีเซ็ต
+    sim.set_route_in(1)
+    sim.call_train(accel=0.02)
+    sim.run_until(600)
+    train = next(iter(sim.moving.values()))
+    head, speed, progress = train.head, train.speed, train.progress
+    sim.emergency_stop()
+    assert train.halt_index == head - 1 + math.ceil(progress + speed * speed / (2 * train.accel))
+    assert train.halt_index < train.stop_index  # หยุดก่อนถึงจุดจอดที่ชานชาลา
+
+    while train.id in sim.moving:
+        sim.step()
+    assert sim.emergency_active and train.speed == 0.0
+    assert train.head == train.halt_index + 1  # หัวขบวนเลยไทล์ halt_index แล้วหยุด
+    assert sim.interlocking.locked_routes() == ["P1_IN"]
+
+    sim.run_until(sim.now + sim.EMERGENCY_RESET_MS)
+    sim.run_until(sim.now + 60000)
+    assert train.state == "in_station" and train.head == train.stop_index + 1
+
+
+def record_session(path):
+    sim = TrainSimulator()
+    recorder = SessionRecorder(str(path), sim)
+    for name, args in (("set_route_in", (1,)), ("call_train", ()), ("emergency_stop", ())):
+        sim.run_until(sim.now + 1000)
+        recorder.record(name, args)  # แบบเดียวกับ TrainApp: ชื่อเมธอดของ Simulator
+        getattr(sim, name)(*args)
+    sim.run_until(sim.now + 30000)
+    recorder.close()
+
+
+def test_current_recording_replays(tmp_path):
+    path = tmp_path / "session.jsonl"
+    record_session(path)
+    header, _ = load_session(str(path))
+    assert header["version"] == SessionRecorder.VERSION
+    _, result = replay(str(path))
+    assert result["diverged"] is None and result["digest_ok"] is True
+
+
+def test_version_1_recording_is_rejected(tmp_path, capsys):
+    path = tmp_path / "session.jsonl"
+    record_session(path)
+    header, *lines = path.read_text(encoding="utf-8").splitlines()
+    path.write_text("\n".join([json.dumps(dict(json.loads(header), version=1)), *lines]) + "\n", encoding="utf-8")
+
+    with pytest.raises(ValueError, match="unsupported version 1"):
+        load_session(str(path))
+    assert ParknamReplay.main([str(path)]) == 2
+    assert "Cannot replay" in capsys.readouterr().err
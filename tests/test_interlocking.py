@@ -0,0 +1,57 @@
+"""ตารางขัดแย้งแบบ bitmask ของ Interlocking (ผังของสถานีปากน้ำใน layouts/parknam.json)"""
+import json
+import os
+
+from ParknamStation import Interlocking, TrainSimulator
+
+LAYOUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "layouts", "parknam.json")
+
+
+def parknam():
+    with open(LAYOUT, encoding="utf-8") as f:
+        return Interlocking(json.load(f)["interlocking"])
+
+
+def test_inbound_routes_conflict():
+    il = parknam()
+    assert il.conflicts["P1_IN"] & il.bit["P2_IN"]
+    assert il.lock("P1_IN")
+    assert not il.available("P2_IN")
+    assert not il.lock("P2_IN")
+    assert il.conflicting("P2_IN") == ["P1_IN"]
+    assert il.locked == il.bit["P1_IN"]
+
+
+def test_inbound_and_other_platform_outbound_lock_together():
+    il = parknam()
+    assert not il.conflicts["P1_IN"] & il.bit["P2_OUT"]
+    assert il.lock("P1_IN") and il.lock("P2_OUT")
+    assert il.locked_routes() == ["P1_IN", "P2_OUT"]
+    assert il.signal_clear("S-01") and il.signal_clear("S-P2") and not il.signal_clear("S-P1")
+
+    sim = TrainSimulator()  # ขบวนจอดที่ชานชาลา 2 แล้วออก ขณะที่อีกขบวนเข้าชานชาลา 1
+    sim.set_route_in(2)
+    sim.call_train()
+    sim.run_until(60000)
+    assert sim.platform_occupied[2] and sim.route_locked is None
+    assert sim.set_route_in(1) and sim.set_route_out(2)
+    assert sim.route_locked == "P1_IN+P2_OUT"
+    assert not sim.route_available("P2_IN")
+
+
+def test_release_frees_exactly_its_bit():
+    il = parknam()
+    il.lock("P1_IN")
+    il.lock("P2_OUT")
+    assert il.release("P1_IN")
+    assert il.locked == il.bit["P2_OUT"]
+    assert not il.release("P1_IN")  # ปลดซ้ำไม่เปลี่ยนอะไร
+    assert il.available("P1_IN")  # กลับมาตั้งได้ทันที
+    assert not il.available("P2_IN") and not il.available("P1_OUT")  # ยังชน P2_OUT (ตอนราง P2 / EXIT)
+    assert il.release("P2_OUT") and il.locked == 0
+
+
+def test_compiled_tables_round_trip():
+    il = parknam()
+    cached = Interlocking.from_tables(json.loads(json.dumps(il.tables())))
+    assert cached.conflicts == il.conflicts and cached.bit == il.bit
@@ -0,0 +1,137 @@
+"""การตรวจคำสั่งและ backpressure ของ ControlServer"""
+import json
+import socket
+import threading
+
+import pytest
+
+from ParknamServer import ControlServer, _Client
+from ParknamStation import TrainSimulator
+
+
+@pytest.fixture
+def connection():
+    """เซิร์ฟเวอร์จริงบนพอร์ตว่าง + thread ที่ pump() แทนลูป headless, คืนไฟล์ socket ของไคลเอนต์"""
+    server = ControlServer(TrainSimulator(), port=0)
+    port = server.start()
+    done = threading.Event()
+
+    def pump():
+        while not done.is_set():
+            server.wait(0.01)
+            server.pump()
+
+    pumper = threading.Thread(target=pump, daemon=True)
+    pumper.start()
+    sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+    stream = sock.makefile("rwb")
+    yield stream
+    stream.close()
+    sock.close()
+    done.set()
+    pumper.join()
+    server.stop()
+
+
+def request(stream, line):
+    stream.write(line.encode("utf-8") + b"\n")
+    stream.flush()
+    return json.loads(stream.readline())
+
+
+@pytest.mark.parametrize("line, error", [
+    ("{not json", "invalid JSON object"),
+    ("[1, 2]", "invalid JSON object"),
+    ('{"id": 1, "op": "teleport"}', "unknown op 'teleport'"),
+    ('{"id": 1, "cmds": []}', "cmds must be a non-empty list"),
+    ('{"id": 1, "cmds": {"route_in": 1}}', "cmds must be a non-empty list"),
+    ('{"id": 1, "cmds": ["arrive"]}', "unknown command"),
+    ('{"id": 1, "cmds": [[["route_in"], 1]]}', "unknown command"),
+    ('{"id": 1, "cmds": [[{"op": "arrive"}]]}', "unknown command"),
+    ('{"id": 1, "cmds": [["route_in", "1"]]}', "route_in needs a platform number"),
+    ('{"id": 1, "cmds": [["route_out", true]]}', "route_out needs a platform number"),
+    ('{"id": 1, "cmds": [["route_in", [1]]]}', "route_in needs a platform number"),
+    ('{"id": 1, "cmds": [["route_in", 9]]}', "route_in needs a platform number"),
+    ('{"id": 1, "cmds": [["arrive", 1]]}', "arrive takes no arguments"),
+])
+def test_malformed_request_gets_error_and_keeps_connection(connection, line, error):
+    reply = request(connection, line)
+    assert reply["type"] == "error" and error in reply["error"]
+    assert reply["id"] == (None if reply["error"] == "invalid JSON object" else 1)
+
+    reply = request(connection, '{"id": 2, "cmds": [["route_in", 1]]}')
+    assert reply == {"type": "result", "id": 2, "results": [True]}
+
+
+def test_oversized_batch_is_rejected(connection):
+    cmds = [["arrive"]] * (ControlServer.MAX_BATCH + 1)
+    reply = request(connection, json.dumps({"id": 7, "cmds": cmds}))
+    assert reply == {"type": "error", "id": 7, "error": f"batch larger than {ControlServer.MAX_BATCH} commands"}
+
+
+# transport จำลองที่กำหนดขนาดบัฟเฟอร์ขาออกได้ (แทนไคลเอนต์ที่ไม่อ่าน socket)
+class StubTransport:
+
+    def __init__(self):
+        self.buffered = 0
+        self.aborted = False
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+    def is_closing(self):
+        return self.aborted
+
+    def abort(self):
+        self.aborted = True
+
+
+class StubWriter:
+
+    def __init__(self):
+        self.transport = StubTransport()
+        self.messages = []
+
+    def write(self, data):
+        self.messages.append(json.loads(data))
+
+
+def subscribed_client(server):
+    client = _Client(StubWriter(), server.MAX_INFLIGHT)
+    client.subscribed, client.stale = True, False
+    server.clients.add(client)
+    return client
+
+
+def test_slow_client_skips_diffs_above_high_water_then_resyncs():
+    server = ControlServer(TrainSimulator())
+    client = subscribed_client(server)
+    server._broadcast(1, {"t": 1.0}, {"t": 1.0})
+    assert [m["type"] for m in client.writer.messages] == ["diff"]
+
+    client.writer.transport.buffered = server.HIGH_WATER + 1
+    server._broadcast(2, {"t": 2.0}, {"t": 2.0})
+    server._broadcast(3, {"t": 3.0}, {"t": 3.0})
+    assert len(client.writer.messages) == 1  # diff ไม่ถูกเข้าคิวสะสม
+    assert client.stale and client.dropped == 2
+
+    client.writer.transport.buffered = 0  # ไคลเอนต์อ่านทันแล้ว: ได้ snapshot เต็มก่อน diff ถัดไป
+    server._broadcast(4, {"t": 4.0}, {"t": 4.0, "state": "IDLE"})
+    server._broadcast(5, {"t": 5.0}, {"t": 5.0, "state": "IDLE"})
+    assert client.writer.messages[1:] == [
+        {"type": "snapshot", "seq": 4, "state": {"t": 4.0, "state": "IDLE"}},
+        {"type": "diff", "seq": 5, "changes": {"t": 5.0}},
+    ]
+    assert not client.stale
+
+
+def test_client_above_hard_limit_is_aborted():
+    server = ControlServer(TrainSimulator())
+    client = subscribed_client(server)
+    client.writer.transport.buffered = server.HARD_LIMIT + 1
+    server._send(client, b'{"type":"result","id":1,"results":[true]}\n')
+    assert client.writer.transport.aborted and client.writer.messages == []
+
+    client.writer.transport.buffered = 0  # ถูกตัดแล้ว: ไม่เขียนอะไรเพิ่ม
+    server._send(client, b'{"type":"result","id":2,"results":[true]}\n')
+    assert client.writer.messages == []
@@ -0,0 +1,103 @@
+"""TrainTimeline และ TimelineStats จากการเดินรถแบบ headless 2 ขบวน"""
+import pytest
+
+from ParknamStation import TrainSimulator, TrainTimeline
+from ParknamTimeline import train_table
+
+END = 200000.0
+
+
+def two_trains(timeline):
+    """ขบวนแรกเข้าชานชาลา 1 ที่ t=0, ขบวนที่สองเข้าชานชาลา 2 ที่ t=40 s แล้วออกที่ 80 s และ 150 s"""
+    sim = TrainSimulator()
+    timeline.attach(sim)
+    sim.set_route_in(1)
+    sim.call_train()
+    sim.run_until(40000)
+    sim.set_route_in(2)
+    sim.call_train()
+    sim.run_until(80000)
+    sim.set_route_out(1)
+    sim.run_until(150000)
+    sim.set_route_out(2)
+    sim.run_until(END)
+    return sim
+
+
+def per_train(rows):
+    trains = {}
+    for t, kind, train, platform, route in rows:
+        if train is not None:
+            trains.setdefault(train, []).append((kind, platform, route))
+    return trains
+
+
+def times(rows, kind):
+    return [t for t, k, _, _, _ in rows if k == kind]
+
+
+def test_records_each_train_lifecycle_in_order():
+    timeline = TrainTimeline(chunk_rows=4)
+    two_trains(timeline)
+    rows = list(timeline)
+    assert len(rows) == len(timeline) == 16 and len(timeline.chunks) == 4
+
+    first, second = per_train(rows).values()
+    assert first == [("arrival", 1, "P1_IN"), ("stop", 1, "P1_IN"), ("route_set", 1, "P1_OUT"),
+                     ("depart", 1, "P1_OUT"), ("clear", 1, None)]
+    assert second == [("arrival", 2, "P2_IN"), ("stop", 2, "P2_IN"), ("route_set", 2, "P2_OUT"),
+                      ("depart", 2, "P2_OUT"), ("clear", 2, None)]
+    # ทางเข้าตั้งก่อนมีขบวน (ไม่มีเจ้าของ) ส่วนชานชาลาไม่ว่างตั้งแต่ขบวนจอดจนพ้นสถานี
+    assert [(t, platform, route) for t, kind, train, platform, route in rows if train is None and kind == "route_set"] \
+        == [(0.0, 1, "P1_IN"), (40000.0, 2, "P2_IN")]
+    assert times(rows, "occupied") == times(rows, "stop")
+    assert times(rows, "vacated") == times(rows, "clear")
+    assert times(rows, "arrival") == [0.0, 40000.0] and times(rows, "depart") == [80000.0, 150000.0]
+
+    table = train_table(timeline)
+    assert [row["platform"] for row in table.values()] == [1, 2]
+    assert [row["depart"] for row in table.values()] == [80000.0, 150000.0]
+
+
+def test_stats_follow_the_recorded_events():
+    timeline = TrainTimeline()
+    two_trains(timeline)
+    rows = list(timeline)
+    stops, clears = times(rows, "stop"), times(rows, "clear")
+    stats = timeline.stats
+
+    assert stats.counts["arrival"] == 2 and stats.counts["emergency"] == 0
+    assert stats.headway() == (40000.0, 40000.0)
+    dwell = [(80000.0 - stops[0]) / 1000, (150000.0 - stops[1]) / 1000]
+    assert 60 < dwell[0] <= 90 < dwell[1] <= 120
+    assert stats.dwell.count == 2
+    assert stats.dwell_quantile(0.5) == 90  # ขอบบนของช่องที่ค่าลำดับกลางตกอยู่
+    assert stats.dwell_quantile(0.95) == pytest.approx(dwell[1])  # ช่องสุดท้าย: ไม่เกินค่าสูงสุดที่เห็น
+    for platform, (stop, clear) in enumerate(zip(stops, clears), start=1):
+        assert stats.occupancy(platform, END) == pytest.approx((clear - stop) / END)
+
+
+def test_occupancy_counts_platform_still_occupied():
+    timeline = TrainTimeline()
+    sim = TrainSimulator()
+    timeline.attach(sim)
+    sim.set_route_in(1)
+    sim.call_train()
+    sim.run_until(30000)
+    stop = times(list(timeline), "stop")[0]
+    assert timeline.stats.occupancy(1, sim.now) == pytest.approx((sim.now - stop) / sim.now)
+    assert timeline.stats.occupancy(2, sim.now) == 0.0
+    assert timeline.stats.dwell_quantile(0.5) is None and timeline.stats.headway() == (None, None)
+
+
+def test_file_round_trip_keeps_rows_and_stats(tmp_path):
+    path = tmp_path / "run.timeline"
+    timeline = TrainTimeline(str(path), chunk_rows=5)
+    two_trains(timeline)
+    timeline.close()
+
+    loaded = TrainTimeline.load(str(path))
+    expected = TrainTimeline()
+    two_trains(expected)
+    assert list(loaded) == list(expected)
+    assert loaded.stats.snapshot([1, 2], END) == timeline.stats.snapshot([1, 2], END)
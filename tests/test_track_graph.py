@@ -0,0 +1,69 @@
+"""cache ของ TrackGraph: ปิด/เปิด segment แล้วลบเฉพาะเส้นทางที่ได้รับผลกระทบ"""
+from ParknamStation import TrainSimulator
+
+TOP = ("main", "top_diag_up", "top_horizontal", "top_diag_down", "end")  # ผ่านชานชาลา 1
+BOTTOM = ("main", "middle", "end")  # ผ่านชานชาลา 2 (ทางที่สั้นที่สุด)
+
+
+def searches(graph):
+    """การค้นเส้นทางของสถานีปากน้ำ: เส้นทางที่ตั้งชื่อไว้ และ entry -> exit ผ่านแต่ละชานชาลา"""
+    return {
+        "top_station": lambda: graph.named("top_station"),
+        "top_outbound": lambda: graph.named("top_outbound"),
+        "bottom_station": lambda: graph.named("bottom_station"),
+        "bottom_outbound": lambda: graph.named("bottom_outbound"),
+        "via_p1": lambda: graph.find("main", "end", "top_horizontal"),
+        "via_p2": lambda: graph.find("main", "end", "middle"),
+    }
+
+
+def cached_graph():
+    graph = TrainSimulator().tracks.blank()
+    search = searches(graph)
+    return graph, search, {name: find() for name, find in search.items()}
+
+
+def test_closing_segment_recomputes_only_routes_through_it():
+    graph, search, routes = cached_graph()
+    assert graph.close_segment("top_horizontal") == 3
+
+    hits, misses = graph.hits, graph.misses
+    for name in ("bottom_station", "bottom_outbound", "via_p2"):
+        assert search[name]() is routes[name]  # ไม่ผ่าน segment ที่ปิด: ใช้ผลเดิมจาก cache
+    assert (graph.hits, graph.misses) == (hits + 3, misses)
+
+    for name in ("top_station", "top_outbound", "via_p1"):
+        assert search[name]() is None  # ผ่าน segment ที่ปิด: ค้นใหม่ แล้วไม่มีทาง
+    assert (graph.hits, graph.misses) == (hits + 3, misses + 3)
+
+
+def test_reopening_segment_recomputes_only_results_found_while_closed():
+    graph, search, routes = cached_graph()
+    assert graph.find("main", "end").segments == BOTTOM
+    assert graph.close_segment("middle") == 4  # bottom_station, bottom_outbound, via_p2, main -> end
+    assert graph.find("main", "end").segments == TOP  # ทางอ้อมขณะ middle ปิด
+    assert search["bottom_station"]() is None
+    assert search["top_station"]() is routes["top_station"]  # ค้นไว้ก่อนปิด: ยังใช้ได้
+
+    # เปิดแล้วลบเฉพาะผลที่ค้นระหว่างที่ middle ปิด (ทางอ้อมอาจไม่ใช่ทางที่สั้นที่สุดอีกต่อไป)
+    assert graph.open_segment("middle") == 2
+    hits, misses = graph.hits, graph.misses
+    for name in ("top_station", "top_outbound", "via_p1"):
+        assert search[name]() is routes[name]
+    assert (graph.hits, graph.misses) == (hits + 3, misses)
+    assert graph.find("main", "end").segments == BOTTOM
+    assert search["bottom_station"]().segments == routes["bottom_station"].segments
+    assert graph.misses == misses + 2
+
+
+def test_failed_switch_blocks_every_segment_at_it():
+    graph, search, routes = cached_graph()
+    assert graph.fail_switch("W2") == len(routes)  # top_diag_down และ middle: ทุกเส้นทางผ่านประแจนี้
+    assert graph.blocked("top_diag_down") and graph.blocked("middle") and not graph.blocked("main")
+    assert search["top_station"]() is None
+
+    graph.close_segment("middle")
+    graph.repair_switch("W2")
+    assert graph.blocked("middle") and not graph.blocked("top_diag_down")  # ยังปิดเองอยู่
+    assert search["top_station"]().segments == TOP[:-1]
+    assert search["bottom_station"]() is None